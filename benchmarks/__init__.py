@@ -0,0 +1,12 @@
+"""Benchmarks for toolchest.
+
+Benchmark modules are named ``bench_<module>.py`` and follow the conventions
+of `asv <https://asv.readthedocs.io>`_: module level functions or class
+methods prefixed with ``time_`` (wall time per call), ``peakmem_`` (peak
+bytes allocated by a call) or ``track_`` (any returned quantity, e.g.
+throughput). Classes may define ``params``, ``param_names``, ``setup`` and
+``teardown``; every combination of ``params`` is benchmarked separately.
+A ``setup`` raising `NotImplementedError` skips its combination.
+
+Run the suite with ``python -m benchmarks run`` or ``./setup.py bench``.
+"""
@@ -0,0 +1,93 @@
+import numpy as np
+import pandas as pd
+
+from toolchest import analytics
+
+
+class Quantiles(object):
+    params = [['sort', 'partition', 'histogram']]
+    param_names = ['method']
+    repeat = 3
+
+    def setup(self, method):
+        self.data = np.random.RandomState(0).rand(8760, 2000)
+        self.q = np.linspace(0., 1., 21)
+
+    def time_quantiles(self, method):
+        if method == 'sort':
+            np.quantile(self.data, self.q, axis=0)
+        else:
+            analytics.quantiles(self.data, self.q, method=method)
+
+    def peakmem_quantiles(self, method):
+        self.time_quantiles(method)
+
+
+class FullLoadHours(object):
+    repeat = 3
+
+    def setup(self):
+        self.data = np.random.RandomState(0).rand(8760, 2000)
+
+    def time_full_load_hours(self):
+        analytics.full_load_hours(self.data)
+
+
+class PrefixSums(object):
+    repeat = 3
+
+    def setup(self):
+        index = pd.date_range('1980', '2020', freq='h', inclusive='left')
+        self.data = np.random.RandomState(0).rand(len(index), 20)
+        self.sums = analytics.PrefixSums(self.data, index)
+        rng = np.random.RandomState(1)
+        self.starts = rng.randint(0, len(index) // 2, 1000)
+        self.stops = self.starts + rng.randint(1, len(index) // 2, 1000)
+
+    def time_build(self):
+        analytics.PrefixSums(self.data)
+
+    def time_1000_windows(self):
+        self.sums.mean(self.starts, self.stops)
+
+    def time_1000_windows_rescanning(self):
+        for a, b in zip(self.starts, self.stops):
+            self.data[a:b].mean(axis=0)
+
+    def time_monthly_rollup(self):
+        self.sums.rollup('month', how='mean')
+
+
+class ResidualLoad(object):
+    params = [[100, 10000]]
+    param_names = ['scenarios']
+    repeat = 1
+
+    def setup(self, scenarios):
+        rng = np.random.RandomState(0)
+        self.demand = 50. + 10. * rng.rand(8760)
+        self.profiles = rng.rand(8760, 3)
+        self.capacities = 100. * rng.rand(scenarios, 3)
+
+    def time_residual_load_stats(self, scenarios):
+        analytics.residual_load_stats(self.demand, self.profiles,
+                                      self.capacities)
+
+    def peakmem_residual_load_stats(self, scenarios):
+        analytics.residual_load_stats(self.demand, self.profiles,
+                                      self.capacities)
+
+
+class Rolling(object):
+    params = [[24, 168, 720], ['max', 'std', 'pandas max']]
+    param_names = ['window', 'stat']
+    repeat = 3
+
+    def setup(self, window, stat):
+        self.data = np.random.RandomState(0).rand(8760, 200)
+
+    def time_rolling(self, window, stat):
+        if stat == 'pandas max':
+            pd.DataFrame(self.data).rolling(window).max()
+        else:
+            analytics.rolling(self.data, window, stat)
@@ -0,0 +1,43 @@
+import os
+import shutil
+import tempfile
+
+import numpy as np
+
+from toolchest import codec
+
+
+class Archive(object):
+    repeat = 3
+
+    def setup(self):
+        self.dir = tempfile.mkdtemp()
+        hours = np.arange(8760 * 5)
+        daily = 0.5 + 0.4 * np.sin(hours / 24. * 2 * np.pi)
+        noise = np.random.RandomState(0).normal(0, 0.02, (len(hours), 200))
+        self.data = np.clip(daily[:, None] + noise.cumsum(axis=0) / 50, 0, 1)
+        self.path = os.path.join(self.dir, 'cf.tcq')
+        codec.write(self.path, self.data, bounds=(0, 1))
+        self.npy = os.path.join(self.dir, 'cf.npy')
+        np.save(self.npy, self.data)
+
+    def teardown(self):
+        shutil.rmtree(self.dir)
+
+    def time_write(self):
+        codec.write(self.path, self.data, bounds=(0, 1))
+
+    def time_read_all(self):
+        codec.Archive(self.path).read()
+
+    def time_read_all_npy(self):
+        np.load(self.npy)
+
+    def time_read_week(self):
+        codec.Archive(self.path).read(20000, 20168)
+
+    def time_read_column(self):
+        codec.Archive(self.path).read(columns='7')
+
+    def track_compression_ratio(self):
+        return self.data.nbytes / os.path.getsize(self.path)
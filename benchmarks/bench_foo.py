@@ -0,0 +1,23 @@
+from toolchest import foo
+
+
+class BarSuite(object):
+    params = [1, 100, 10000]
+    param_names = ['calls']
+
+    def time_bar(self, calls):
+        for _ in range(calls):
+            foo.bar()
+
+    def peakmem_bar(self, calls):
+        [foo.bar() for _ in range(calls)]
+
+
+def track_bar_throughput():
+    import timeit
+    number, elapsed = timeit.Timer(foo.bar).autorange()
+    return number / elapsed
+
+
+track_bar_throughput.unit = 'calls/s'
+track_bar_throughput.better = 'higher'
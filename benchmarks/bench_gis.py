@@ -0,0 +1,268 @@
+import os
+import shutil
+import tempfile
+
+import numpy as np
+from shapely.geometry import box
+
+from toolchest import gis
+
+
+class AssignPoints(object):
+    params = [[10000, 1000000]]
+    param_names = ['points']
+    repeat = 1
+
+    def setup(self, points):
+        # a 20 x 20 grid of regions, a tenth of the points outside
+        self.regions = [box(i, j, i + 1, j + 1)
+                        for i in range(20) for j in range(20)]
+        self.xy = np.random.RandomState(0).uniform(-1, 21, (points, 2))
+
+    def time_assign_points(self, points):
+        gis.assign_points(self.xy, self.regions)
+
+
+class AssignPointsNaive(object):
+    params = AssignPoints.params
+    param_names = AssignPoints.param_names
+    repeat = 1
+
+    def setup(self, points):
+        # a point-by-point loop over a million points takes minutes
+        if points > 10000:
+            raise NotImplementedError
+        AssignPoints.setup(self, points)
+
+    def time_naive_loop(self, points):
+        from shapely.geometry import Point
+
+        for x, y in self.xy:
+            point = Point(x, y)
+            for region in self.regions:
+                if region.intersects(point):
+                    break
+
+
+class ZonalStats(object):
+    params = [[False, True]]
+    param_names = ['fractional']
+    repeat = 3
+
+    def setup(self, fractional):
+        import rasterio
+        from affine import Affine
+
+        self.dir = tempfile.mkdtemp()
+        self.path = os.path.join(self.dir, 'raster.tif')
+        values = np.random.RandomState(0).rand(3, 2000, 2000)
+        with rasterio.open(self.path, 'w', driver='GTiff', width=2000,
+                           height=2000, count=3, dtype='float64',
+                           transform=Affine(0.01, 0, 0, 0, -0.01, 20)) as f:
+            f.write(values)
+        self.regions = [box(i, j, i + 1, j + 1).buffer(0.3, 4)
+                        for i in range(20) for j in range(20)]
+        gis.zonal_stats(self.path, self.regions, fractional=fractional)
+
+    def teardown(self, fractional):
+        shutil.rmtree(self.dir)
+
+    def time_zonal_stats(self, fractional):
+        gis.zonal_stats(self.path, self.regions, fractional=fractional)
+
+
+class MapWindows(object):
+    repeat = 1
+
+    def setup(self):
+        import rasterio
+        from affine import Affine
+
+        self.dir = tempfile.mkdtemp()
+        self.path = os.path.join(self.dir, 'raster.tif')
+        with rasterio.open(self.path, 'w', driver='GTiff', width=4000,
+                           height=4000, count=1, dtype='float32', tiled=True,
+                           transform=Affine(100, 0, 0, 0, -100, 0)) as f:
+            for row in range(0, 4000, 500):
+                f.write(np.random.RandomState(row).rand(1, 500, 4000).astype(
+                    'float32'), window=((row, row + 500), (0, 4000)))
+        self.output = os.path.join(self.dir, 'out.tif')
+
+    def teardown(self):
+        shutil.rmtree(self.dir)
+
+    def _slope(self, dem):
+        dy, dx = np.gradient(dem[0])
+        return np.hypot(dx, dy)[1:-1, 1:-1]
+
+    def time_map_windows(self):
+        gis.map_windows(self._slope, self.path, self.output, halo=1)
+
+    def time_map_windows_serial(self):
+        gis.map_windows(self._slope, self.path, self.output, halo=1,
+                        processes=1)
+
+    def peakmem_map_windows(self):
+        gis.map_windows(self._slope, self.path, self.output, halo=1)
+
+    def peakmem_whole_raster(self):
+        import rasterio
+
+        with rasterio.open(self.path) as f:
+            self._slope(np.pad(f.read(), ((0, 0), (1, 1), (1, 1)), 'edge'))
+
+
+class EligibleArea(object):
+    params = [['distance transform', 'shapely buffer']]
+    param_names = ['method']
+    repeat = 1
+
+    def setup(self, method):
+        import rasterio
+        from affine import Affine
+        from shapely.geometry import LineString
+
+        self.dir = tempfile.mkdtemp()
+        self.like = os.path.join(self.dir, 'landcover.tif')
+        with rasterio.open(self.like, 'w', driver='GTiff', width=2000,
+                           height=2000, count=1, dtype='uint8', tiled=True,
+                           transform=Affine(100, 0, 0, 0, -100, 2e5)) as f:
+            f.write(np.random.RandomState(0).randint(
+                0, 10, (1, 2000, 2000)).astype('uint8'))
+        start = np.random.RandomState(1).uniform(0, 2e5, (20000, 2))
+        end = start + np.random.RandomState(2).normal(0, 1000, start.shape)
+        self.roads = [LineString([a, b]) for a, b in zip(start, end)]
+        self.output = os.path.join(self.dir, 'eligible.tif')
+
+    def teardown(self, method):
+        shutil.rmtree(self.dir)
+
+    def time_road_buffers(self, method):
+        if method == 'distance transform':
+            gis.eligible_area(self.like, [gis.Exclusion(self.roads,
+                                                        buffer=300.)],
+                              self.output)
+        else:
+            import shapely
+
+            shapely.union_all(shapely.buffer(self.roads, 300.))
+
+
+class Remap(object):
+    repeat = 3
+
+    def setup(self):
+        from toolchest.cache import Cache
+
+        # a 0.25 degree weather grid over 400 irregular regions
+        self.cells = [box(i / 4., j / 4., (i + 1) / 4., (j + 1) / 4.)
+                      for i in range(80) for j in range(80)]
+        self.regions = [box(i, j, i + 1, j + 1).buffer(0.3, 4)
+                        for i in range(20) for j in range(20)]
+        self.dir = tempfile.mkdtemp()
+        self.cache = Cache(self.dir)
+        self.areas = gis.area_matrix(self.cells, self.regions, self.cache)
+        self.data = np.random.RandomState(0).rand(8760, len(self.cells))
+
+    def teardown(self):
+        shutil.rmtree(self.dir)
+
+    def time_area_matrix(self):
+        gis.area_matrix(self.cells, self.regions, cache=False)
+
+    def time_area_matrix_cached(self):
+        gis.area_matrix(self.cells, self.regions, self.cache)
+
+    def time_remap(self):
+        gis.remap(self.data, self.areas, 'intensive')
+
+    def time_dense_weights(self):
+        # the same product with a dense weight matrix
+        self.data @ self.areas.toarray()
+
+
+class NearestBus(object):
+    params = [[1000, 100000]]
+    param_names = ['sites']
+    repeat = 3
+
+    def setup(self, sites):
+        rs = np.random.RandomState(0)
+        self.buses = rs.uniform([-10, 35], [30, 70], (10000, 2))
+        self.sites = rs.uniform([-10, 35], [30, 70], (sites, 2))
+        self.v_nom = rs.choice([110, 220, 380], 10000)
+        self.index = gis.BusIndex(*self.buses.T, v_nom=self.v_nom)
+        self.index.query(*self.sites[:1].T, v_nom=[220, 380])
+
+    def time_build_and_query(self, sites):
+        gis.BusIndex(*self.buses.T).query(*self.sites.T)
+
+    def time_query_reused(self, sites):
+        self.index.query(*self.sites.T, k=3, max_distance=100,
+                         v_nom=[220, 380])
+
+
+class NearestBusNaive(object):
+    params = NearestBus.params
+    param_names = NearestBus.param_names
+    repeat = 3
+
+    def setup(self, sites):
+        # a site-by-site haversine loop over 100000 sites takes minutes
+        if sites > 1000:
+            raise NotImplementedError
+        NearestBus.setup(self, sites)
+
+    def time_haversine_loop(self, sites):
+        lon, lat = np.radians(self.buses.T)
+        for x, y in np.radians(self.sites):
+            a = np.sin((lat - y) / 2) ** 2 + \
+                np.cos(y) * np.cos(lat) * np.sin((lon - x) / 2) ** 2
+            np.argmin(a)
+
+
+class ReadFeatures(object):
+    repeat = 3
+
+    def setup(self):
+        import fiona
+        from shapely.geometry import LineString, mapping
+
+        # power lines in 20 countries on a 10 x 10 degree grid
+        rs = np.random.RandomState(0)
+        self.dir = tempfile.mkdtemp()
+        self.path = os.path.join(self.dir, 'lines.gpkg')
+        schema = {'geometry': 'LineString', 'properties': {
+            'country': 'str', 'voltage': 'int', 'operator': 'str',
+            'name': 'str'}}
+        starts = rs.uniform(0, 10, (200000, 2))
+        with fiona.open(self.path, 'w', driver='GPKG',
+                        schema=schema) as sink:
+            sink.writerecords({
+                'geometry': mapping(LineString(starts[i] + np.cumsum(
+                    rs.normal(0, 0.01, (20, 2)), axis=0))),
+                'properties': {
+                    'country': 'C{}'.format(int(x // 2.5) * 4 + int(y // 2.5)),
+                    'voltage': int(rs.choice([110, 220, 380])) * 1000,
+                    'operator': 'TSO', 'name': 'line {}'.format(i)}}
+                for i, (x, y) in enumerate(starts))
+
+    def teardown(self):
+        shutil.rmtree(self.dir)
+
+    def time_read_features(self):
+        for _ in gis.read_features(self.path, ['voltage'],
+                                   bbox=(0, 0, 2.5, 2.5),
+                                   where="voltage >= 220000 AND "
+                                         "country = 'C0'"):
+            pass
+
+    def time_read_all_and_filter(self):
+        import fiona
+        from shapely.geometry import shape
+
+        with fiona.open(self.path) as source:
+            features = [(shape(f['geometry']), dict(f['properties']))
+                        for f in source]
+        [g for g, p in features
+         if p['voltage'] >= 220000 and p['country'] == 'C0']
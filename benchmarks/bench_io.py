@@ -0,0 +1,36 @@
+import os
+import shutil
+import tempfile
+
+import numpy as np
+import pandas as pd
+
+from toolchest import io
+
+
+class ReadBlocks(object):
+    params = [['csv', 'parquet'], [None, 10]]
+    param_names = ['format', 'block_columns']
+    repeat = 3
+
+    def setup(self, fmt, block_columns):
+        self.dir = tempfile.mkdtemp()
+        self.path = os.path.join(self.dir, 'data.' + fmt)
+        index = pd.date_range('2019-01-01', periods=8760, freq='h',
+                              name='time')
+        frame = pd.DataFrame(np.random.rand(8760, 50), index=index,
+                             columns=['c{}'.format(i) for i in range(50)])
+        getattr(frame, 'to_' + fmt)(self.path)
+
+    def teardown(self, fmt, block_columns):
+        shutil.rmtree(self.dir)
+
+    def time_read_blocks(self, fmt, block_columns):
+        for _ in io.read_blocks(self.path, rows=1000, dtype=np.float32,
+                                block_columns=block_columns):
+            pass
+
+    def peakmem_read_blocks(self, fmt, block_columns):
+        for _ in io.read_blocks(self.path, rows=1000, dtype=np.float32,
+                                block_columns=block_columns):
+            pass
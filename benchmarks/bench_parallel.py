@@ -0,0 +1,20 @@
+import numpy as np
+
+from toolchest import parallel
+
+
+def _cumsum(x):
+    return np.cumsum(x, axis=1)
+
+
+class MapChunks(object):
+    params = [[8760], [100, 10000], [1, 4]]
+    param_names = ['hours', 'series', 'processes']
+    repeat = 3
+
+    def setup(self, hours, series, processes):
+        self.data = np.random.rand(series, hours)
+
+    def time_map_chunks(self, hours, series, processes):
+        parallel.map_chunks(_cumsum, self.data, processes=processes,
+                            min_bytes=0)
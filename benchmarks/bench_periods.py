@@ -0,0 +1,16 @@
+import numpy as np
+
+from toolchest import periods
+
+
+class RepresentativeDays(object):
+    params = [[5, 40], ['kmeans', 'kmedoids']]
+    param_names = ['years', 'method']
+    repeat = 1
+
+    def setup(self, years, method):
+        self.data = np.random.RandomState(0).rand(8760 * years, 30)
+
+    def time_representative_periods(self, years, method):
+        periods.representative_periods(self.data, 12, method=method,
+                                       n_init=1, max_iter=20)
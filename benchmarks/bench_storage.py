@@ -0,0 +1,27 @@
+import numpy as np
+
+from toolchest import storage
+
+
+class Dispatch(object):
+    params = [[8760], [10, 1000], ['numba', 'numpy']]
+    param_names = ['hours', 'series', 'backend']
+    repeat = 3
+
+    def setup(self, hours, series, backend):
+        self.residual = np.random.RandomState(0).normal(size=(hours, series))
+        self.kernel = storage._dispatch
+        if backend == 'numba':
+            if self.kernel.backend != 'numba':
+                raise NotImplementedError('numba is not available')
+            self.kernel(self.residual[:2], *self._args(2))  # compile
+        else:
+            self.kernel = storage._dispatch.fallback
+
+    def _args(self, n):
+        return [np.full(self.residual.shape[1], v)
+                for v in (4., 1., 0., 0.999, 0.9, 0.9)] + \
+            [np.empty((n, self.residual.shape[1])) for _ in range(2)]
+
+    def time_dispatch(self, hours, series, backend):
+        self.kernel(self.residual, *self._args(hours))
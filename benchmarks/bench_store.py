@@ -0,0 +1,34 @@
+import os
+import shutil
+import tempfile
+
+import numpy as np
+import pandas as pd
+
+from toolchest.store import Store
+
+
+class Read(object):
+    params = [[1, 100]]
+    param_names = ['columns']
+    repeat = 3
+
+    def setup(self, columns):
+        self.dir = tempfile.mkdtemp()
+        self.store = Store.create(os.path.join(self.dir, 'store'),
+                                  ['c{}'.format(i) for i in range(500)],
+                                  dtype=np.float32)
+        for year in range(2015, 2020):
+            index = pd.date_range(str(year), str(year + 1), freq='h',
+                                  inclusive='left')
+            self.store.append(np.random.rand(len(index), 500), index)
+        self.columns = ['c{}'.format(i) for i in range(0, 500, 5)][:columns]
+
+    def teardown(self, columns):
+        shutil.rmtree(self.dir)
+
+    def time_read_month(self, columns):
+        Store(self.store.path).read('2017-06', '2017-07', self.columns)
+
+    def time_read_all_years(self, columns):
+        Store(self.store.path).read(columns=self.columns)
@@ -0,0 +1,65 @@
+import numpy as np
+import pandas as pd
+
+from toolchest import timeseries
+
+
+class Resample(object):
+    params = [[100, 2000], ['D', '15min']]
+    param_names = ['series', 'freq']
+    repeat = 3
+
+    def setup(self, series, freq):
+        self.index = pd.date_range('2019-01-01', periods=8760, freq='h',
+                                   tz='Europe/Berlin')
+        self.data = np.random.rand(8760, series)
+
+    def time_resample(self, series, freq):
+        timeseries.resample(self.data, self.index, freq)
+
+    def peakmem_resample(self, series, freq):
+        timeseries.resample(self.data, self.index, freq)
+
+
+class Repair(object):
+    params = [['linear', 'profile', 'neighbours']]
+    param_names = ['method']
+    repeat = 3
+
+    def setup(self, method):
+        self.index = pd.date_range('2019-01-01', periods=96 * 365,
+                                   freq='15min')
+        rng = np.random.RandomState(0)
+        self.data = rng.rand(len(self.index), 200)
+        self.data[rng.rand(*self.data.shape) < 0.01] = np.nan
+
+    def time_repair(self, method):
+        timeseries.repair(self.data, self.index, method=method)
+
+    def peakmem_repair(self, method):
+        timeseries.repair(self.data, self.index, method=method)
+
+
+class AlignToUTC(object):
+    params = [['offset tables', 'pandas']]
+    param_names = ['method']
+    repeat = 3
+
+    def setup(self, method):
+        self.index = pd.date_range('2000-01-01', '2020-01-01', freq='h',
+                                   inclusive='left')
+        self.zones = ['Europe/Lisbon', 'Europe/London', 'Europe/Berlin',
+                      'Europe/Helsinki'] * 10
+        self.data = np.random.rand(len(self.index), len(self.zones))
+        timeseries.align_to_utc(self.data[:10], self.index[:10], self.zones)
+
+    def time_align_to_utc(self, method):
+        if method == 'offset tables':
+            timeseries.align_to_utc(self.data, self.index, self.zones)
+            return
+        ambiguous = np.ones(len(self.index), bool)
+        for col, zone in enumerate(self.zones):
+            local = self.index.tz_localize(zone, ambiguous=ambiguous,
+                                           nonexistent='NaT')
+            pd.Series(self.data[:, col], local)[local.notna()].tz_convert(
+                'UTC')
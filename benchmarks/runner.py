@@ -0,0 +1,321 @@
+"""A small asv-style benchmark runner and regression tracker.
+
+Results of a run are stored as one JSON file per git revision in the results
+directory. Runs of a working tree with uncommitted changes are stored apart,
+under ``<revision>-dirty``, so they never mix with the results of the
+committed code. Two stored revisions can then be compared; any benchmark that
+got worse by more than a given factor is reported as a regression.
+"""
+from __future__ import print_function
+
+import argparse
+import glob
+import importlib
+import inspect
+import itertools
+import json
+import os
+import platform
+import re
+import statistics
+import subprocess
+import sys
+import time
+import timeit
+import tracemalloc
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+ROOT = os.path.dirname(HERE)
+RESULTS_DIR = os.path.join(HERE, 'results')
+
+PREFIXES = {
+    'time_': ('seconds', 'lower'),
+    'peakmem_': ('bytes', 'lower'),
+    'track_': ('unit', 'lower'),
+}
+
+
+class Benchmark(object):
+    """A single benchmark callable and the class instance that owns it.
+
+    Parameters
+    ----------
+    name : str
+        Dotted name, e.g. ``bench_foo.BarSuite.time_bar``
+    func : callable
+        The (unbound) benchmark function
+    owner : type, optional
+        The suite class that defines `func`
+    """
+
+    def __init__(self, name, func, owner=None):
+        self.name = name
+        self.func = func
+        self.owner = owner
+        self.kind = next(p for p in PREFIXES if func.__name__.startswith(p))
+        source = owner if owner is not None else func
+        self.params = getattr(source, 'params', [])
+        if self.params and not isinstance(self.params[0], (list, tuple)):
+            self.params = [self.params]
+        default_unit, default_better = PREFIXES[self.kind]
+        self.unit = getattr(func, 'unit', default_unit)
+        self.better = getattr(func, 'better', default_better)
+        self.repeat = getattr(source, 'repeat', 5)
+
+    def combinations(self):
+        """Yield every combination of the benchmark's parameters"""
+        return itertools.product(*self.params)
+
+    def key(self, combination):
+        """The name under which a parameter combination is stored"""
+        if not combination:
+            return self.name
+        return '{}({})'.format(self.name, ', '.join(map(repr, combination)))
+
+    def bind(self, combination):
+        """Set up the suite for `combination` and return (call, teardown)"""
+        if self.owner is None:
+            return (lambda: self.func(*combination)), (lambda: None)
+        instance = self.owner()
+        if hasattr(instance, 'setup'):
+            instance.setup(*combination)
+        method = getattr(instance, self.func.__name__)
+        teardown = getattr(instance, 'teardown', lambda *args: None)
+        return (lambda: method(*combination)), (lambda: teardown(*combination))
+
+    def run(self, combination, repeat=None):
+        """Run the benchmark once for `combination` and return its result"""
+        repeat = repeat or self.repeat
+        call, teardown = self.bind(combination)
+        try:
+            if self.kind == 'time_':
+                timer = timeit.Timer(call)
+                number, _ = timer.autorange()
+                samples = [t / number for t in timer.repeat(repeat, number)]
+                value = min(samples)
+                stats = {'median': statistics.median(samples),
+                         'number': number, 'repeat': repeat}
+            elif self.kind == 'peakmem_':
+                samples = []
+                for _ in range(repeat):
+                    tracemalloc.start()
+                    try:
+                        call()
+                        samples.append(tracemalloc.get_traced_memory()[1])
+                    finally:
+                        tracemalloc.stop()
+                value = min(samples)
+                stats = {'max': max(samples), 'repeat': repeat}
+            else:
+                value = call()
+                stats = {}
+        finally:
+            teardown()
+        return {'value': value, 'unit': self.unit, 'better': self.better,
+                'stats': stats}
+
+
+def discover(pattern=None, path=HERE):
+    """Collect all benchmarks in ``bench_*.py`` modules under `path`
+
+    Parameters
+    ----------
+    pattern : str, optional
+        Regular expression; only benchmarks whose name matches are returned
+    path : str, optional
+        Directory containing the benchmark modules
+
+    Returns
+    -------
+    benchmarks : list of Benchmark
+    """
+    if path not in sys.path:
+        sys.path.insert(0, path)
+    found = []
+    for fname in sorted(glob.glob(os.path.join(path, 'bench_*.py'))):
+        modname = os.path.splitext(os.path.basename(fname))[0]
+        module = importlib.import_module(modname)
+        for name, obj in sorted(vars(module).items()):
+            if inspect.isclass(obj) and obj.__module__ == modname:
+                for mname, meth in sorted(vars(obj).items()):
+                    if mname.startswith(tuple(PREFIXES)) and callable(meth):
+                        found.append(Benchmark(
+                            '.'.join([modname, name, mname]), meth, obj))
+            elif name.startswith(tuple(PREFIXES)) and inspect.isfunction(obj):
+                found.append(Benchmark('.'.join([modname, name]), obj))
+    if pattern is not None:
+        found = [b for b in found if re.search(pattern, b.name)]
+    return found
+
+
+def git_revision(rev='HEAD', cwd=ROOT):
+    """Resolve `rev` to a full commit hash"""
+    out = subprocess.check_output(['git', 'rev-parse', '--verify', rev],
+                                  cwd=cwd, universal_newlines=True)
+    return out.strip()
+
+
+def git_dirty(cwd=ROOT):
+    """Whether tracked files differ from the current commit"""
+    out = subprocess.check_output(['git', 'status', '--porcelain',
+                                   '--untracked-files=no'],
+                                  cwd=cwd, universal_newlines=True)
+    return bool(out.strip())
+
+
+def run(benchmarks, repeat=None, verbose=True):
+    """Run `benchmarks` and return a mapping of result key to result"""
+    results = {}
+    for bench in benchmarks:
+        for combination in bench.combinations():
+            key = bench.key(combination)
+            try:
+                results[key] = bench.run(combination, repeat=repeat)
+            except NotImplementedError:
+                # asv convention: setup raises this to skip a combination
+                results[key] = {'value': None, 'unit': bench.unit,
+                                'better': bench.better, 'stats': {}}
+            if verbose:
+                print('{:<60} {}'.format(key, _format(results[key])))
+    return results
+
+
+def save(results, revision, results_dir=RESULTS_DIR, dirty=False):
+    """Store `results` for `revision` and return the file name
+
+    Results already stored for `revision` are kept unless they are
+    overwritten by a benchmark of the same name, so subsets of the suite can
+    be run one after another. Results of a `dirty` working tree are stored
+    under ``<revision>-dirty``.
+    """
+    if dirty:
+        revision += '-dirty'
+    if not os.path.isdir(results_dir):
+        os.makedirs(results_dir)
+    fname = os.path.join(results_dir, revision + '.json')
+    if os.path.exists(fname):
+        with open(fname) as f:
+            results = dict(json.load(f)['results'], **results)
+    doc = {
+        'revision': revision,
+        'dirty': dirty,
+        'date': time.strftime('%Y-%m-%dT%H:%M:%S'),
+        'python': platform.python_version(),
+        'machine': platform.node(),
+        'platform': platform.platform(),
+        'results': results,
+    }
+    with open(fname, 'w') as f:
+        json.dump(doc, f, indent=2, sort_keys=True)
+    return fname
+
+
+def load(revision, results_dir=RESULTS_DIR):
+    """Load the stored results of `revision` (a hash or any git revision)
+
+    A ``-dirty`` suffix selects the results of a dirty working tree, e.g.
+    ``HEAD-dirty``.
+    """
+    fname = os.path.join(results_dir, revision + '.json')
+    if not os.path.exists(fname):
+        suffix = '-dirty' if revision.endswith('-dirty') else ''
+        rev = git_revision(revision[:len(revision) - len(suffix)])
+        fname = os.path.join(results_dir, rev + suffix + '.json')
+    with open(fname) as f:
+        return json.load(f)['results']
+
+
+def compare(old, new, factor=1.1):
+    """Compare two result mappings
+
+    Parameters
+    ----------
+    old, new : dict
+        Results as returned by `run` or `load`
+    factor : float, optional
+        A benchmark regressed if it got worse by more than this factor
+
+    Returns
+    -------
+    rows : list of tuple
+        ``(key, old_value, new_value, ratio, status)`` for every benchmark in
+        both results, where status is one of ``'regression'``,
+        ``'improvement'`` or ``''``. Ratios are new over old.
+    """
+    rows = []
+    for key in sorted(set(old) & set(new)):
+        a, b = old[key]['value'], new[key]['value']
+        if not a or not b:
+            rows.append((key, a, b, float('nan'), ''))
+            continue
+        ratio = float(b) / a
+        # how many times worse the new result is, whichever way is better
+        worse = ratio if new[key].get('better', 'lower') == 'lower' \
+            else 1 / ratio
+        if worse > factor:
+            status = 'regression'
+        elif worse < 1. / factor:
+            status = 'improvement'
+        else:
+            status = ''
+        rows.append((key, a, b, ratio, status))
+    return rows
+
+
+def _number(value):
+    return 'skipped' if value is None else '{:.4g}'.format(value)
+
+
+def _format(result):
+    value, unit = result['value'], result['unit']
+    if value is None:
+        return 'skipped'
+    if unit == 'seconds':
+        for scale, suffix in ((1., 's'), (1e-3, 'ms'), (1e-6, 'us')):
+            if value >= scale:
+                break
+        return '{:.3f}{}'.format(value / scale, suffix)
+    if unit == 'bytes':
+        return '{:.1f}KiB'.format(value / 1024.)
+    return '{:.4g} {}'.format(value, unit)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(
+        prog='python -m benchmarks', description=__doc__)
+    sub = parser.add_subparsers(dest='command')
+    prun = sub.add_parser('run', help='run benchmarks for the working tree')
+    prun.add_argument('-b', '--bench', help='regex selecting benchmarks')
+    prun.add_argument('-r', '--repeat', type=int, help='repeats per timing')
+    prun.add_argument('--results-dir', default=RESULTS_DIR)
+    prun.add_argument('--compare', metavar='REV',
+                      help='compare against stored results of REV')
+    prun.add_argument('-f', '--factor', type=float, default=1.1)
+    pcmp = sub.add_parser('compare', help='compare two stored revisions')
+    pcmp.add_argument('old')
+    pcmp.add_argument('new')
+    pcmp.add_argument('-f', '--factor', type=float, default=1.1)
+    pcmp.add_argument('--results-dir', default=RESULTS_DIR)
+    args = parser.parse_args(argv)
+
+    if args.command == 'run':
+        sys.path.insert(0, ROOT)
+        results = run(discover(args.bench), repeat=args.repeat)
+        fname = save(results, git_revision(), args.results_dir,
+                     dirty=git_dirty())
+        print('results written to', fname)
+        if args.compare is None:
+            return 0
+        old = load(args.compare, args.results_dir)
+    elif args.command == 'compare':
+        old = load(args.old, args.results_dir)
+        results = load(args.new, args.results_dir)
+    else:
+        parser.print_help()
+        return 2
+
+    rows = compare(old, results, factor=args.factor)
+    for key, a, b, ratio, status in rows:
+        print('{:<60} {:>12} {:>12} {:>7.2f} {}'.format(
+            key, _number(a), _number(b), ratio, status))
+    return int(any(row[-1] == 'regression' for row in rows))
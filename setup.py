@@ -6,14 +6,43 @@ import sys
 import subprocess
 
 try:
-    from setuptools import setup
+    from setuptools import setup, Command
 except ImportError:
-    from distutils.core import setup
+    from distutils.core import setup, Command
 
 INFO = {
     'version': '0.0.1',
     }
 
+class BenchCommand(Command):
+    """Run the benchmark suite in ``benchmarks/``"""
+    description = 'run benchmarks and store results for the current revision'
+    user_options = [
+        ('bench=', 'b', 'regex selecting benchmarks'),
+        ('compare=', 'c', 'revision to compare the results against'),
+        ('factor=', 'f', 'slowdown factor reported as a regression'),
+    ]
+
+    def initialize_options(self):
+        self.bench = None
+        self.compare = None
+        self.factor = '1.1'
+
+    def finalize_options(self):
+        pass
+
+    def run(self):
+        sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+        from benchmarks.runner import main
+        argv = ['run', '--factor', self.factor]
+        if self.bench:
+            argv += ['--bench', self.bench]
+        if self.compare:
+            argv += ['--compare', self.compare]
+        status = main(argv)
+        if status:
+            raise SystemExit(status)
+
 def main():    
     packages = [
         'toolchest', 
@@ -31,6 +60,16 @@ def main():
         # "url": 'http://github.com/gidden/toolchest',
         "packages": packages,
         "package_dir": pack_dir,
+        "python_requires": ">=3.8",
+        "extras_require": {
+            # JIT-compiled numeric kernels, see toolchest/_jit.py
+            'fast': ['numba'],
+            # Parquet files and data frames cached as Parquet
+            'parquet': ['pyarrow'],
+            # toolchest.gis
+            'gis': ['affine', 'fiona', 'rasterio', 'shapely>=2'],
+            },
+        "cmdclass": {'bench': BenchCommand},
         }
     rtn = setup(**setup_kwargs)
 
@@ -0,0 +1,208 @@
+import datetime
+import os
+import tempfile
+
+import numpy as np
+import pandas as pd
+from nose.tools import assert_equal, assert_raises
+
+from toolchest import analytics
+
+RNG = np.random.RandomState(1)
+DATA = RNG.gamma(2., size=(1000, 7))
+Q = np.array([0., 0.01, 0.25, 0.5, 0.9, 0.999, 1.])
+
+
+def test_quantiles_partition():
+    result = analytics.quantiles(DATA, Q, block_bytes=1000 * 8 * 3)
+    np.testing.assert_allclose(result, np.quantile(DATA, Q, axis=0))
+    np.testing.assert_allclose(analytics.quantiles(DATA[:, 0], 0.3),
+                               np.quantile(DATA[:, 0], 0.3))
+
+
+def test_quantiles_histogram():
+    result = analytics.quantiles(DATA, Q, method='histogram', bins=4096)
+    tolerance = np.ptp(DATA, axis=0) / 4096
+    error = np.abs(result - np.quantile(DATA, Q, axis=0))
+    assert_equal((error <= tolerance).all(), True)
+
+
+def test_quantiles_bad_arguments():
+    assert_raises(ValueError, analytics.quantiles, DATA, 1.5)
+    assert_raises(ValueError, analytics.quantiles, DATA, 0.5, method='sort')
+
+
+def test_duration_curve():
+    durations, curves = analytics.duration_curve(DATA, block_bytes=1)
+    np.testing.assert_array_equal(curves, -np.sort(-DATA, axis=0))
+    assert_equal((durations[0], durations[-1]), (0., 1.))
+    durations, curves = analytics.duration_curve(DATA[:, 2], points=11)
+    assert_equal(curves.shape, (11,))
+    assert_equal(curves[0], DATA[:, 2].max())
+    assert_equal(curves[-1], DATA[:, 2].min())
+    np.testing.assert_allclose(curves[5], np.median(DATA[:, 2]))
+
+
+def test_memmap_input():
+    path = os.path.join(tempfile.mkdtemp(), 'data.npy')
+    np.save(path, DATA)
+    data = np.load(path, mmap_mode='r')
+    np.testing.assert_allclose(analytics.quantiles(data, Q, block_bytes=1),
+                               np.quantile(DATA, Q, axis=0))
+    np.testing.assert_allclose(analytics.full_load_hours(data),
+                               DATA.sum(axis=0) / DATA.max(axis=0))
+
+
+def test_full_load_hours():
+    cf = np.full((8760, 2), 0.25)
+    np.testing.assert_allclose(analytics.full_load_hours(cf, 1.), 2190.)
+    np.testing.assert_allclose(
+        analytics.full_load_hours(cf * [10, 20], [10, 40], hours_per_step=2),
+        [4380., 2190.])
+
+
+def test_peak_offpeak():
+    index = pd.date_range('2021-01-04', periods=24 * 7, freq='h')
+    data = np.column_stack([np.asarray(index.hour, float),
+                            np.ones(len(index))])
+    stats = analytics.peak_offpeak(data, index, block_bytes=1)
+    mask = analytics.peak_mask(index)
+    assert_equal(mask.sum(), 5 * 12)
+    np.testing.assert_allclose(stats['peak']['mean'], [13.5, 1.])
+    np.testing.assert_allclose(stats['peak']['max'], [19., 1.])
+    np.testing.assert_allclose(stats['offpeak']['min'], [0., 1.])
+    np.testing.assert_allclose(stats['offpeak']['mean'],
+                               data[~mask].mean(axis=0))
+
+
+def test_prefix_sums_positions():
+    sums = analytics.PrefixSums(DATA)
+    np.testing.assert_allclose(sums.sum(10, 20), DATA[10:20].sum(axis=0))
+    np.testing.assert_allclose(sums.mean(), DATA.mean(axis=0))
+    windows = sums.sum([0, 5, 7], [10, 5, 1000])
+    assert_equal(windows.shape, (3, 7))
+    np.testing.assert_allclose(windows[2], DATA[7:].sum(axis=0))
+    np.testing.assert_allclose(windows[1], 0.)
+    assert_equal(np.isnan(sums.mean([5], [5])).all(), True)
+    assert_raises(IndexError, sums.sum, 0, 1001)
+    assert_raises(ValueError, sums.sum, '2020-01-01')
+
+
+def test_prefix_sums_rollup():
+    index = pd.date_range('2020-01-01', '2022-01-01', freq='h',
+                          tz='Europe/Berlin', inclusive='left')
+    data = RNG.rand(len(index), 3)
+    sums = analytics.PrefixSums(data, index)
+    frame = pd.DataFrame(data, index=index)
+    values, starts = sums.rollup('month', how='mean')
+    expected = frame.groupby([index.year, index.month]).mean()
+    np.testing.assert_allclose(values, expected.values)
+    assert_equal(starts[1], pd.Timestamp('2020-02-01', tz='Europe/Berlin'))
+    days, _ = sums.rollup('day')
+    assert_equal(len(days), 731)
+    np.testing.assert_allclose(days[88], data[88 * 24:88 * 24 + 23].sum(0))
+    weeks, starts = sums.rollup('week')
+    assert_equal(starts[1].dayofweek, 0)
+    seasons, starts = sums.rollup('season')
+    assert_equal(list(starts.month[:3]), [1, 3, 6])
+    np.testing.assert_allclose(
+        sums.sum('2020-06-01', '2020-07-01'),
+        frame.loc['2020-06'].sum().values)
+
+
+def test_prefix_sums_append():
+    index = pd.date_range('2020-01-01', periods=24 * 100, freq='h')
+    data = RNG.rand(len(index), 2)
+    sums = analytics.PrefixSums(series=2)
+    for start in range(0, len(index), 500):
+        sums.append(data[start:start + 500], index[start:start + 500])
+        if start == 0:
+            sums.rollup('month')
+    assert_equal(len(sums), len(index))
+    whole = analytics.PrefixSums(data, index)
+    for freq in analytics.ROLLUPS:
+        np.testing.assert_allclose(sums.rollup(freq)[0],
+                                   whole.rollup(freq)[0])
+    assert_raises(ValueError, sums.append, data[:2], index[:2])
+    assert_raises(ValueError, sums.append, data[:2])
+
+
+def test_prefix_sums_bounds_and_failed_append():
+    index = pd.date_range('2020-01-01', periods=48, freq='h')
+    data = RNG.rand(48, 2)
+    sums = analytics.PrefixSums(series=2)
+    # a bad first append leaves the object usable
+    assert_raises(ValueError, sums.append, data, index[:10])
+    sums.append(data, index)
+    expected = data[12:24].sum(axis=0)
+    for start, stop in [(datetime.datetime(2020, 1, 1, 12),
+                         datetime.datetime(2020, 1, 2)),
+                        (np.datetime64('2020-01-01T12'),
+                         np.datetime64('2020-01-02')),
+                        (pd.Timestamp('2020-01-01 12:00'), '2020-01-02')]:
+        np.testing.assert_allclose(sums.sum(start, stop), expected)
+    np.testing.assert_allclose(
+        sums.sum(datetime.date(2020, 1, 2), datetime.date(2020, 1, 3)),
+        data[24:].sum(axis=0))
+
+
+def test_capacity_grid():
+    grid = analytics.capacity_grid([0, 10], [1, 2, 3])
+    np.testing.assert_array_equal(grid[:4], [[0, 1], [0, 2], [0, 3], [10, 1]])
+    assert_equal(grid.shape, (6, 2))
+
+
+def test_residual_load_stats():
+    demand = 50. + 10. * RNG.rand(500)
+    profiles = RNG.rand(500, 3)
+    capacities = analytics.capacity_grid([0, 20, 60], [0, 30], [10, 80])
+    stats = analytics.residual_load_stats(demand, profiles, capacities,
+                                          hours_per_step=0.5,
+                                          block_bytes=500 * 8 * 2 * 5)
+    for i, caps in enumerate(capacities):
+        residual = demand - profiles @ caps
+        ramps = np.diff(residual)
+        assert_equal(stats.peak[i], residual.max())
+        assert_equal(stats.minimum[i], residual.min())
+        np.testing.assert_allclose(
+            stats.energy[i], residual.clip(0).sum() * 0.5)
+        np.testing.assert_allclose(
+            stats.curtailment[i], -residual.clip(max=0).sum() * 0.5,
+            atol=1e-9)
+        assert_equal(stats.curtailed_hours[i], (residual < 0).sum() * 0.5)
+        np.testing.assert_allclose(stats.ramp_up[i], ramps.max())
+        np.testing.assert_allclose(stats.ramp_down[i], -ramps.min())
+    assert_equal(stats.curtailment[0], 0.)
+    assert_raises(ValueError, analytics.residual_load_stats, demand,
+                  profiles, capacities[:, :2])
+
+
+def test_rolling():
+    frame = pd.DataFrame(DATA)
+    for window in [1, 5, 24, 999]:
+        for stat in analytics.ROLLING:
+            result = analytics.rolling(DATA, window, stat, block_bytes=1)
+            expected = getattr(frame.rolling(window), stat)(
+                **({'ddof': 0} if stat == 'std' else {}))
+            # standard deviations from sums of squares lose some precision
+            np.testing.assert_allclose(result, expected.values[window - 1:],
+                                       atol=1e-6 if stat == 'std' else 1e-10)
+    assert_equal(analytics.rolling(DATA[:, 0], 10, 'max').shape, (991,))
+    assert_raises(ValueError, analytics.rolling, DATA, 0)
+    assert_raises(ValueError, analytics.rolling, DATA, 5, 'median')
+
+
+def test_ramps():
+    np.testing.assert_allclose(analytics.ramps(DATA, 4), DATA[4:] - DATA[:-4])
+    np.testing.assert_array_equal(analytics.ramps([1, 3, 2]), [2., -1.])
+    assert_raises(ValueError, analytics.ramps, DATA, 0)
+
+
+def test_exceedance():
+    counts = analytics.exceedance(DATA, 2.)
+    np.testing.assert_array_equal(counts, (DATA > 2.).sum(axis=0))
+    counts = analytics.exceedance(DATA, [1., 2., 3., 4., 5., 6., 7.], 24,
+                                  block_bytes=1)
+    expected = pd.DataFrame(DATA > np.arange(1, 8)).rolling(24).sum()
+    np.testing.assert_array_equal(counts, expected.values[23:])
+    assert_equal(analytics.exceedance(DATA[:, 0], 2.).ndim, 0)
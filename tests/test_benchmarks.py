@@ -0,0 +1,56 @@
+import os
+import sys
+import tempfile
+
+from nose.tools import assert_equal, assert_true
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+from benchmarks import runner
+
+
+def _result(value, better='lower'):
+    return {'value': value, 'unit': 'seconds', 'better': better, 'stats': {}}
+
+
+def test_discover():
+    names = [b.name for b in runner.discover('bench_foo')]
+    assert_true('bench_foo.BarSuite.time_bar' in names)
+    assert_true('bench_foo.track_bar_throughput' in names)
+
+
+def test_run_parameterised():
+    bench, = runner.discover(r'BarSuite\.time_bar')
+    results = runner.run([bench], repeat=1, verbose=False)
+    assert_equal(sorted(results), ['bench_foo.BarSuite.time_bar(1)',
+                                   'bench_foo.BarSuite.time_bar(100)',
+                                   'bench_foo.BarSuite.time_bar(10000)'])
+
+
+def test_compare():
+    old = {'a': _result(1.), 'b': _result(1.), 'c': _result(1.),
+           'd': _result(10., 'higher'), 'gone': _result(1.)}
+    new = {'a': _result(1.05), 'b': _result(1.5), 'c': _result(0.5),
+           'd': _result(5., 'higher')}
+    status = {row[0]: row[-1] for row in runner.compare(old, new, factor=1.1)}
+    assert_equal(status, {'a': '', 'b': 'regression', 'c': 'improvement',
+                          'd': 'regression'})
+
+
+def test_save_load():
+    d = tempfile.mkdtemp()
+    runner.save({'a': _result(1.)}, 'abc123', results_dir=d)
+    runner.save({'b': _result(2.)}, 'abc123', results_dir=d)
+    assert_equal(runner.load('abc123', results_dir=d),
+                 {'a': _result(1.), 'b': _result(2.)})
+
+
+def test_save_dirty():
+    d = tempfile.mkdtemp()
+    revision = runner.git_revision()
+    runner.save({'a': _result(1.)}, revision, results_dir=d)
+    runner.save({'a': _result(2.)}, revision, results_dir=d, dirty=True)
+    assert_equal(runner.load('HEAD', results_dir=d), {'a': _result(1.)})
+    assert_equal(runner.load('HEAD-dirty', results_dir=d),
+                 {'a': _result(2.)})
@@ -0,0 +1,146 @@
+import os
+import pathlib
+import tempfile
+import time
+import warnings
+
+import numpy as np
+import pandas as pd
+from nose.tools import assert_equal, assert_not_equal, assert_true
+
+from toolchest import cache
+
+
+def _cache(**kwargs):
+    return cache.Cache(tempfile.mkdtemp(), **kwargs)
+
+
+def test_stable_hash_builtins():
+    assert_equal(cache.stable_hash({'a': 1, 'b': [1, 2]}),
+                 cache.stable_hash({'b': [1, 2], 'a': 1}))
+    assert_not_equal(cache.stable_hash(1), cache.stable_hash(1.))
+    assert_not_equal(cache.stable_hash((1, 2)), cache.stable_hash([1, 2]))
+    assert_not_equal(cache.stable_hash('ab', 'c'),
+                     cache.stable_hash('a', 'bc'))
+
+
+def test_stable_hash_numpy():
+    x = np.arange(12.).reshape(3, 4)
+    assert_equal(cache.stable_hash(x), cache.stable_hash(x.copy()))
+    assert_equal(cache.stable_hash(x.T), cache.stable_hash(x.T.copy()))
+    assert_not_equal(cache.stable_hash(x), cache.stable_hash(x.T))
+    assert_not_equal(cache.stable_hash(x), cache.stable_hash(x.astype('f4')))
+
+
+def test_stable_hash_pandas():
+    df = pd.DataFrame({'a': [1., 2.], 'b': ['x', 'y']})
+    assert_equal(cache.stable_hash(df), cache.stable_hash(df.copy()))
+    other = df.copy()
+    other.iloc[0, 0] = 3.
+    assert_not_equal(cache.stable_hash(df), cache.stable_hash(other))
+    assert_not_equal(cache.stable_hash(df),
+                     cache.stable_hash(df.rename(columns={'a': 'c'})))
+    assert_not_equal(cache.stable_hash(df),
+                     cache.stable_hash(df.set_axis([5, 6])))
+
+
+def test_stable_hash_path():
+    path = pathlib.Path(tempfile.mkdtemp()) / 'data.txt'
+    path.write_text('a')
+    before = cache.stable_hash(path)
+    assert_equal(before, cache.stable_hash(pathlib.Path(str(path))))
+    path.write_text('ab')
+    assert_not_equal(before, cache.stable_hash(path))
+
+
+def test_memoize_str_path():
+    path = os.path.join(tempfile.mkdtemp(), 'data.txt')
+    with open(path, 'w') as f:
+        f.write('a')
+
+    @cache.memoize(cache=_cache())
+    def read(path):
+        with open(path) as f:
+            return f.read()
+
+    assert_equal(read(path), 'a')
+    with open(path, 'w') as f:
+        f.write('bb')
+    assert_equal(read(path), 'bb')
+    assert_equal(read.cache_info(), cache.CacheInfo(hits=0, misses=2))
+
+
+def test_memoize():
+    calls = []
+
+    @cache.memoize(cache=_cache())
+    def f(x, scale=2):
+        calls.append(x)
+        return np.asarray(x) * scale
+
+    x = np.arange(5)
+    np.testing.assert_array_equal(f(x), 2 * x)
+    np.testing.assert_array_equal(f(x, scale=2), 2 * x)
+    np.testing.assert_array_equal(f(x=x), 2 * x)
+    f(x, 3)
+    assert_equal(len(calls), 2)
+    assert_equal(f.cache_info(), cache.CacheInfo(hits=2, misses=2))
+
+
+def test_memoize_mmap():
+    f = cache.memoize(lambda n: np.ones(n), cache=_cache())
+    f(10)
+    result = f(10)
+    assert_true(isinstance(result, np.memmap))
+    assert_true(not result.flags.writeable)
+
+
+def test_memoize_dataframe():
+    f = cache.memoize(lambda n: pd.DataFrame({'a': range(n)}), cache=_cache())
+    f(3)
+    pd.testing.assert_frame_equal(f(3), pd.DataFrame({'a': range(3)}))
+    assert_true(f.cache.entries()[0][-1].endswith('.parquet'))
+
+
+def test_memoize_unstorable():
+    # Parquet rejects columns of mixed types, pickle takes them
+    f = cache.memoize(lambda: pd.DataFrame({'a': [1, 'x', None]}),
+                      cache=_cache())
+    f()
+    pd.testing.assert_frame_equal(f(), pd.DataFrame({'a': [1, 'x', None]}))
+    assert_equal(f.cache_info().hits, 1)
+
+    g = cache.memoize(lambda: lambda: 1, cache=_cache())
+    with warnings.catch_warnings(record=True) as caught:
+        warnings.simplefilter('always')
+        assert_equal(g()(), 1)
+    assert_equal(len(caught), 1)
+    assert_equal(g.cache.entries(), [])
+
+
+def test_memoize_pickle():
+    f = cache.memoize(lambda x: {'x': x}, cache=_cache())
+    f(1)
+    assert_equal(f(1), {'x': 1})
+    assert_equal(f.cache_info().hits, 1)
+
+
+def test_version():
+    c = _cache()
+    f = cache.memoize(lambda: 1, cache=c, version=1)
+    g = cache.memoize(lambda: 2, cache=c, version=2)
+    assert_equal((f(), g()), (1, 2))
+
+
+def test_lru_eviction():
+    c = _cache(max_bytes=3 * 1024)
+    for i in range(3):
+        c.put(str(i), b'x' * 1000)
+        time.sleep(0.01)
+    c.get('0')  # '0' is now the most recently used
+    c.put('3', b'x' * 1000)
+    remaining = sorted(os.path.basename(p) for _, _, p in c.entries())
+    assert_equal(remaining, ['0.pkl', '2.pkl', '3.pkl'])
+    assert_equal(c.get('1'), (False, None))
+    c.clear()
+    assert_equal(c.entries(), [])
@@ -0,0 +1,81 @@
+import os
+import tempfile
+
+import numpy as np
+import pandas as pd
+from nose.tools import assert_equal, assert_raises
+
+from toolchest import codec
+
+RNG = np.random.RandomState(0)
+HOURS = np.arange(1000)
+DATA = np.column_stack([
+    0.5 + 0.5 * np.sin(HOURS / 24. * 2 * np.pi),
+    RNG.rand(1000),
+    np.linspace(-3., 7., 1000),
+])
+
+
+def _path():
+    return os.path.join(tempfile.mkdtemp(), 'profiles.tcq')
+
+
+def test_quantize_error_bound():
+    codes, offset, scale = codec.quantize(DATA)
+    assert_equal(codes.dtype, np.uint16)
+    values = codec.dequantize(codes, offset, scale)
+    error = np.abs(values - DATA).max(axis=0)
+    assert_equal((error <= scale / 2 + 1e-12).all(), True)
+    codes, offset, scale = codec.quantize(DATA[:, :2], bounds=(0, 1))
+    np.testing.assert_allclose(offset, 0.)
+    np.testing.assert_allclose(scale, 1. / (codec.LEVELS - 1))
+
+
+def test_round_trip():
+    path = _path()
+    index = pd.date_range('2020-03-01', periods=1000, freq='h',
+                          tz='Europe/Berlin')
+    data = DATA.copy()
+    data[10:20, 1] = np.nan
+    codec.write(path, data, columns=['a', 'b', 'c'], index=index,
+                chunk_rows=64)
+    archive = codec.Archive(path)
+    assert_equal(archive.shape, (1000, 3))
+    assert_equal(list(archive.index), list(index))
+    values = archive.read()
+    assert_equal(np.isnan(values).sum(), 10)
+    assert_equal((np.abs(values - data) <= archive.error + 1e-12).sum(),
+                 2990)
+    np.testing.assert_array_equal(archive.read(100, 300, ['c', 'a']),
+                                  values[100:300, [2, 0]])
+    np.testing.assert_array_equal(archive.read(999, columns='b'),
+                                  values[999:, 1])
+    assert_equal(archive.read(500, 500).shape, (0, 3))
+    starts = [start for start, _ in archive.chunks(100, 300)]
+    assert_equal(starts, [100, 128, 192, 256])
+    assert_equal(archive.read(dtype=np.float32).dtype, np.float32)
+
+
+def test_compression():
+    path = _path()
+    smooth = np.tile(DATA[:, :1], (1, 50))
+    codec.write(path, smooth, bounds=(0, 1))
+    assert_equal(os.path.getsize(path) < smooth.nbytes / 8, True)
+    assert_equal(codec.Archive(path).index, None)
+
+
+def test_bad_files():
+    path = _path()
+    with open(path, 'wb') as f:
+        f.write(b'not an archive')
+    assert_raises(ValueError, codec.Archive, path)
+    assert_raises(ValueError, codec.write, path, DATA, columns=['a'])
+
+
+def test_empty():
+    codes, offset, scale = codec.quantize(np.empty((0, 3)))
+    assert_equal(codes.shape, (0, 3))
+    np.testing.assert_array_equal(offset, 0.)
+    path = _path()
+    codec.write(path, np.empty((0, 3)))
+    assert_equal(codec.Archive(path).read().shape, (0, 3))
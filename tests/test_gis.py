@@ -0,0 +1,376 @@
+import os
+import pickle
+import tempfile
+
+import numpy as np
+from nose.tools import assert_equal, assert_raises
+from shapely.geometry import box
+
+from toolchest import gis
+
+REGIONS = [box(0, 0, 1, 1), box(1, 0, 2, 1), box(0, 1, 2, 3)]
+
+
+def _write_regions():
+    import fiona
+    from shapely.geometry import mapping
+
+    path = os.path.join(tempfile.mkdtemp(), 'regions.geojson')
+    schema = {'geometry': 'Polygon', 'properties': {'name': 'str'}}
+    with fiona.open(path, 'w', driver='GeoJSON', schema=schema) as sink:
+        for name, geometry in zip('abc', REGIONS):
+            sink.write({'geometry': mapping(geometry),
+                        'properties': {'name': name}})
+    return path
+
+
+def test_read_regions():
+    geometries, ids = gis.read_regions(_write_regions(), 'name')
+    assert_equal(ids, ['a', 'b', 'c'])
+    assert_equal(geometries[1].equals(REGIONS[1]), True)
+    _, ids = gis.read_regions(_write_regions())
+    assert_equal(ids, [0, 1, 2])
+
+
+def _write_lines(driver, name):
+    import fiona
+    from shapely.geometry import LineString, mapping
+
+    path = os.path.join(tempfile.mkdtemp(), name)
+    schema = {'geometry': 'LineString',
+              'properties': {'country': 'str', 'voltage': 'int'}}
+    with fiona.open(path, 'w', driver=driver, schema=schema) as sink:
+        for i in range(10):
+            line = LineString([(i, 0), (i + 0.5, 0.01), (i + 1, 0)])
+            sink.write({'geometry': mapping(line), 'properties': {
+                'country': 'DE' if i % 2 else 'FR', 'voltage': 110 * i}})
+    return path
+
+
+def test_read_features():
+    for driver, name in [('GPKG', 'lines.gpkg'),
+                         ('ESRI Shapefile', 'lines.shp'),
+                         ('GeoJSON', 'lines.geojson')]:
+        path = _write_lines(driver, name)
+        batches = list(gis.read_features(path, batch_size=4))
+        assert_equal([len(b.geometries) for b in batches], [4, 4, 2])
+        assert_equal(sorted(batches[0].properties), ['country', 'voltage'])
+        np.testing.assert_array_equal(batches[2].properties['voltage'],
+                                      [880, 990])
+
+        batch, = gis.read_features(path, ['voltage'], bbox=(2.2, -1, 6, 1),
+                                   where="country = 'DE'")
+        assert_equal(list(batch.properties), ['voltage'])
+        np.testing.assert_array_equal(batch.properties['voltage'],
+                                      [330, 550])
+        assert_equal(batch.geometries[0].bounds, (3., 0., 4., 0.01))
+
+        batch, = gis.read_features(path, [], simplify=0.1)
+        assert_equal(batch.properties, {})
+        assert_equal(len(batch.geometries[0].coords), 2)
+    assert_raises(KeyError, list, gis.read_features(path, ['name']))
+
+
+def test_assign_points():
+    points = [[0.5, 0.5], [1.5, 0.2], [1., 2.], [5., 5.], [1., 0.5],
+              [-1., 0.5]]
+    np.testing.assert_array_equal(gis.assign_points(points, REGIONS),
+                                  [0, 1, 2, -1, 0, -1])
+    np.testing.assert_array_equal(
+        gis.assign_points(points, _write_regions(), predicate='within'),
+        [0, 1, 2, -1, -1, -1])
+    assert_raises(ValueError, gis.assign_points, points, REGIONS, 'touches')
+    assert_raises(ValueError, gis.assign_points, [1., 2.], REGIONS)
+
+
+def test_assign_points_chunks():
+    xy = np.random.RandomState(0).uniform(-0.5, 2.5, (20000, 2))
+    result = gis.assign_points(xy, REGIONS, processes=2, chunksize=3000)
+    serial = gis.assign_points(xy, REGIONS)
+    np.testing.assert_array_equal(result, serial)
+    expected = np.where(xy[:, 1] > 1, 2, np.where(xy[:, 0] > 1, 1, 0))
+    outside = (xy < 0).any(axis=1) | (xy[:, 0] > 2) | (xy[:, 1] > 3)
+    np.testing.assert_array_equal(result, np.where(outside, -1, expected))
+
+
+def test_region_index_pickles():
+    index = pickle.loads(pickle.dumps(gis._RegionIndex(REGIONS)))
+    np.testing.assert_array_equal(
+        gis._assign(np.array([[1.5, 0.5]]), index, 'intersects'), [1])
+
+
+def _write_raster(values, nodata=None, **options):
+    import rasterio
+    from affine import Affine
+
+    path = os.path.join(tempfile.mkdtemp(), 'raster.tif')
+    values = np.atleast_3d(values).transpose(2, 0, 1) if values.ndim == 2 \
+        else values
+    with rasterio.open(path, 'w', driver='GTiff', width=values.shape[2],
+                       height=values.shape[1], count=len(values),
+                       dtype=values.dtype, nodata=nodata,
+                       transform=Affine(1, 0, 0, 0, -1, 3), **options) as sink:
+        sink.write(values)
+    return path
+
+
+def test_label_raster():
+    from affine import Affine
+
+    transform = Affine(1, 0, 0, 0, -1, 3)
+    labels = gis.label_raster(REGIONS, (3, 3), transform)
+    np.testing.assert_array_equal(labels, [[2, 2, -1], [2, 2, -1],
+                                           [0, 1, -1]])
+    assert_equal(gis.label_raster(REGIONS, (3, 3), transform) is labels,
+                 True)
+
+
+def test_zonal_stats():
+    values = np.arange(9.).reshape(3, 3)
+    values[0, 0] = -1
+    doubled = np.where(values < 0, -1., 2 * values)
+    path = _write_raster(np.stack([values, doubled]), nodata=-1)
+    stats = gis.zonal_stats(path, REGIONS)
+    assert_equal(stats['sum'].shape, (3, 2))
+    np.testing.assert_allclose(stats['sum'][:, 0], [6., 7., 1. + 3. + 4.])
+    np.testing.assert_allclose(stats['count'][:, 0], [1., 1., 3.])
+    np.testing.assert_allclose(stats['mean'][:, 1], [12., 14., 16. / 3])
+    np.testing.assert_allclose(stats['min'][:, 0], [6., 7., 1.])
+    np.testing.assert_allclose(stats['max'][:, 1], [12., 14., 8.])
+    stats = gis.zonal_stats([path, path], REGIONS, stats=['max'], bands=[1])
+    assert_equal(list(stats), ['max'])
+    np.testing.assert_allclose(stats['max'], [[6., 6.], [7., 7.], [4., 4.]])
+    assert_raises(ValueError, gis.zonal_stats, path, REGIONS, ['median'])
+
+
+def test_zonal_stats_missing_geometry():
+    path = _write_raster(np.ones((3, 3)))
+    for fractional in [False, True]:
+        stats = gis.zonal_stats(path, [box(0, 0, 2, 2), None],
+                                fractional=fractional)
+        np.testing.assert_allclose(stats['sum'][:, 0], [4., 0.])
+        np.testing.assert_allclose(stats['count'][:, 0], [4., 0.])
+
+
+def test_zonal_stats_fractional():
+    path = _write_raster(np.ones((3, 3)))
+    regions = [box(0.5, 0.5, 2.5, 1.5), box(0, 0, 3, 3), box(5, 5, 6, 6)]
+    stats = gis.zonal_stats(path, regions, fractional=True)
+    np.testing.assert_allclose(stats['sum'][:, 0], [2., 9., 0.])
+    np.testing.assert_allclose(stats['mean'][:, 0], [1., 1., np.nan])
+    np.testing.assert_allclose(stats['max'][:, 0], [1., 1., np.nan])
+    stats = gis.zonal_stats(path, regions)
+    np.testing.assert_allclose(stats['count'][:, 0], [0., 9., 0.])
+
+
+def test_block_windows():
+    import rasterio
+
+    path = _write_raster(np.zeros((40, 50)), tiled=True, blockxsize=16,
+                         blockysize=16)
+    with rasterio.open(path) as dataset:
+        windows = list(gis.block_windows(dataset, halo=2,
+                                         block_shape=(16, 32)))
+    assert_equal(len(windows), 6)
+    window, read, pad = windows[0]
+    assert_equal((window.width, window.height), (32, 16))
+    assert_equal((read.col_off, read.width, read.height), (0, 34, 18))
+    assert_equal(pad, ((2, 0), (2, 0)))
+    window, read, pad = windows[-1]
+    assert_equal((window.col_off, window.row_off), (32, 32))
+    assert_equal((window.width, window.height), (18, 8))
+    assert_equal(pad, ((0, 2), (0, 2)))
+
+
+def test_map_windows():
+    import rasterio
+    from scipy import ndimage
+
+    values = np.random.RandomState(0).rand(40, 50)
+    first = _write_raster(values)
+    second = _write_raster(2 * values)
+    output = os.path.join(tempfile.mkdtemp(), 'out.tif')
+
+    def smooth(a, b):
+        return ndimage.uniform_filter(a[0] + b[0], 3)[1:-1, 1:-1]
+
+    gis.map_windows(smooth, [first, second], output, halo=1,
+                    block_shape=(16, 16))
+    with rasterio.open(output) as result:
+        assert_equal(result.count, 1)
+        np.testing.assert_allclose(
+            result.read(1), ndimage.uniform_filter(3 * values, 3,
+                                                   mode='nearest'))
+    assert_raises(ValueError, gis.map_windows, lambda a: a[0, :2], first,
+                  output)
+    other = _write_raster(np.zeros((10, 10)))
+    assert_raises(ValueError, gis.map_windows, smooth, [first, other],
+                  output)
+
+
+def test_map_windows_parallel_and_resume():
+    import rasterio
+
+    values = np.random.RandomState(0).rand(40, 50)
+    raster = _write_raster(values)
+    output = os.path.join(tempfile.mkdtemp(), 'out.tif')
+    gis.map_windows(lambda a: 2 * a, raster, output, block_shape=(16, 16),
+                    processes=2, blockxsize=16, blockysize=16)
+    with rasterio.open(output) as result:
+        np.testing.assert_allclose(result.read(1), 2 * values)
+    assert not os.path.exists(output + '.windows')
+
+    calls = []
+
+    def interrupted(a, window):
+        if len(calls) == 4:
+            raise KeyboardInterrupt
+        calls.append(window)
+        return 3 * a
+
+    output = os.path.join(tempfile.mkdtemp(), 'out.tif')
+    assert_raises(KeyboardInterrupt, gis.map_windows, interrupted, raster,
+                  output, block_shape=(16, 16), with_window=True,
+                  processes=1)
+    assert os.path.exists(output + '.windows')
+    del calls[:]
+    gis.map_windows(lambda a, window: calls.append(window) or 3 * a, raster,
+                    output, block_shape=(16, 16), with_window=True,
+                    processes=1, resume=True)
+    assert_equal(len(calls), 12 - 4)
+    with rasterio.open(output) as result:
+        np.testing.assert_allclose(result.read(1), 3 * values)
+    assert not os.path.exists(output + '.windows')
+
+    # a finished output is left alone unless starting over
+    del calls[:]
+    gis.map_windows(lambda a, window: calls.append(window) or 4 * a, raster,
+                    output, block_shape=(16, 16), with_window=True,
+                    processes=1, resume=True)
+    assert_equal(len(calls), 0)
+    with rasterio.open(output) as result:
+        np.testing.assert_allclose(result.read(1), 3 * values)
+    gis.map_windows(lambda a: 4 * a, raster, output, block_shape=(16, 16),
+                    processes=1)
+    with rasterio.open(output) as result:
+        np.testing.assert_allclose(result.read(1), 4 * values)
+
+    output = os.path.join(tempfile.mkdtemp(), 'out.tif')
+    assert_raises(KeyboardInterrupt, gis.map_windows, interrupted, raster,
+                  output, block_shape=(16, 16), with_window=True,
+                  processes=1)
+    assert_raises(ValueError, gis.map_windows, lambda a: a, raster, output,
+                  block_shape=(32, 32), processes=1, resume=True)
+
+
+def test_eligible_area():
+    import rasterio
+    from affine import Affine
+    from shapely.geometry import LineString
+
+    landcover = np.full((100, 100), 7, dtype=np.uint8)
+    landcover[:10, :10] = 5
+    like = os.path.join(tempfile.mkdtemp(), 'landcover.tif')
+    with rasterio.open(like, 'w', driver='GTiff', width=100, height=100,
+                       count=1, dtype='uint8',
+                       transform=Affine(10, 0, 0, 0, -10, 1000)) as sink:
+        sink.write(landcover[None])
+    roads = [LineString([(0, 505), (1000, 505)])]
+    protected = [box(800, 0, 1000, 200)]
+    exclusions = [gis.Exclusion(like, values=[5]), gis.Exclusion(protected),
+                  (roads, None, 25.)]
+    regions = [box(0, 0, 505, 1000), box(505, 0, 1000, 1000)]
+    output = os.path.join(tempfile.mkdtemp(), 'eligible.tif')
+    areas = gis.eligible_area(like, exclusions, output, regions=regions,
+                              block_shape=(32, 32))
+    with rasterio.open(output) as result:
+        eligible = result.read(1)
+    excluded = np.zeros((100, 100), dtype=bool)
+    excluded[:10, :10] = True
+    excluded[47:52] = True
+    excluded[80:, 80:] = True
+    np.testing.assert_array_equal(eligible, ~excluded)
+    # the regions split column 50, with 95 eligible pixels, in halves
+    expected = [4650 * 100. + 95 * 50., 4350 * 100. - 95 * 50.]
+    np.testing.assert_allclose(areas, expected)
+    parallel = os.path.join(tempfile.mkdtemp(), 'eligible.tif')
+    np.testing.assert_allclose(gis.eligible_area(
+        like, exclusions, parallel, regions=regions, block_shape=(32, 32),
+        processes=2), expected)
+    np.testing.assert_allclose(gis.eligible_area(
+        like, exclusions, parallel, regions=regions, block_shape=(32, 32),
+        resume=True), expected)
+
+
+def test_area_matrix_and_remap():
+    from toolchest.cache import Cache
+
+    cells = [box(0, 0, 1, 1), box(1, 0, 2, 1), box(2, 0, 3, 1)]
+    targets = [box(0, 0, 1.5, 1), box(1.5, 0, 2.5, 1), box(9, 9, 10, 10)]
+    cache = Cache(tempfile.mkdtemp())
+    areas = gis.area_matrix(cells, targets, cache=cache)
+    np.testing.assert_allclose(areas.toarray(), [[1., 0., 0.],
+                                                 [.5, .5, 0.],
+                                                 [0., .5, 0.]])
+    assert_equal(len(list(cache.entries())), 1)
+    cached = gis.area_matrix(cells, targets, cache=cache)
+    np.testing.assert_allclose(
+        gis.area_matrix(cells + [None], targets, cache=cache).toarray()[3],
+        0.)
+    np.testing.assert_allclose(cached.toarray(), areas.toarray())
+    assert_equal(len(list(cache.entries())), 2)
+
+    data = np.array([[2., 4., 6.], [1., 1., 1.]])
+    np.testing.assert_allclose(gis.remap(data, areas), [[4., 8., 0.],
+                                                        [1.5, 1.5, 0.]])
+    np.testing.assert_allclose(
+        gis.remap(data[0], areas, source_areas=[1., 1., 1.]), [4., 5., 0.])
+    np.testing.assert_allclose(gis.remap(data, areas, 'intensive'),
+                               [[8. / 3, 5., np.nan], [1., 1., np.nan]])
+    assert_raises(ValueError, gis.remap, data, areas, 'average')
+
+
+def _haversine(lon1, lat1, lon2, lat2):
+    lon1, lat1, lon2, lat2 = map(np.radians, (lon1, lat1, lon2, lat2))
+    a = np.sin((lat2 - lat1) / 2) ** 2 + \
+        np.cos(lat1) * np.cos(lat2) * np.sin((lon2 - lon1) / 2) ** 2
+    return 2 * gis.EARTH_RADIUS * np.arcsin(np.sqrt(a))
+
+
+def test_bus_index():
+    rs = np.random.RandomState(0)
+    bus_lon, bus_lat = rs.uniform(-10, 30, 200), rs.uniform(35, 70, 200)
+    v_nom = rs.choice([110, 220, 380], 200)
+    country = rs.choice(['DE', 'FR'], 200)
+    lon, lat = rs.uniform(-10, 30, 50), rs.uniform(35, 70, 50)
+    distances = _haversine(lon[:, None], lat[:, None], bus_lon, bus_lat)
+    buses = gis.BusIndex(bus_lon, bus_lat, v_nom=v_nom, country=country)
+
+    nearest = buses.query(lon, lat)
+    np.testing.assert_array_equal(nearest.bus, distances.argmin(axis=1))
+    np.testing.assert_allclose(nearest.distance, distances.min(axis=1))
+
+    nearest = buses.query(lon, lat, k=3, v_nom=[220, 380])
+    eligible = np.where(v_nom > 110, distances, np.inf)
+    np.testing.assert_array_equal(nearest.bus,
+                                  np.argsort(eligible, axis=1)[:, :3])
+
+    sites_country = rs.choice(['DE', 'FR'], 50)
+    nearest = buses.query(lon, lat, match={'country': sites_country},
+                          max_distance=300, v_nom=380)
+    eligible = np.where((country == sites_country[:, None]) & (v_nom == 380)
+                        & (distances <= 300), distances, np.inf)
+    expected = np.where(np.isinf(eligible.min(axis=1)), -1,
+                        eligible.argmin(axis=1))
+    np.testing.assert_array_equal(nearest.bus, expected)
+    np.testing.assert_allclose(nearest.distance, eligible.min(axis=1))
+    assert (expected == -1).any() and (expected >= 0).any()
+
+    sites_v_nom = rs.choice([110, 380], 50)
+    nearest = buses.query(lon, lat, match={'country': sites_country,
+                                           'v_nom': sites_v_nom})
+    eligible = np.where((country == sites_country[:, None]) &
+                        (v_nom == sites_v_nom[:, None]), distances, np.inf)
+    np.testing.assert_array_equal(nearest.bus, eligible.argmin(axis=1))
+
+    assert_raises(ValueError, gis.BusIndex, bus_lon, bus_lat, v_nom=[1])
@@ -0,0 +1,53 @@
+import subprocess
+import sys
+
+from nose.tools import assert_equal, assert_less, assert_true
+
+import toolchest
+
+# generous enough for slow CI workers, far below the cost of importing numpy
+IMPORT_BUDGET = 0.05
+
+HEAVY_MODULES = ['numpy', 'pandas', 'scipy', 'fiona', 'rasterio', 'shapely',
+                 'pyomo']
+
+PROBE = """
+import sys, time
+start = time.perf_counter()
+import toolchest
+print(time.perf_counter() - start)
+print(','.join(m for m in {heavy!r} if m in sys.modules))
+"""
+
+
+def _probe():
+    out = subprocess.check_output(
+        [sys.executable, '-c', PROBE.format(heavy=HEAVY_MODULES)],
+        universal_newlines=True)
+    elapsed, loaded = out.splitlines()
+    return float(elapsed), loaded
+
+
+def test_import_budget():
+    elapsed, _ = _probe()
+    assert_less(elapsed, IMPORT_BUDGET)
+
+
+def test_import_is_lazy():
+    _, loaded = _probe()
+    assert_equal(loaded, '')
+
+
+def test_lazy_attribute():
+    from toolchest import foo
+    assert_true(toolchest.foo is foo)
+    assert_true('foo' in dir(toolchest))
+
+
+def test_unknown_attribute():
+    try:
+        toolchest.does_not_exist
+    except AttributeError:
+        pass
+    else:
+        raise AssertionError('expected AttributeError')
@@ -0,0 +1,90 @@
+import os
+import tempfile
+
+import numpy as np
+import pandas as pd
+from nose.tools import assert_equal, assert_raises, assert_true
+
+from toolchest import io
+
+INDEX = pd.date_range('2020-01-01', periods=100, freq='h', name='time')
+FRAME = pd.DataFrame(np.random.RandomState(0).rand(100, 5), index=INDEX,
+                     columns=['a', 'b', 'c', 'd', 'e'])
+
+
+def _files():
+    d = tempfile.mkdtemp()
+    csv = os.path.join(d, 'data.csv')
+    parquet = os.path.join(d, 'data.parquet')
+    FRAME.to_csv(csv)
+    FRAME.to_parquet(parquet, row_group_size=30)
+    return csv, parquet
+
+
+def test_file_columns():
+    for path in _files():
+        assert_equal(io.file_columns(path), ('time', list('abcde')))
+
+
+def test_row_blocks():
+    for path in _files():
+        blocks = list(io.read_blocks(path, rows=40, columns=['b', 'd']))
+        assert_equal([len(b.values) for b in blocks], [40, 40, 20])
+        assert_equal(blocks[0].columns, ['b', 'd'])
+        values = np.concatenate([b.values for b in blocks])
+        np.testing.assert_allclose(values, FRAME[['b', 'd']].values)
+        index = blocks[0].index.append([b.index for b in blocks[1:]])
+        assert_true(index.equals(INDEX))
+
+
+def test_dtype():
+    for path in _files():
+        block = next(io.read_blocks(path, dtype=np.float32))
+        assert_equal(block.values.dtype, np.float32)
+        np.testing.assert_allclose(block.values, FRAME.values, rtol=1e-6)
+
+
+def test_column_blocks():
+    for path in _files():
+        blocks = list(io.read_blocks(path, rows=30, block_columns=2))
+        assert_equal([b.columns for b in blocks], [['a', 'b'], ['c', 'd'],
+                                                   ['e']])
+        assert_true(all(b.index is blocks[0].index for b in blocks))
+        assert_true(blocks[0].index.equals(INDEX))
+        np.testing.assert_allclose(np.hstack([b.values for b in blocks]),
+                                   FRAME.values)
+
+
+def test_explicit_index_col():
+    d = tempfile.mkdtemp()
+    frame = FRAME.assign(stamp=INDEX.tz_localize('UTC'))
+    csv = os.path.join(d, 'data.csv')
+    parquet = os.path.join(d, 'data.parquet')
+    frame.to_csv(csv)
+    frame.to_parquet(parquet)
+    for path in csv, parquet:
+        block, = io.read_blocks(path, index_col='stamp')
+        assert_equal(block.columns, list('abcde'))
+        np.testing.assert_allclose(block.values, FRAME.values)
+        assert_true(block.index.equals(INDEX.tz_localize('UTC')))
+
+
+def test_time_zone():
+    d = tempfile.mkdtemp()
+    path = os.path.join(d, 'tz.parquet')
+    FRAME.tz_localize('Europe/Berlin').to_parquet(path)
+    block = next(io.read_blocks(path))
+    assert_equal(str(block.index.tz), 'Europe/Berlin')
+
+
+def test_errors():
+    csv, _ = _files()
+    assert_raises(KeyError, list, io.read_blocks(csv, columns=['x']))
+    assert_raises(ValueError, list, io.read_blocks('data.xlsx'))
+
+
+def test_rechunk():
+    chunks = [(INDEX[:3], np.zeros((3, 1))), (INDEX[3:5], np.zeros((2, 1))),
+              (INDEX[5:9], np.zeros((4, 1))), (INDEX[9:13], np.zeros((4, 1)))]
+    sizes = [len(values) for _, values in io._rechunk(iter(chunks), 4)]
+    assert_equal(sizes, [4, 4, 4, 1])
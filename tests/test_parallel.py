@@ -0,0 +1,81 @@
+import numpy as np
+import pandas as pd
+from nose.tools import assert_equal, assert_raises
+
+from toolchest import parallel
+
+
+def _scale(x, factor=1.):
+    return x * factor
+
+
+def _combine(x, y, offset):
+    return x + y.sum(axis=1, keepdims=True) + offset
+
+
+def _row_sums(df):
+    return df.sum(axis=1)
+
+
+def _widening(x):
+    # integers for the first chunk, floats for later ones
+    return x if x[0] == 0 else x / 2
+
+
+def test_map_chunks_parallel():
+    x = np.random.rand(1000, 3)
+    y = np.random.rand(1000, 2)
+    result = parallel.map_chunks(_combine, x, y, args=(1.,), processes=2,
+                                 chunksize=64, min_bytes=0)
+    np.testing.assert_allclose(result, _combine(x, y, 1.))
+
+
+def test_map_chunks_kwargs_dtype():
+    x = np.arange(100, dtype='f4')
+    result = parallel.map_chunks(_scale, x, kwargs={'factor': 2},
+                                 processes=3, chunksize=7, min_bytes=0)
+    assert_equal(result.dtype, np.dtype('f4'))
+    np.testing.assert_array_equal(result, 2 * x)
+
+
+def test_map_chunks_out_dtype():
+    x = np.arange(100)
+    assert_raises(TypeError, parallel.map_chunks, _widening, x, processes=2,
+                  chunksize=10, min_bytes=0)
+    result = parallel.map_chunks(_widening, x, processes=2, chunksize=10,
+                                 min_bytes=0, out_dtype=float)
+    assert_equal(result.dtype, np.dtype(float))
+    np.testing.assert_array_equal(result[10:], x[10:] / 2)
+    result = parallel.map_chunks(_widening, x, out_dtype='f4')
+    assert_equal(result.dtype, np.dtype('f4'))
+
+
+def test_map_chunks_serial():
+    x = np.arange(10.)
+    result = parallel.map_chunks(_scale, x, args=(3.,))
+    np.testing.assert_array_equal(result, 3 * x)
+
+
+def test_map_chunks_dataframe():
+    index = pd.date_range('2020-01-01', periods=500, freq='h')
+    df = pd.DataFrame(np.random.rand(500, 4), index=index,
+                      columns=list('abcd'))
+    result = parallel.map_chunks(_scale, df, args=(2.,), processes=2,
+                                 min_bytes=0)
+    pd.testing.assert_frame_equal(result, df * 2.)
+    sums = parallel.map_chunks(_row_sums, df, processes=2, min_bytes=0)
+    pd.testing.assert_series_equal(sums, df.sum(axis=1))
+
+
+def test_map_chunks_bad_inputs():
+    assert_raises(ValueError, parallel.map_chunks, _scale, np.ones(3),
+                  np.ones(4))
+    assert_raises(ValueError, parallel.map_chunks, np.sum, np.ones((100, 2)),
+                  processes=2, min_bytes=0)
+
+
+def test_chunk_rows():
+    assert_equal(parallel.chunk_rows(1000, 8, 2), 125)
+    assert_equal(parallel.chunk_rows(10 ** 9, 8, 2,
+                                     target_bytes=2 ** 20), 2 ** 17)
+    assert_equal(parallel.chunk_rows(3, 8, 4), 1)
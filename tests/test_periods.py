@@ -0,0 +1,86 @@
+import warnings
+
+import numpy as np
+from nose.tools import assert_equal, assert_raises
+
+from toolchest import periods
+
+RNG = np.random.RandomState(42)
+HOURS = np.arange(24)
+DAY_TYPES = np.stack([
+    np.column_stack([np.sin(HOURS / 24. * np.pi), np.full(24, .2)]),
+    np.column_stack([np.full(24, .5), np.cos(HOURS / 24. * np.pi) ** 2]),
+    np.column_stack([HOURS / 24., 1. - HOURS / 24.]),
+])
+TYPES = RNG.randint(3, size=60)
+DATA = (DAY_TYPES[TYPES] +
+        RNG.normal(scale=0.01, size=(60, 24, 2))).reshape(-1, 2)
+
+
+def _check_recovers_types(result):
+    assert_equal(result.weights.sum(), 60)
+    # periods of the same type share a representative and vice versa
+    for t in range(3):
+        assert_equal(len(set(result.assignment[TYPES == t])), 1)
+    assert_equal(len(set(result.assignment)), 3)
+    np.testing.assert_array_equal(np.diff(result.periods) > 0, True)
+
+
+def test_methods():
+    for method in ['kmeans', 'kmedoids', 'hierarchical']:
+        result = periods.representative_periods(DATA, 3, method=method,
+                                                block_size=7)
+        _check_recovers_types(result)
+        assert_equal(result.profiles.shape, (3, 24, 2))
+        rebuilt = periods.reconstruct(result)
+        assert_equal(rebuilt.shape, DATA.shape)
+        np.testing.assert_allclose(rebuilt, DATA, atol=0.05)
+
+
+def test_medoids_are_periods():
+    result = periods.representative_periods(DATA, 3, method='kmedoids')
+    np.testing.assert_array_equal(
+        result.profiles, DATA.reshape(60, 24, 2)[result.periods])
+
+
+def test_extremes():
+    data = DATA.copy()
+    data[24 * 17 + 5, 0] = 10.
+    result = periods.representative_periods(
+        data, 4, extremes=[(0, 'max'), (1, 'min_total')])
+    assert_equal(len(result.periods), 4)
+    assert_equal(result.weights.sum(), 60)
+    assert_equal(result.weights[list(result.periods).index(17)], 1)
+    np.testing.assert_array_equal(
+        result.profiles[result.assignment[17]], data.reshape(60, 24, 2)[17])
+
+
+def test_blocked_distances():
+    features = periods._Features(DATA, 24, None, block_size=4)
+    x = features.block(np.arange(60))
+    d = features.distances(x[:5])
+    expected = ((x[:, None, :] - x[None, :5, :]) ** 2).sum(axis=-1)
+    np.testing.assert_allclose(d, expected, atol=1e-10)
+
+
+def test_repeated_periods():
+    # three distinct days, each repeated four times
+    data = np.tile(DAY_TYPES, (4, 1, 1)).reshape(-1, 2)
+    for method in ['kmeans', 'kmedoids', 'hierarchical']:
+        with warnings.catch_warnings(record=True) as caught:
+            warnings.simplefilter('always')
+            result = periods.representative_periods(data, 5, method=method)
+        assert_equal(len(caught), 1)
+        np.testing.assert_array_equal(result.weights, [4, 4, 4])
+        np.testing.assert_array_equal(result.periods, [0, 1, 2])
+        np.testing.assert_allclose(periods.reconstruct(result), data)
+
+
+def test_bad_arguments():
+    assert_raises(ValueError, periods.representative_periods, DATA, 0)
+    assert_raises(ValueError, periods.representative_periods, DATA, 3,
+                  method='spectral')
+    assert_raises(ValueError, periods.representative_periods, DATA, 3,
+                  extremes=[(0, 'peak')])
+    assert_raises(ValueError, periods.representative_periods, DATA, 3,
+                  series_weights=[1., 0.])
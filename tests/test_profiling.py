@@ -0,0 +1,173 @@
+import json
+import os
+import random
+import subprocess
+import sys
+import tempfile
+import time
+
+from nose.tools import assert_equal, assert_true, assert_almost_equal
+
+from toolchest import profiling
+
+
+def _registry():
+    return profiling.Registry(enabled=True)
+
+
+def test_profile_decorator():
+    reg = _registry()
+
+    @profiling.profile(registry=reg)
+    def f(x):
+        return 2 * x
+
+    assert_equal([f(i) for i in range(5)], [0, 2, 4, 6, 8])
+    name, = reg.stats
+    assert_true(name.endswith('test_profile_decorator.<locals>.f'))
+    assert_equal(reg.stats[name].count, 5)
+    assert_equal(len(reg.stats[name].samples), 5)
+
+
+def test_profile_generator():
+    reg = _registry()
+
+    @profiling.profile(name='g', registry=reg)
+    def g(n):
+        for i in range(n):
+            time.sleep(.01)
+            yield i
+        return n
+
+    for i in g(3):
+        time.sleep(.05)
+    stats = reg.stats['g']
+    assert_equal(stats.count, 1)
+    # the items' production is timed, not the loop consuming them
+    assert_true(.03 <= stats.wall < .1)
+
+    items = g(3)
+    next(items)
+    items.close()
+    assert_equal(reg.stats['g'].count, 2)
+
+
+def test_disabled():
+    reg = profiling.Registry()
+
+    @profiling.profile(name='f', registry=reg)
+    def f():
+        return 1
+
+    f()
+    assert_equal(reg.stats, {})
+    reg.enable()
+    f()
+    assert_equal(reg.stats['f'].count, 1)
+
+
+def test_timed_records_exceptions():
+    reg = _registry()
+    try:
+        with profiling.timed('block', registry=reg):
+            raise ValueError()
+    except ValueError:
+        pass
+    assert_equal(reg.stats['block'].count, 1)
+
+
+def test_memory():
+    reg = profiling.Registry(enabled=True, memory=True)
+    keep = []
+    with profiling.timed('alloc', registry=reg):
+        keep.append(bytearray(10 ** 6))
+    assert_true(reg.stats['alloc'].bytes >= 10 ** 6)
+
+
+def test_memory_peak():
+    reg = profiling.Registry(enabled=True, memory=True)
+    with profiling.timed('outer', registry=reg):
+        with profiling.timed('temporary', registry=reg):
+            bytearray(10 ** 6)
+        with profiling.timed('small', registry=reg):
+            bytearray(10)
+    if profiling._RESET_PEAK:
+        assert_true(reg.stats['temporary'].bytes >= 10 ** 6)
+        assert_true(reg.stats['outer'].bytes >= 10 ** 6)
+        assert_true(reg.stats['small'].bytes < 10 ** 5)
+
+
+def test_reservoir_bounded():
+    stats = profiling.Stats()
+    for i in range(3 * profiling.RESERVOIR_SIZE):
+        stats.add(float(i), 0.)
+    assert_equal(len(stats.samples), profiling.RESERVOIR_SIZE)
+    assert_equal(stats.count, 3 * profiling.RESERVOIR_SIZE)
+
+
+def test_global_random_untouched():
+    reg = _registry()
+
+    @profiling.profile(name='f', registry=reg)
+    def f():
+        pass
+
+    random.seed(0)
+    expected = random.random()
+    random.seed(0)
+    for _ in range(2 * profiling.RESERVOIR_SIZE):
+        f()
+    reg.stats['f'].merge(reg.stats['f'])
+    assert_equal(random.random(), expected)
+
+
+def test_percentile():
+    stats = profiling.Stats()
+    for i in range(101):
+        stats.add(float(i), float(2 * i))
+    assert_equal(stats.percentile(50), 50.)
+    assert_equal(stats.percentile(99), 99.)
+    assert_equal(stats.percentile(50, 'cpu'), 100.)
+    assert_equal(stats.percentile(99, 'cpu'), 198.)
+
+
+def test_merge_json():
+    a, b = _registry(), _registry()
+    a.record('f', 1., 0.5)
+    b.record('f', 2., 1.)
+    b.record('g', 4., 4.)
+    merged = profiling.Registry().merge(json.loads(a.to_json()))
+    merged.merge(b)
+    assert_equal(merged.stats['f'].count, 2)
+    assert_almost_equal(merged.stats['f'].wall, 3.)
+    assert_equal(merged.stats['g'].count, 1)
+    table = merged.table()
+    assert_true(table.splitlines()[2].startswith('g '))
+
+
+def test_collect():
+    d = tempfile.mkdtemp()
+    for i in range(3):
+        reg = _registry()
+        reg.record('f', 1., 1.)
+        reg.to_json(os.path.join(d, 'profile-{}.json'.format(i)))
+    merged = profiling.collect(os.path.join(d, '*.json'))
+    assert_equal(merged.stats['f'].count, 3)
+
+
+def test_env_switch():
+    code = ('from toolchest import foo, profiling; foo.bar(); '
+            'print(profiling.registry.stats["toolchest.foo.bar"].count)')
+    env = dict(os.environ, TOOLCHEST_PROFILE='1')
+    out = subprocess.check_output([sys.executable, '-c', code], env=env,
+                                  universal_newlines=True)
+    assert_equal(out.strip(), '1')
+
+
+def test_dump_dir():
+    d = tempfile.mkdtemp()
+    code = 'from toolchest import foo; foo.bar()'
+    env = dict(os.environ, TOOLCHEST_PROFILE='1', TOOLCHEST_PROFILE_DIR=d)
+    subprocess.check_call([sys.executable, '-c', code], env=env)
+    merged = profiling.collect(os.path.join(d, '*.json'))
+    assert_equal(merged.stats['toolchest.foo.bar'].count, 1)
@@ -0,0 +1,90 @@
+import os
+import subprocess
+import sys
+
+import numpy as np
+from nose.tools import assert_equal, assert_true
+
+from toolchest import _jit, storage
+
+RNG = np.random.RandomState(0)
+RESIDUAL = RNG.normal(size=(200, 5))
+KWARGS = dict(capacity=[1., 2., 3., 4., 0.], power=0.5, initial=0.5,
+              efficiency_in=0.9, efficiency_out=[0.8, 0.9, 1., 1., 1.],
+              standing_loss=0.01)
+
+
+def _soc_args():
+    charge = np.maximum(-RESIDUAL, 0.)
+    discharge = np.maximum(RESIDUAL, 0.)
+    return charge, discharge
+
+
+def test_state_of_charge():
+    soc = storage.state_of_charge([[1.], [1.], [-0.], [0.]],
+                                  [[0.], [0.], [3.], [0.]], capacity=1.5)
+    np.testing.assert_array_equal(soc[:, 0], [1., 1.5, 0., 0.])
+
+
+def test_state_of_charge_losses():
+    soc = storage.state_of_charge(np.ones((2, 1)), np.zeros((2, 1)), 10.,
+                                  initial=1., efficiency_in=0.5,
+                                  standing_loss=0.5)
+    np.testing.assert_allclose(soc[:, 0], [1., 1.])
+
+
+def test_dispatch():
+    soc, flow = storage.dispatch([[-2.], [1.], [1.], [1.]], capacity=1.,
+                                 power=0.8)
+    np.testing.assert_allclose(soc[:, 0], [0.8, 0., 0., 0.])
+    np.testing.assert_allclose(flow[:, 0], [-0.8, 0.8, 0., 0.])
+
+
+def test_dispatch_bounds():
+    soc, flow = storage.dispatch(RESIDUAL, **KWARGS)
+    capacity = np.asarray(KWARGS['capacity'])
+    assert_true((soc >= 0.).all() and (soc <= capacity).all())
+    assert_true((np.abs(flow) <= KWARGS['power'] + 1e-12).all())
+    # stores never discharge into a surplus or charge from a deficit
+    assert_true((flow * RESIDUAL >= 0.).all())
+
+
+def _backends(kern):
+    impls = [kern.loop, kern.fallback]
+    if _jit.numba() is not None:
+        impls.append(_jit.numba().njit(kern.loop))
+    return impls
+
+
+def test_backends_agree():
+    charge, discharge = _soc_args()
+    n = RESIDUAL.shape[1]
+    args = (charge - discharge, np.full(n, 2.), np.zeros(n), np.full(n, .99))
+    results = [impl(*(args + (np.empty_like(charge),)))
+               for impl in _backends(storage._soc)]
+    for result in results[1:]:
+        np.testing.assert_allclose(result, results[0])
+
+    per_series = [np.full(n, v) for v in (2., 0.5, 0.1, 0.99, 0.9, 0.8)]
+    args = (RESIDUAL,) + tuple(per_series)
+    results = [impl(*(args + (np.empty_like(RESIDUAL),
+                              np.empty_like(RESIDUAL))))
+               for impl in _backends(storage._dispatch)]
+    for soc, flow in results[1:]:
+        np.testing.assert_allclose(soc, results[0][0])
+        np.testing.assert_allclose(flow, results[0][1])
+
+
+def test_disable_jit():
+    code = ('from toolchest import storage; '
+            'storage.dispatch([[1.]], 1., 1.); '
+            'print(storage._dispatch.backend)')
+    env = dict(os.environ, TOOLCHEST_DISABLE_JIT='1')
+    out = subprocess.check_output([sys.executable, '-c', code], env=env,
+                                  universal_newlines=True)
+    assert_equal(out.strip(), 'numpy')
+
+
+def test_kernel_backend():
+    expected = 'numpy' if _jit.numba() is None else 'numba'
+    assert_equal(storage._soc.backend, expected)
@@ -0,0 +1,113 @@
+import multiprocessing
+import os
+import tempfile
+
+import numpy as np
+import pandas as pd
+from nose.tools import assert_equal, assert_raises, assert_true
+
+from toolchest.store import Store
+
+COLUMNS = ['a', 'b', 'c', 'd']
+
+
+def _store(tz=None, years=(2019, 2020)):
+    path = os.path.join(tempfile.mkdtemp(), 'store')
+    store = Store.create(path, COLUMNS, dtype=np.float32,
+                         units={'a': 'MW', 'b': 'MW'}, tz=tz)
+    frames = []
+    for year in years:
+        index = pd.date_range(str(year), str(year + 1), freq='h', tz=tz,
+                              inclusive='left')
+        values = np.random.rand(len(index), 4).astype(np.float32)
+        store.append(values, index)
+        frames.append(pd.DataFrame(values, index=index, columns=COLUMNS))
+    return store, pd.concat(frames)
+
+
+def test_roundtrip():
+    store, frame = _store()
+    assert_equal(store.shape, frame.shape)
+    assert_true(store.index.equals(frame.index))
+    assert_equal(store.units, {'a': 'MW', 'b': 'MW', 'c': None, 'd': None})
+    index, values = store.read()
+    np.testing.assert_array_equal(values, frame.values)
+    reopened = Store(store.path)
+    np.testing.assert_array_equal(reopened.read()[1], frame.values)
+
+
+def test_slicing_is_zero_copy():
+    store, frame = _store()
+    index, values = store.read('2019-03-01', '2019-03-02', ['b', 'c'])
+    assert_true(isinstance(values, np.memmap))
+    assert_true(not values.flags.writeable)
+    expected = frame.loc['2019-03-01 00:00':'2019-03-01 23:00', ['b', 'c']]
+    assert_true(index.equals(expected.index))
+    np.testing.assert_array_equal(values, expected.values)
+
+
+def test_slicing_across_blocks():
+    store, frame = _store()
+    index, values = store.read('2019-12-31 22:30', '2020-01-01 02:00',
+                               ['d', 'a'])
+    expected = frame.loc['2019-12-31 23:00':'2020-01-01 01:00', ['d', 'a']]
+    assert_true(index.equals(expected.index))
+    np.testing.assert_array_equal(values, expected.values)
+    index, values = store.read('2030', '2031', 'a')
+    assert_equal((len(index), values.shape), (0, (0,)))
+
+
+def test_time_zone():
+    store, frame = _store(tz='Europe/Berlin', years=(2020,))
+    assert_true(store.index.equals(frame.index))
+    index, values = store.read('2020-03-29', '2020-03-30', 'a')
+    assert_equal(len(index), 23)
+
+
+def test_append_checks():
+    store, _ = _store(years=(2020,))
+    index = pd.date_range('2020-12-31', periods=3, freq='h')
+    assert_raises(ValueError, store.append, np.zeros((3, 4)), index)
+    assert_raises(ValueError, store.append, np.zeros((3, 2)),
+                  index + pd.Timedelta('1D'))
+    assert_raises(FileExistsError, Store.create, store.path, COLUMNS)
+
+
+def _read_sum(path):
+    return float(Store(path).read(columns='a')[1].sum())
+
+
+def test_concurrent_readers():
+    store, frame = _store(years=(2020,))
+    with multiprocessing.get_context().Pool(2) as pool:
+        sums = pool.map(_read_sum, [store.path] * 2)
+    np.testing.assert_allclose(sums, frame['a'].sum(), rtol=1e-5)
+
+
+def test_refresh():
+    store, _ = _store(years=(2020,))
+    reader = Store(store.path)
+    index = pd.date_range('2021', periods=10, freq='h')
+    store.append(np.ones((10, 4)), index)
+    assert_equal(len(reader), 8784)
+    reader.refresh()
+    assert_equal(len(reader), 8794)
+
+
+def test_lock_released_by_crashed_writer():
+    import subprocess
+    import sys
+
+    from toolchest.store import LOCK, _Lock
+
+    store, _ = _store(years=(2020,))
+    path = os.path.join(store.path, LOCK)
+    # a writer that dies while holding the lock
+    subprocess.check_call([sys.executable, '-c', (
+        'import os; from toolchest.store import _Lock; '
+        '_Lock({!r}).__enter__(); os._exit(0)').format(path)])
+    with _Lock(path, timeout=1.):
+        assert_raises(TimeoutError, _Lock(path, timeout=0.1).__enter__)
+    index = pd.date_range('2021', periods=10, freq='h')
+    store.append(np.ones((10, 4)), index)
+    assert_equal(len(store), 8794)
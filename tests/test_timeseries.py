@@ -0,0 +1,196 @@
+import numpy as np
+import pandas as pd
+from nose.tools import assert_equal, assert_raises
+
+from toolchest import timeseries
+
+RNG = np.random.RandomState(0)
+
+
+def _energy(values, index):
+    hours = timeseries.durations(index) / 3.6e12
+    return (values * hours[:, None]).sum(axis=0)
+
+
+def test_downsample_matches_pandas():
+    index = pd.date_range('2019-12-30', periods=24 * 7 * 4, freq='h')
+    data = RNG.rand(len(index), 3)
+    for freq in ['3h', 'D']:
+        values, new_index = timeseries.resample(data, index, freq)
+        expected = pd.DataFrame(data, index=index).resample(freq).mean()
+        np.testing.assert_allclose(values, expected.values)
+        assert_equal(list(new_index), list(expected.index))
+    values, _ = timeseries.resample(data, index, 'h', quantity='energy')
+    np.testing.assert_allclose(values, data)
+
+
+def test_weekly_bins_start_monday():
+    index = pd.date_range('2020-01-01', periods=14, freq='D')
+    _, weeks = timeseries.resample(np.ones(14), index, '7D')
+    assert_equal(list(weeks.dayofweek), [0, 0, 0])
+
+
+def test_upsample():
+    index = pd.date_range('2020-01-01', periods=3, freq='h')
+    data = np.array([[1., 4.], [2., 8.], [3., 12.]])
+    values, new_index = timeseries.resample(data, index, '15min')
+    np.testing.assert_array_equal(values, np.repeat(data, 4, axis=0))
+    assert_equal(len(new_index), 12)
+    assert_equal(new_index[-1], pd.Timestamp('2020-01-01 02:45'))
+    values, _ = timeseries.resample(data, index, '15min', quantity='energy')
+    np.testing.assert_array_equal(values.sum(axis=0), data.sum(axis=0))
+    assert_raises(ValueError, timeseries.resample, data, index, '25min')
+
+
+def test_leap_year():
+    index = pd.date_range('2020-01-01', '2020-12-31 23:00', freq='h')
+    values, days = timeseries.resample(np.ones(len(index)), index, 'D',
+                                       quantity='energy')
+    assert_equal(len(days), 366)
+    assert_equal(values.sum(), 8784)
+
+
+def test_dst_days():
+    utc = pd.date_range('2020-03-27 23:00', '2020-10-27 23:00', freq='h',
+                        tz='UTC', inclusive='left')
+    index = utc.tz_convert('Europe/Berlin')
+    data = RNG.rand(len(index), 2)
+    values, days = timeseries.resample(data, index, 'D', quantity='energy')
+    hours = pd.Series(1, index=index).groupby(index.date).sum()
+    assert_equal(list(days.date), list(hours.index))
+    assert_equal(hours.loc[pd.Timestamp('2020-03-29').date()], 23)
+    assert_equal(hours.loc[pd.Timestamp('2020-10-25').date()], 25)
+    np.testing.assert_allclose(values.sum(axis=0), data.sum(axis=0))
+
+    # rates conserve energy across 23 and 25 hour days in both directions
+    daily, days = timeseries.resample(data, index, 'D')
+    np.testing.assert_allclose(_energy(daily, days), _energy(data, index))
+    hourly, hours = timeseries.resample(daily, days, 'h')
+    assert_equal(len(hours), len(index))
+    assert_equal(list(hours), list(index))
+    np.testing.assert_allclose(_energy(hourly, hours), _energy(data, index))
+
+
+def test_dst_repeated_hour():
+    utc = pd.date_range('2020-10-24 22:00', periods=4 * 4, freq='15min',
+                        tz='UTC')
+    index = utc.tz_convert('Europe/Berlin')
+    values, hours = timeseries.resample(np.arange(16.), index, 'h')
+    assert_equal(len(hours), 4)
+    np.testing.assert_allclose(values, [1.5, 5.5, 9.5, 13.5])
+    assert_equal(list(hours), list(utc[::4].tz_convert('Europe/Berlin')))
+
+
+def test_typical_day():
+    index = pd.date_range('2020-01-01', '2020-02-29 23:00', freq='h')
+    data = np.column_stack([index.hour, index.month]).astype(float)
+    profiles, groups = timeseries.typical_day(data, index, by='month')
+    assert_equal(profiles.shape, (2, 24, 2))
+    np.testing.assert_array_equal(groups, [1, 2])
+    np.testing.assert_array_equal(profiles[1, :, 0], np.arange(24))
+    np.testing.assert_array_equal(profiles[:, 5, 1], [1, 2])
+    profile, _ = timeseries.typical_day(data[:, 0], index)
+    assert_equal(profile.shape, (1, 24))
+
+
+def _measured():
+    index = pd.date_range('2020-01-06', periods=96 * 28, freq='15min')
+    hour = (index.hour + index.minute / 60.).values
+    base = 1. + np.sin(hour / 24 * 2 * np.pi)
+    data = base[:, None] * [1., 2., 3.] + RNG.normal(0, 0.01, (len(index), 3))
+    return index, data
+
+
+def test_flag_faults():
+    index, data = _measured()
+    data[100:104, 0] = np.nan
+    data[200:210, 1] = data[200, 1]
+    data[300, 2] += 5.
+    data[400:410, 2] = 0.
+    flags = timeseries.flag_faults(data)
+    assert_equal(list(np.flatnonzero(flags[:, 0])), [100, 101, 102, 103])
+    assert_equal((flags[:, 0] == timeseries.GAP).sum(), 4)
+    np.testing.assert_array_equal(np.flatnonzero(flags[:, 1]),
+                                  np.arange(200, 210))
+    assert_equal(flags[205, 1], timeseries.FLATLINE)
+    assert_equal(list(np.flatnonzero(flags[:, 2])), [300])
+    assert_equal(flags[300, 2], timeseries.SPIKE)
+    flags = timeseries.flag_faults(data[:, 2], zero_flatlines=True)
+    assert_equal(flags[405], timeseries.FLATLINE)
+
+
+def test_repair_linear():
+    data = np.array([[1., 0.], [np.nan, 1.], [np.nan, 2.], [4., np.nan],
+                     [5., np.nan]])
+    values, flags = timeseries.repair(data, spike=0)
+    np.testing.assert_allclose(values, [[1., 0.], [2., 1.], [3., 2.],
+                                        [4., 2.], [5., 2.]])
+    assert_equal(flags[1, 0], timeseries.GAP | timeseries.REPAIRED)
+    assert_equal(flags[0, 0], 0)
+    values, flags = timeseries.repair(data, max_gap=1, spike=0)
+    assert_equal(np.isnan(values).sum(), 4)
+    assert_equal(flags[1, 0], timeseries.GAP)
+
+
+def test_repair_profile_and_neighbours():
+    index, data = _measured()
+    broken = data.copy()
+    broken[1000:1040, 0] = np.nan
+    broken[1500, 1] = 50.
+    for method in ['profile', 'neighbours']:
+        values, flags = timeseries.repair(broken, index, method=method)
+        np.testing.assert_allclose(values[1000:1040], data[1000:1040],
+                                   atol=0.1)
+        np.testing.assert_allclose(values[1500, 1], data[1500, 1], atol=0.1)
+        assert_equal(flags[1500, 1], timeseries.SPIKE | timeseries.REPAIRED)
+    # a straight line misses the daily cycle over a ten hour gap
+    values, _ = timeseries.repair(broken, index)
+    assert_equal(np.abs(values[1000:1040, 0] - data[1000:1040, 0]).max()
+                 > 0.3, True)
+    assert_raises(ValueError, timeseries.repair, broken, method='profile')
+
+
+def test_align_to_utc():
+    index = pd.date_range('2020-01-01', periods=8784, freq='h')
+    data = RNG.rand(len(index), 3)
+    zones = ['Europe/Lisbon', 'Europe/Helsinki', 'Europe/Lisbon']
+    values, utc = timeseries.align_to_utc(data, index, zones)
+    assert_equal(utc[0], pd.Timestamp('2019-12-31 22:00', tz='UTC'))
+    for col, zone in enumerate(zones):
+        local = index.tz_localize(zone, ambiguous=np.ones(len(index), bool),
+                                  nonexistent='NaT')
+        expected = pd.Series(data[:, col], local)[local.notna()]
+        expected = expected.tz_convert('UTC').reindex(utc)
+        np.testing.assert_allclose(values[:, col], expected.values)
+    values, utc = timeseries.align_to_utc(data[:, 0], index, 'Europe/Lisbon',
+                                          start='2020-06-01',
+                                          stop='2020-06-02')
+    np.testing.assert_allclose(values, data[152 * 24 + 1:153 * 24 + 1, 0])
+
+
+def test_align_to_utc_repeated_hour():
+    # recorded in local time, with the hour clocks go back twice
+    local = pd.date_range('2020-10-25', periods=25, freq='h',
+                          tz='Europe/Berlin')
+    index = local.tz_localize(None)
+    values, utc = timeseries.align_to_utc(np.arange(25.), index,
+                                          'Europe/Berlin')
+    assert_equal(list(utc), list(local.tz_convert('UTC')))
+    np.testing.assert_allclose(values, np.arange(25.))
+
+
+def test_day_types():
+    index = pd.date_range('2020-12-24', periods=4 * 24, freq='h',
+                          tz='Europe/Berlin')
+    types = timeseries.day_types(index)
+    assert_equal(list(types[::24]), [timeseries.WORKDAY, timeseries.WORKDAY,
+                                     timeseries.SATURDAY, timeseries.SUNDAY])
+    types = timeseries.day_types(index, holidays=['2020-12-25'])
+    assert_equal(list(types[::24]), [0, 2, 1, 2])
+    try:
+        import holidays  # noqa: F401
+    except ImportError:
+        return
+    # the 26th is a holiday in Germany too
+    types = timeseries.day_types(index, country='DE')
+    assert_equal(list(types[::24]), [0, 2, 2, 2])
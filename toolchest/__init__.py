@@ -0,0 +1,35 @@
+"""Openmod's Python toolchest.
+
+Subject modules (e.g., ``toolchest.foo``) are imported lazily on first
+attribute access, so ``import toolchest`` does not pay for numpy, pandas or
+the GIS stack until a module that needs them is actually used.
+"""
+import importlib
+
+__all__ = [
+    'analytics',
+    'cache',
+    'codec',
+    'foo',
+    'gis',
+    'io',
+    'parallel',
+    'periods',
+    'profiling',
+    'storage',
+    'store',
+    'timeseries',
+]
+
+
+def __getattr__(name):
+    if name in __all__:
+        # import_module binds the submodule on the package, so later lookups
+        # never reach this hook
+        return importlib.import_module('.' + name, __name__)
+    raise AttributeError(
+        'module {!r} has no attribute {!r}'.format(__name__, name))
+
+
+def __dir__():
+    return sorted(set(globals()) | set(__all__))
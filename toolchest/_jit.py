@@ -0,0 +1,93 @@
+"""Dispatch of numeric kernels to numba, with a numpy fallback.
+
+A kernel is written twice: as an explicit loop that numba compiles, and as
+a numpy implementation with the same signature and results. The loop is
+used if numba is installed (``pip install toolchest[fast]``) and JIT
+compilation has not been disabled via the ``TOOLCHEST_DISABLE_JIT``
+environment variable; otherwise the numpy version runs.
+
+Numba is imported and kernels are compiled on their first call only, and
+compiled kernels are cached on disk, so neither importing toolchest nor
+later runs pay for compilation.
+
+Examples
+--------
+>>> def _total_numpy(x, out):
+...     out[:] = x.sum(axis=0)
+...     return out
+>>> @kernel(_total_numpy)
+... def _total(x, out):
+...     for t in range(x.shape[0]):
+...         for j in range(x.shape[1]):
+...             out[j] += x[t, j]
+...     return out
+"""
+import functools
+import os
+
+ENV_VAR = 'TOOLCHEST_DISABLE_JIT'
+
+# options passed to numba.njit unless a kernel overrides them
+JIT_OPTIONS = {'cache': True, 'nogil': True}
+
+_numba = []
+
+
+def numba():
+    """The numba module, or None if it is unavailable or disabled"""
+    if os.environ.get(ENV_VAR, '').strip().lower() not in \
+            ('', '0', 'false', 'no', 'off'):
+        return None
+    if not _numba:
+        try:
+            import numba as module
+        except ImportError:
+            module = None
+        _numba.append(module)
+    return _numba[0]
+
+
+class Kernel(object):
+    """A numeric kernel with a numba and a numpy implementation
+
+    Parameters
+    ----------
+    loop : callable
+        Loop implementation in the subset of Python numba compiles
+    fallback : callable
+        Numpy implementation with the same signature and results
+    options :
+        Passed to `numba.njit`, updating `JIT_OPTIONS`
+    """
+
+    def __init__(self, loop, fallback, **options):
+        self.loop = loop
+        self.fallback = fallback
+        self.options = dict(JIT_OPTIONS, **options)
+        self._impl = None
+        functools.update_wrapper(self, loop)
+
+    @property
+    def backend(self):
+        """``'numba'`` or ``'numpy'``, whichever implementation is used"""
+        return 'numpy' if self._select() is self.fallback else 'numba'
+
+    def _select(self):
+        if self._impl is None:
+            module = numba()
+            if module is None:
+                self._impl = self.fallback
+            else:
+                self._impl = module.njit(**self.options)(self.loop)
+        return self._impl
+
+    def __call__(self, *args):
+        impl = self._impl or self._select()
+        return impl(*args)
+
+
+def kernel(fallback, **options):
+    """Decorator turning a loop implementation into a `Kernel`"""
+    def decorator(loop):
+        return Kernel(loop, fallback, **options)
+    return decorator
@@ -0,0 +1,761 @@
+"""Batched statistics of many time series at once.
+
+All functions take arrays of shape ``(time, series)``, including
+memory-mapped arrays (e.g. from `toolchest.store`), and work through them
+in blocks of columns, so memory use is bounded by `block_bytes` regardless
+of the input size. Quantiles are found by partial sorting
+(`numpy.partition`) or from histograms instead of sorting every series.
+
+`PrefixSums` answers many sum and mean queries over time windows and
+calendar periods of the same series in constant time per query.
+
+`residual_load_stats` screens many capacity mixes of variable renewables
+against the same demand and generation profiles at once.
+
+Rolling window statistics take time linear in the length of the series
+whatever the window length: means and standard deviations come from
+cumulative sums, extrema from the van Herk/Gil-Werman algorithm.
+"""
+import collections
+import datetime
+
+import numpy as np
+import pandas as pd
+
+from toolchest.profiling import profile
+
+# upper bound on the size of the working copies of a block of columns
+BLOCK_BYTES = 2 ** 26
+
+ResidualStats = collections.namedtuple('ResidualStats', [
+    'peak', 'minimum', 'energy', 'curtailment', 'curtailed_hours',
+    'ramp_up', 'ramp_down'])
+ResidualStats.__doc__ = """Result of `residual_load_stats`, per scenario
+
+Attributes
+----------
+peak : numpy.ndarray
+    Highest residual load
+minimum : numpy.ndarray
+    Lowest residual load, negative if renewables exceed demand
+energy : numpy.ndarray
+    Energy of the positive residual load, to be met by other sources
+curtailment : numpy.ndarray
+    Energy of renewable generation exceeding demand
+curtailed_hours : numpy.ndarray
+    Hours with generation exceeding demand
+ramp_up, ramp_down : numpy.ndarray
+    Largest increase and decrease of the residual load from one step to
+    the next, both positive
+"""
+
+
+def _as_2d(data):
+    data = np.asanyarray(data)
+    if data.ndim == 1:
+        return data[:, None], True
+    if data.ndim != 2:
+        raise ValueError('expected an array of shape (time, series)')
+    return data, False
+
+
+def column_blocks(data, block_bytes=BLOCK_BYTES):
+    """Slices of columns of `data` spanning about `block_bytes` each
+
+    Parameters
+    ----------
+    data : numpy.ndarray
+        Array of shape ``(time, series)``
+    block_bytes : int, optional
+        Target size of a block, assuming it is converted to float64
+
+    Returns
+    -------
+    blocks : list of slice
+    """
+    per_column = max(data.shape[0] * 8, 1)
+    width = max(int(block_bytes // per_column), 1)
+    return [slice(start, min(start + width, data.shape[1]))
+            for start in range(0, data.shape[1], width)]
+
+
+def _partition_quantiles(block, q):
+    n = block.shape[0]
+    pos = q * (n - 1)
+    lo = np.floor(pos).astype(int)
+    hi = np.ceil(pos).astype(int)
+    part = np.partition(block, np.unique(np.concatenate([lo, hi])), axis=0)
+    frac = (pos - lo)[:, None]
+    return part[lo] * (1 - frac) + part[hi] * frac
+
+
+def _histogram_quantiles(block, q, bins):
+    n, m = block.shape
+    lo, hi = block.min(axis=0), block.max(axis=0)
+    width = np.where(hi > lo, (hi - lo) / bins, 1.)
+    idx = ((block - lo) / width).astype(np.int64)
+    np.clip(idx, 0, bins - 1, out=idx)
+    idx += np.arange(m) * bins
+    counts = np.bincount(idx.ravel(), minlength=m * bins).reshape(m, bins)
+    cum = np.cumsum(counts, axis=1)
+    # find the bins holding the order statistics next to each quantile in
+    # all series at once, by offsetting the cumulative counts of each series
+    # past those of the previous one, and place every value in the middle of
+    # its share of the bin
+    rows = np.arange(m)[:, None]
+    offsets = rows * (n + 1)
+    pos = q * (n - 1)
+    lower, upper = np.floor(pos), np.ceil(pos)
+
+    def order_statistic(k):
+        b = np.searchsorted((cum + offsets).ravel(), (k + 1 + offsets).ravel())
+        b = np.minimum(b.reshape(m, len(q)) - rows * bins, bins - 1)
+        before = np.where(b > 0, cum[rows, b - 1], 0)
+        within = (k + 0.5 - before) / np.maximum(counts[rows, b], 1)
+        return lo[:, None] + (b + within) * width[:, None]
+
+    frac = pos - lower
+    out = order_statistic(lower) * (1 - frac) + order_statistic(upper) * frac
+    return np.clip(out, lo[:, None], hi[:, None]).T
+
+
+@profile
+def quantiles(data, q, method='partition', bins=1024,
+              block_bytes=BLOCK_BYTES):
+    """Quantiles of every series
+
+    Parameters
+    ----------
+    data : array_like
+        Shape ``(time, series)`` or ``(time,)``
+    q : float or array_like
+        Quantiles in [0, 1]
+    method : str, optional
+        ``'partition'`` for exact quantiles, interpolated linearly like
+        `numpy.quantile`, or ``'histogram'`` for approximations from a
+        histogram of `bins` equal-width bins per series, which are accurate
+        to about ``(max - min) / bins``
+    bins : int, optional
+        Number of histogram bins
+    block_bytes : int, optional
+        Memory budget per block of columns
+
+    Returns
+    -------
+    quantiles : numpy.ndarray
+        Shape ``(len(q), series)``, without the dimensions of scalar `q` or
+        one-dimensional `data`
+    """
+    data, flat = _as_2d(data)
+    scalar = np.ndim(q) == 0
+    q = np.atleast_1d(np.asarray(q, dtype=float))
+    if ((q < 0) | (q > 1)).any():
+        raise ValueError('quantiles must be in [0, 1]')
+    if method not in ('partition', 'histogram'):
+        raise ValueError("method must be 'partition' or 'histogram'")
+    out = np.empty((len(q), data.shape[1]))
+    for cols in column_blocks(data, block_bytes):
+        block = np.asarray(data[:, cols], dtype=float)
+        if method == 'partition':
+            out[:, cols] = _partition_quantiles(block, q)
+        else:
+            out[:, cols] = _histogram_quantiles(block, q, bins)
+    if flat:
+        out = out[:, 0]
+    return out[0] if scalar else out
+
+
+@profile
+def duration_curve(data, points=None, block_bytes=BLOCK_BYTES):
+    """Duration curves (values sorted in descending order) of every series
+
+    Parameters
+    ----------
+    data : array_like
+        Shape ``(time, series)`` or ``(time,)``
+    points : int, optional
+        Evaluate the curves at this many equidistant durations only, from
+        the maximum (duration 0) to the minimum (duration 1), using partial
+        sorts; by default every series is fully sorted
+    block_bytes : int, optional
+        Memory budget per block of columns
+
+    Returns
+    -------
+    durations : numpy.ndarray
+        Share of time (0 to 1) at which each row of `curves` is exceeded
+    curves : numpy.ndarray
+        Shape ``(len(durations), series)``, or ``(len(durations),)`` for
+        one-dimensional `data`
+    """
+    data, flat = _as_2d(data)
+    n = data.shape[0]
+    if points is None:
+        durations = np.arange(n) / max(n - 1, 1.)
+        curves = np.empty(data.shape)
+        for cols in column_blocks(data, block_bytes):
+            curves[:, cols] = np.sort(data[:, cols], axis=0)[::-1]
+    else:
+        durations = np.linspace(0., 1., points)
+        curves = quantiles(data, 1. - durations, block_bytes=block_bytes)
+    return durations, (curves[:, 0] if flat else curves)
+
+
+@profile
+def full_load_hours(data, capacity=None, hours_per_step=1.):
+    """Full load hours of every series
+
+    Parameters
+    ----------
+    data : array_like
+        Power or capacity factors, shape ``(time, series)`` or ``(time,)``
+    capacity : float or array_like, optional
+        Capacity per series; by default the peak of each series, or 1 to
+        turn capacity factors into full load hours
+    hours_per_step : float, optional
+        Length of a time step in hours
+
+    Returns
+    -------
+    hours : numpy.ndarray
+    """
+    data, flat = _as_2d(data)
+    energy = np.asarray(data.sum(axis=0, dtype=float)) * hours_per_step
+    if capacity is None:
+        capacity = np.asarray(data.max(axis=0), dtype=float)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        hours = energy / capacity
+    return hours[0] if flat else hours
+
+
+def peak_mask(index, hours=(8, 20), weekdays_only=True):
+    """Boolean mask of peak time steps
+
+    Parameters
+    ----------
+    index : pandas.DatetimeIndex
+        Start of every time step, in the local time of the market
+    hours : tuple of int, optional
+        First and last (exclusive) hour of the daily peak period
+    weekdays_only : bool, optional
+        Whether weekends are off-peak all day
+
+    Returns
+    -------
+    mask : numpy.ndarray of bool
+    """
+    hour = np.asarray(index.hour)
+    mask = (hour >= hours[0]) & (hour < hours[1])
+    if weekdays_only:
+        mask &= np.asarray(index.dayofweek) < 5
+    return mask
+
+
+@profile
+def peak_offpeak(data, index, hours=(8, 20), weekdays_only=True,
+                 block_bytes=BLOCK_BYTES):
+    """Mean, maximum and minimum of every series in peak and off-peak times
+
+    Parameters
+    ----------
+    data : array_like
+        Shape ``(time, series)``
+    index : pandas.DatetimeIndex
+        Start of every time step, see `peak_mask`
+    hours, weekdays_only : optional
+        Definition of the peak period, see `peak_mask`
+    block_bytes : int, optional
+        Memory budget per block of columns
+
+    Returns
+    -------
+    stats : dict
+        ``{'peak': {'mean': ..., 'max': ..., 'min': ...}, 'offpeak': {...}}``
+        with one value per series each
+    """
+    data, _ = _as_2d(data)
+    mask = peak_mask(index, hours, weekdays_only)
+    stats = {}
+    for name, rows in (('peak', mask), ('offpeak', ~mask)):
+        selected = np.flatnonzero(rows)
+        result = {key: np.full(data.shape[1], np.nan)
+                  for key in ('mean', 'max', 'min')}
+        if len(selected):
+            for cols in column_blocks(data, block_bytes):
+                block = np.asarray(data[selected, cols], dtype=float)
+                result['mean'][cols] = block.mean(axis=0)
+                result['max'][cols] = block.max(axis=0)
+                result['min'][cols] = block.min(axis=0)
+        stats[name] = result
+    return stats
+
+
+ROLLUPS = ('day', 'week', 'month', 'season', 'year')
+
+
+def _calendar_keys(wall, freq):
+    """Calendar period of every wall-clock time in nanoseconds"""
+    from toolchest.timeseries import NS_PER_DAY, WEEK_ORIGIN
+
+    if freq == 'day':
+        return wall // NS_PER_DAY
+    if freq == 'week':
+        return (wall - WEEK_ORIGIN) // (7 * NS_PER_DAY)
+    days = wall.astype('datetime64[ns]').astype('datetime64[M]')
+    months = days.astype(np.int64)
+    if freq == 'month':
+        return months
+    if freq == 'season':
+        # meteorological seasons; December counts to the next year's winter
+        return (months + 1) // 3
+    return months // 12
+
+
+def _grow(array, rows):
+    """`array` with room for at least `rows` rows, doubling its capacity"""
+    if rows <= len(array):
+        return array
+    new = np.empty((max(rows, 2 * len(array)),) + array.shape[1:],
+                   dtype=array.dtype)
+    new[:len(array)] = array
+    return new
+
+
+class PrefixSums(object):
+    """Cumulative sums of time series answering range queries in O(1)
+
+    The sum over any range of time steps is the difference of two rows of
+    the cumulative sums, so once built, sums and means over arbitrary
+    windows and calendar rollups take constant time per window, however
+    long the series. Rows can be appended, e.g. block by block from a
+    `toolchest.store.Store`, at a cost proportional to the new rows only.
+
+    Sums are accumulated in float64; for very long series of large values,
+    sums over short windows lose precision relative to the series' total.
+
+    Parameters
+    ----------
+    data : array_like, optional
+        Initial values of shape ``(time, series)``
+    index : pandas.DatetimeIndex, optional
+        Start of every time step of `data`, sorted; needed for queries by
+        time stamp and for calendar rollups
+    series : int, optional
+        Number of series, if starting without `data`
+
+    Examples
+    --------
+    >>> sums = PrefixSums(series=2)
+    >>> for index, values in store.blocks():  # doctest: +SKIP
+    ...     sums.append(values, index)
+    >>> sums.mean('2020-01', '2020-02')  # doctest: +SKIP
+    >>> monthly, months = sums.rollup('month')  # doctest: +SKIP
+    """
+
+    def __init__(self, data=None, index=None, series=None):
+        if data is not None:
+            series = _as_2d(data)[0].shape[1]
+        elif series is None:
+            raise ValueError('either data or series must be given')
+        self._cum = np.zeros((1, series))
+        self._utc = np.empty(0, dtype=np.int64)
+        self._wall = np.empty(0, dtype=np.int64)
+        self._rows = 0
+        self.tz = None
+        self._indexed = None
+        # calendar rollup -> (last key, start positions of its periods)
+        self._rollups = {}
+        if data is not None:
+            self.append(data, index)
+
+    def __len__(self):
+        return self._rows
+
+    @property
+    def series(self):
+        return self._cum.shape[1]
+
+    @profile
+    def append(self, values, index=None):
+        """Append rows after the last one
+
+        Parameters
+        ----------
+        values : array_like
+            Values of shape ``(time, series)``
+        index : pandas.DatetimeIndex, optional
+            Start of every new time step; required if the existing rows
+            have an index and not allowed otherwise
+        """
+        from toolchest.timeseries import _times
+
+        values, _ = _as_2d(values)
+        n = len(values)
+        if values.shape[1] != self.series:
+            raise ValueError('expected {} series'.format(self.series))
+        # the first rows decide whether there is an index, and its zone
+        indexed, tz = self._indexed, self.tz
+        if indexed is None:
+            indexed = index is not None
+            tz = None if index is None else pd.DatetimeIndex(index).tz
+        if indexed != (index is not None):
+            raise ValueError('index must be given if and only if the '
+                             'existing rows have one')
+        if index is not None:
+            index = pd.DatetimeIndex(index)
+            if len(index) != n:
+                raise ValueError('index and values differ in length')
+            if (index.tz is None) != (tz is None):
+                raise ValueError('time zone of index does not match')
+            wall, utc = _times(index)
+            if (np.diff(utc) <= 0).any() or (
+                    self._rows and n and utc[0] <= self._utc[self._rows - 1]):
+                raise ValueError('index must be increasing')
+
+        self._indexed, self.tz = indexed, tz
+        rows = self._rows
+        self._cum = _grow(self._cum, rows + n + 1)
+        np.cumsum(values, axis=0, dtype=float, out=self._cum[rows + 1:][:n])
+        self._cum[rows + 1:rows + n + 1] += self._cum[rows]
+        if index is not None:
+            self._utc = _grow(self._utc, rows + n)
+            self._wall = _grow(self._wall, rows + n)
+            self._utc[rows:rows + n] = utc
+            self._wall[rows:rows + n] = wall
+            for freq, (last, starts) in list(self._rollups.items()):
+                self._rollups[freq] = self._extend(freq, last, starts, rows,
+                                                   wall)
+        self._rows += n
+
+    @staticmethod
+    def _extend(freq, last, starts, offset, wall):
+        if not len(wall):
+            return last, starts
+        keys = _calendar_keys(wall, freq)
+        new = np.flatnonzero(np.r_[keys[0] != last, keys[1:] != keys[:-1]])
+        return keys[-1], np.concatenate([starts, new + offset])
+
+    def _positions(self, bound, default):
+        if bound is None:
+            return default
+        if isinstance(bound, (str, datetime.date, np.datetime64)) or (
+                np.ndim(bound) and not np.issubdtype(np.asarray(bound).dtype,
+                                                     np.integer)):
+            if not self._indexed:
+                raise ValueError('queries by time need an index')
+            stamps = pd.DatetimeIndex(np.atleast_1d(bound))
+            if stamps.tz is None and self.tz is not None:
+                stamps = stamps.tz_localize(self.tz)
+            elif stamps.tz is not None:
+                stamps = stamps.tz_convert(self.tz)
+            pos = np.searchsorted(self._utc[:self._rows],
+                                  stamps.as_unit('ns').asi8)
+            return pos if np.ndim(bound) else pos[0]
+        pos = np.asarray(bound)
+        if ((pos < 0) | (pos > self._rows)).any():
+            raise IndexError('positions out of range')
+        return pos
+
+    def sum(self, start=None, stop=None):
+        """Sums over the time steps ``start <= t < stop``
+
+        Parameters
+        ----------
+        start, stop : int or str or datetime or array_like, optional
+            Positions, or time stamps such as strings, `datetime.datetime`,
+            `datetime.date` (midnight), `pandas.Timestamp` or
+            `numpy.datetime64` (naive ones are taken in the time zone of the
+            index); arrays answer many windows at once
+
+        Returns
+        -------
+        sums : numpy.ndarray
+            Shape ``(series,)``, or ``(windows, series)`` for arrays of
+            bounds
+        """
+        a = self._positions(start, 0)
+        b = self._positions(stop, self._rows)
+        return self._cum[b] - self._cum[a]
+
+    def mean(self, start=None, stop=None):
+        """Means over the time steps ``start <= t < stop``, see `sum`
+
+        Windows without time steps are NaN.
+        """
+        a = self._positions(start, 0)
+        b = self._positions(stop, self._rows)
+        with np.errstate(invalid='ignore', divide='ignore'):
+            return (self._cum[b] - self._cum[a]) / np.asarray(
+                b - a, dtype=float)[..., None]
+
+    @profile
+    def rollup(self, freq, how='sum'):
+        """Sums or means per calendar period
+
+        Period boundaries are found once per `freq` and kept up to date as
+        rows are appended, so repeated rollups only take time proportional
+        to the number of periods.
+
+        Parameters
+        ----------
+        freq : str
+            ``'day'``, ``'week'`` (starting on Monday), ``'month'``,
+            ``'season'`` (meteorological, winter is December to February)
+            or ``'year'``, in the local time of the index
+        how : str, optional
+            ``'sum'`` or ``'mean'``
+
+        Returns
+        -------
+        values : numpy.ndarray
+            Shape ``(periods, series)``
+        starts : pandas.DatetimeIndex
+            First time step of every period
+        """
+        if freq not in ROLLUPS:
+            raise ValueError('freq must be one of {}'.format(ROLLUPS))
+        if how not in ('sum', 'mean'):
+            raise ValueError("how must be 'sum' or 'mean'")
+        if not self._indexed:
+            raise ValueError('calendar rollups need an index')
+        if freq not in self._rollups:
+            self._rollups[freq] = self._extend(
+                freq, None, np.empty(0, dtype=np.int64), 0,
+                self._wall[:self._rows])
+        starts = self._rollups[freq][1]
+        stops = np.append(starts[1:], self._rows)
+        if how == 'sum':
+            values = self.sum(starts, stops)
+        else:
+            values = self.mean(starts, stops)
+        index = pd.DatetimeIndex(self._utc[starts].astype('datetime64[ns]'),
+                                 tz='UTC')
+        index = index.tz_convert(self.tz) if self.tz is not None else \
+            index.tz_localize(None)
+        return values, index
+
+
+def capacity_grid(*options):
+    """All combinations of capacity options of several technologies
+
+    Parameters
+    ----------
+    *options : array_like
+        Capacity options of each technology
+
+    Returns
+    -------
+    capacities : numpy.ndarray
+        Shape ``(combinations, technologies)``, the last technology varying
+        fastest
+
+    Examples
+    --------
+    >>> capacity_grid([0, 10], [0, 5, 20]).shape
+    (6, 2)
+    """
+    grids = np.meshgrid(*[np.asarray(o, dtype=float) for o in options],
+                        indexing='ij')
+    return np.stack([g.ravel() for g in grids], axis=1)
+
+
+@profile
+def residual_load_stats(demand, profiles, capacities, hours_per_step=1.,
+                        block_bytes=BLOCK_BYTES):
+    """Residual load, curtailment and ramp statistics of many scenarios
+
+    The residual load of a scenario is the demand minus the generation of
+    variable renewables, i.e. their profiles times the scenario's
+    capacities. All scenarios are evaluated with one matrix product per
+    block of scenarios, so memory use is bounded by `block_bytes` however
+    many scenarios there are.
+
+    Parameters
+    ----------
+    demand : array_like
+        Demand of shape ``(time,)``
+    profiles : array_like
+        Capacity factors of shape ``(time, technologies)``, e.g. of wind,
+        solar and run-of-river
+    capacities : array_like
+        Capacities of shape ``(scenarios, technologies)``, e.g. from
+        `capacity_grid`
+    hours_per_step : float, optional
+        Length of a time step in hours
+    block_bytes : int, optional
+        Memory budget per block of scenarios
+
+    Returns
+    -------
+    stats : ResidualStats
+    """
+    demand = np.asarray(demand, dtype=float)
+    profiles, _ = _as_2d(profiles)
+    capacities = np.atleast_2d(np.asarray(capacities, dtype=float))
+    if profiles.shape[0] != len(demand):
+        raise ValueError('demand and profiles differ in length')
+    if capacities.shape[1] != profiles.shape[1]:
+        raise ValueError('expected one capacity per profile')
+    profiles = np.asarray(profiles, dtype=float)
+    n, scenarios = len(demand), len(capacities)
+    stats = ResidualStats(*(np.empty(scenarios)
+                            for _ in ResidualStats._fields))
+    # the residual load and its step changes are the largest working copies
+    width = max(int(block_bytes // (2 * 8 * max(n, 1))), 1)
+    for start in range(0, scenarios, width):
+        cols = slice(start, min(start + width, scenarios))
+        residual = profiles @ capacities[cols].T
+        np.subtract(demand[:, None], residual, out=residual)
+        stats.peak[cols] = residual.max(axis=0)
+        stats.minimum[cols] = residual.min(axis=0)
+        total = residual.sum(axis=0)
+        stats.curtailed_hours[cols] = (residual < 0).sum(axis=0)
+        ramps = np.diff(residual, axis=0)
+        stats.ramp_up[cols] = np.maximum(ramps.max(axis=0, initial=0.), 0.)
+        stats.ramp_down[cols] = -np.minimum(ramps.min(axis=0, initial=0.),
+                                            0.)
+        del ramps
+        np.maximum(residual, 0., out=residual)
+        stats.energy[cols] = residual.sum(axis=0)
+        stats.curtailment[cols] = np.maximum(stats.energy[cols] - total, 0.)
+    for field in ('energy', 'curtailment', 'curtailed_hours'):
+        getattr(stats, field)[:] *= hours_per_step
+    return stats
+
+
+ROLLING = ('mean', 'std', 'min', 'max')
+
+
+def _rolling_extreme(block, window, ufunc):
+    """van Herk/Gil-Werman running extremes over all columns of `block`
+
+    Within blocks of `window` rows, the running extreme from the start of
+    the block up to each row and from each row to the end of the block are
+    accumulated; any window spans the end of one block and the start of the
+    next, so its extreme is that of two of these values.
+    """
+    n, m = block.shape
+    blocks = -(-n // window)
+    fill = -np.inf if ufunc is np.maximum else np.inf
+    padded = np.full((blocks * window, m), fill)
+    padded[:n] = block
+    padded = padded.reshape(blocks, window, m)
+    ahead = ufunc.accumulate(padded, axis=1).reshape(-1, m)
+    behind = ufunc.accumulate(padded[:, ::-1], axis=1)[:, ::-1].reshape(-1, m)
+    return ufunc(behind[:n - window + 1], ahead[window - 1:n])
+
+
+@profile
+def rolling(data, window, stat='mean', block_bytes=BLOCK_BYTES):
+    """Statistics over all windows of `window` consecutive time steps
+
+    Parameters
+    ----------
+    data : array_like
+        Shape ``(time, series)`` or ``(time,)``
+    window : int
+        Length of the windows, in time steps
+    stat : str, optional
+        ``'mean'``, ``'std'`` (population standard deviation), ``'min'`` or
+        ``'max'``. Standard deviations are found from sums of squares and
+        are accurate to about ``1e-7`` times the spread of the series.
+    block_bytes : int, optional
+        Memory budget per block of columns
+
+    Returns
+    -------
+    values : numpy.ndarray
+        Statistic of the windows starting at every step that are complete,
+        i.e. ``time - window + 1`` rows
+    """
+    data, flat = _as_2d(data)
+    n = data.shape[0]
+    if not 1 <= window <= n:
+        raise ValueError('window must be between 1 and the series length')
+    if stat not in ROLLING:
+        raise ValueError('stat must be one of {}'.format(ROLLING))
+    out = np.empty((n - window + 1, data.shape[1]))
+    for cols in column_blocks(data, block_bytes):
+        block = np.asarray(data[:, cols], dtype=float)
+        if stat in ('min', 'max'):
+            ufunc = np.minimum if stat == 'min' else np.maximum
+            out[:, cols] = _rolling_extreme(block, window, ufunc)
+            continue
+        # centre the series so sums of squares keep their precision
+        block = block - block.mean(axis=0)
+        sums = np.zeros((n + 1, block.shape[1]))
+        np.cumsum(block, axis=0, out=sums[1:])
+        mean = (sums[window:] - sums[:-window]) / window
+        if stat == 'mean':
+            out[:, cols] = mean + np.asarray(data[:, cols].mean(axis=0))
+            continue
+        np.cumsum(block ** 2, axis=0, out=sums[1:])
+        square = (sums[window:] - sums[:-window]) / window
+        out[:, cols] = np.sqrt(np.maximum(square - mean ** 2, 0.))
+    return out[:, 0] if flat else out
+
+
+def ramps(data, steps=1):
+    """Changes of every series over `steps` time steps
+
+    Parameters
+    ----------
+    data : array_like
+        Shape ``(time, series)`` or ``(time,)``
+    steps : int, optional
+        Length of the ramps, e.g. 4 for four-hour ramps of hourly data
+
+    Returns
+    -------
+    ramps : numpy.ndarray
+        ``data[t + steps] - data[t]`` for every `t`, i.e. ``time - steps``
+        rows
+    """
+    if steps < 1:
+        raise ValueError('steps must be positive')
+    data = np.asanyarray(data)
+    return np.subtract(data[steps:], data[:-steps], dtype=float)
+
+
+@profile
+def exceedance(data, threshold, window=None, block_bytes=BLOCK_BYTES):
+    """Number of time steps in which every series exceeds `threshold`
+
+    Parameters
+    ----------
+    data : array_like
+        Shape ``(time, series)`` or ``(time,)``
+    threshold : float or array_like
+        Threshold of all or of every series
+    window : int, optional
+        Count over all windows of this many steps, as in `rolling`, instead
+        of over the whole series
+    block_bytes : int, optional
+        Memory budget per block of columns
+
+    Returns
+    -------
+    counts : numpy.ndarray of int
+    """
+    data, flat = _as_2d(data)
+    threshold = np.broadcast_to(np.asarray(threshold, dtype=float),
+                                data.shape[1:])
+    n = data.shape[0]
+    if window is None:
+        rows = 1
+    elif 1 <= window <= n:
+        rows = n - window + 1
+    else:
+        raise ValueError('window must be between 1 and the series length')
+    out = np.empty((rows, data.shape[1]), dtype=np.int64)
+    for cols in column_blocks(data, block_bytes):
+        above = np.asarray(data[:, cols]) > threshold[cols]
+        if window is None:
+            out[0, cols] = above.sum(axis=0)
+            continue
+        counts = np.zeros((n + 1, above.shape[1]), dtype=np.int64)
+        np.cumsum(above, axis=0, out=counts[1:])
+        out[:, cols] = counts[window:] - counts[:-window]
+    if window is None:
+        out = out[0]
+    return out[..., 0] if flat else out
@@ -0,0 +1,354 @@
+"""Content-addressed on-disk memoization of expensive function calls.
+
+Results are keyed on a stable hash of the function's name and its bound
+arguments. Numpy arrays and pandas objects are hashed by content, and
+`os.PathLike` arguments by path, size and modification time, so editing an
+input file invalidates the results computed from it. Strings naming an
+existing file are hashed by their text, size and modification time.
+
+Arrays are stored as ``.npy`` and data frames as ``.parquet`` (if pyarrow is
+installed) and are memory-mapped when read back; anything else is pickled.
+Every cache directory is capped in size, evicting least recently used
+entries first. Entries are written to a temporary file and atomically moved
+into place, so several processes can share a cache directory without
+locking: a reader sees either a complete entry or none at all.
+
+Examples
+--------
+>>> from toolchest.cache import memoize
+>>> @memoize
+... def aggregate(raster_path, regions):
+...     ...
+"""
+import collections
+import functools
+import hashlib
+import inspect
+import os
+import pickle
+import stat
+import sys
+import tempfile
+import warnings
+
+ENV_VAR = 'TOOLCHEST_CACHE_DIR'
+
+DEFAULT_MAX_BYTES = 2 ** 31
+
+CacheInfo = collections.namedtuple('CacheInfo', ['hits', 'misses'])
+
+
+def default_dir():
+    """The cache directory: ``$TOOLCHEST_CACHE_DIR`` or ``~/.cache/toolchest``
+    """
+    return os.environ.get(ENV_VAR) or \
+        os.path.join(os.path.expanduser('~'), '.cache', 'toolchest')
+
+
+def _module(name):
+    # a type can only be an instance of a library's class if that library has
+    # already been imported, so never import numpy or pandas just to check
+    return sys.modules.get(name)
+
+
+class _Hasher(object):
+
+    def __init__(self):
+        self._h = hashlib.blake2b(digest_size=20)
+
+    def _tag(self, tag):
+        self._h.update(tag.encode() + b'\0')
+
+    def _bytes(self, data):
+        self._h.update(str(len(data)).encode() + b':')
+        self._h.update(data)
+
+    def _file_stat(self, path):
+        try:
+            st = os.stat(path)
+        except (OSError, ValueError):
+            return False
+        if stat.S_ISREG(st.st_mode):
+            self._tag('{}:{}'.format(st.st_size, st.st_mtime_ns))
+        return True
+
+    def update(self, obj):
+        np, pd = _module('numpy'), _module('pandas')
+        if obj is None or isinstance(obj, (bool, int, float, complex)):
+            self._tag(type(obj).__name__)
+            self._bytes(repr(obj).encode())
+        elif isinstance(obj, str):
+            self._tag('str')
+            self._bytes(obj.encode('utf-8'))
+            self._file_stat(obj)
+        elif isinstance(obj, (bytes, bytearray, memoryview)):
+            self._tag('bytes')
+            self._bytes(bytes(obj))
+        elif isinstance(obj, (list, tuple)):
+            self._tag(type(obj).__name__)
+            self._tag(str(len(obj)))
+            for item in obj:
+                self.update(item)
+        elif isinstance(obj, dict):
+            self._tag('dict')
+            items = sorted((stable_hash(k), k, v) for k, v in obj.items())
+            for key_hash, _, value in items:
+                self._tag(key_hash)
+                self.update(value)
+        elif isinstance(obj, (set, frozenset)):
+            self._tag('set')
+            for item_hash in sorted(stable_hash(item) for item in obj):
+                self._tag(item_hash)
+        elif isinstance(obj, os.PathLike):
+            path = os.path.abspath(os.fspath(obj))
+            self._tag('path')
+            self._bytes(os.fsencode(path))
+            if not self._file_stat(path):
+                self._tag('missing')
+        elif np is not None and isinstance(obj, np.ndarray) and \
+                obj.dtype != object:
+            self._tag('ndarray')
+            self._tag('{}{}'.format(obj.dtype.str, obj.shape))
+            self._h.update(memoryview(np.ascontiguousarray(obj)).cast('B'))
+        elif np is not None and isinstance(obj, np.generic):
+            self._tag('npscalar')
+            self._tag(obj.dtype.str)
+            self._bytes(obj.tobytes())
+        elif pd is not None and isinstance(obj, (pd.DataFrame, pd.Series,
+                                                 pd.Index)):
+            self._tag(type(obj).__name__)
+            if isinstance(obj, pd.DataFrame):
+                self.update(list(obj.columns))
+                self.update([str(t) for t in obj.dtypes])
+            else:
+                self.update([obj.name, str(obj.dtype)])
+            if not isinstance(obj, pd.Index):
+                self.update(obj.index)
+            hashed = pd.util.hash_pandas_object(obj, index=False)
+            self.update(np.asarray(hashed))
+        else:
+            self._tag('pickle')
+            self._tag(type(obj).__module__ + '.' + type(obj).__qualname__)
+            self._bytes(pickle.dumps(obj, protocol=4))
+        return self
+
+    def hexdigest(self):
+        return self._h.hexdigest()
+
+
+def stable_hash(*objs):
+    """A hash of `objs` that is stable across processes and sessions
+
+    Parameters
+    ----------
+    objs : objects
+        Python builtins, numpy arrays, pandas objects, paths or any picklable
+        object
+
+    Returns
+    -------
+    digest : str
+        Hexadecimal digest
+    """
+    hasher = _Hasher()
+    for obj in objs:
+        hasher.update(obj)
+    return hasher.hexdigest()
+
+
+class Cache(object):
+    """A size-capped directory of cached results
+
+    Parameters
+    ----------
+    directory : str, optional
+        Where results are stored, defaults to `default_dir`
+    max_bytes : int, optional
+        Size cap of `directory`; least recently used entries are evicted when
+        it is exceeded
+    mmap : bool, optional
+        Whether arrays and data frames are memory-mapped when read back.
+        Memory-mapped arrays are read-only.
+    """
+    EXTENSIONS = ('.npy', '.parquet', '.pkl')
+
+    def __init__(self, directory=None, max_bytes=DEFAULT_MAX_BYTES,
+                 mmap=True):
+        self.directory = directory or default_dir()
+        self.max_bytes = max_bytes
+        self.mmap = mmap
+
+    def _paths(self, key):
+        return [os.path.join(self.directory, key + ext)
+                for ext in self.EXTENSIONS]
+
+    def get(self, key):
+        """Return ``(True, value)`` if `key` is cached, else ``(False, None)``
+        """
+        for path in self._paths(key):
+            try:
+                value = self._load(path)
+            except (FileNotFoundError, EOFError):
+                # absent, or evicted by another process while reading
+                continue
+            try:
+                # the modification time serves as last access time for LRU
+                os.utime(path)
+            except OSError:
+                pass
+            return True, value
+        return False, None
+
+    def _load(self, path):
+        ext = os.path.splitext(path)[1]
+        if ext == '.npy':
+            import numpy as np
+            return np.load(path, mmap_mode='r' if self.mmap else None)
+        elif ext == '.parquet':
+            import pandas as pd
+            return pd.read_parquet(path, memory_map=self.mmap)
+        with open(path, 'rb') as f:
+            return pickle.load(f)
+
+    def put(self, key, value):
+        """Store `value` under `key` and evict old entries if necessary
+
+        Values that cannot be written in their preferred format, e.g. data
+        frames with mixed-type columns that Parquet rejects, are pickled
+        instead.
+
+        Returns
+        -------
+        stored : bool
+            False, with a warning, if `value` could not be stored at all
+        """
+        np, pd = _module('numpy'), _module('pandas')
+        writers = []
+        if np is not None and isinstance(value, np.ndarray) and \
+                value.dtype != object:
+            writers.append(('.npy', lambda f: np.save(f, value)))
+        elif pd is not None and isinstance(value, pd.DataFrame) and \
+                _have_parquet():
+            writers.append(('.parquet', lambda f: value.to_parquet(f)))
+        writers.append(('.pkl', lambda f: pickle.dump(value, f, protocol=4)))
+        error = None
+        for ext, write in writers:
+            try:
+                self._write(key + ext, write)
+            except Exception as e:
+                error = e
+                continue
+            self.evict()
+            return True
+        warnings.warn('could not cache {}: {!r}'.format(key, error))
+        return False
+
+    def _write(self, name, write):
+        if not os.path.isdir(self.directory):
+            os.makedirs(self.directory, exist_ok=True)
+        fd, tmp = tempfile.mkstemp(dir=self.directory, suffix='.tmp')
+        try:
+            with os.fdopen(fd, 'wb') as f:
+                write(f)
+            os.replace(tmp, os.path.join(self.directory, name))
+        except BaseException:
+            os.remove(tmp)
+            raise
+
+    def entries(self):
+        """List ``(last_access, size, path)`` of all entries, oldest first"""
+        entries = []
+        try:
+            names = os.listdir(self.directory)
+        except FileNotFoundError:
+            return entries
+        for name in names:
+            if not name.endswith(self.EXTENSIONS):
+                continue
+            path = os.path.join(self.directory, name)
+            try:
+                st = os.stat(path)
+            except FileNotFoundError:
+                continue
+            entries.append((st.st_mtime_ns, st.st_size, path))
+        return sorted(entries)
+
+    def evict(self, max_bytes=None):
+        """Remove least recently used entries until the cap is met"""
+        max_bytes = self.max_bytes if max_bytes is None else max_bytes
+        entries = self.entries()
+        total = sum(size for _, size, _ in entries)
+        for _, size, path in entries:
+            if total <= max_bytes:
+                break
+            try:
+                os.remove(path)
+            except FileNotFoundError:
+                pass
+            except OSError:
+                # e.g. still memory-mapped on Windows; try again next time
+                continue
+            total -= size
+
+    def clear(self):
+        """Remove all entries"""
+        self.evict(max_bytes=0)
+
+
+def _have_parquet():
+    try:
+        import pyarrow  # noqa: F401
+    except ImportError:
+        return False
+    return True
+
+
+def memoize(func=None, cache=None, version=None, **kwargs):
+    """Decorator caching the results of `func` on disk
+
+    Arguments are bound to the function's signature, including defaults,
+    before hashing, so ``f(1)`` and ``f(x=1)`` share an entry. The decorated
+    function gains ``cache_info()``, returning the hits and misses of this
+    process, and ``cache``, the underlying `Cache`.
+
+    Parameters
+    ----------
+    func : callable
+        The function to memoize; results must not depend on anything but its
+        arguments
+    cache : Cache, optional
+        Where results are stored; by default a `Cache` created from
+        `kwargs`
+    version : object, optional
+        Part of every key; change it to invalidate results after changing
+        `func`
+    kwargs :
+        Passed to `Cache` if `cache` is not given, e.g. `directory`,
+        `max_bytes` or `mmap`
+    """
+    if func is None:
+        return functools.partial(memoize, cache=cache, version=version,
+                                 **kwargs)
+    if cache is None:
+        cache = Cache(**kwargs)
+    signature = inspect.signature(func)
+    name = '{}.{}'.format(func.__module__, func.__qualname__)
+    stats = {'hits': 0, 'misses': 0}
+
+    @functools.wraps(func)
+    def wrapper(*args, **kw):
+        bound = signature.bind(*args, **kw)
+        bound.apply_defaults()
+        key = stable_hash(name, version, bound.args, bound.kwargs)
+        found, value = cache.get(key)
+        if found:
+            stats['hits'] += 1
+            return value
+        stats['misses'] += 1
+        value = func(*args, **kw)
+        cache.put(key, value)
+        return value
+
+    wrapper.cache = cache
+    wrapper.cache_info = lambda: CacheInfo(**stats)
+    return wrapper
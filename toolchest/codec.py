@@ -0,0 +1,278 @@
+"""Compact lossy archives of normalized profiles.
+
+Profiles such as capacity factors or load shares need far less precision
+than float64 offers. An archive stores every column quantized to 16-bit
+integers between a per-column offset and scale, so every value is exact to
+within half a quantization step, ``scale / 2``: about 8e-6 for capacity
+factors between 0 and 1. Each chunk of rows is then delta-encoded along
+time, its bytes shuffled into planes of high and low bytes, and compressed
+with zlib. Smooth profiles shrink far below the 4x of quantization alone.
+
+Chunks are compressed independently and located through a table in the
+archive's footer, so any range of rows is decoded without touching the rest
+of the file.
+
+Examples
+--------
+>>> write('wind.tcq', capacity_factors, bounds=(0, 1))  # doctest: +SKIP
+>>> Archive('wind.tcq').read(4000, 4100)  # doctest: +SKIP
+"""
+import json
+import os
+import struct
+import tempfile
+import zlib
+
+import numpy as np
+import pandas as pd
+
+from toolchest.profiling import profile
+
+MAGIC = b'TCQ1'
+FOOTER = struct.Struct('<Q4s')
+
+# the largest code marks missing values
+LEVELS = 2 ** 16 - 1
+MISSING = LEVELS
+
+
+def quantize(data, bounds=None):
+    """Quantize the columns of `data` to 16-bit codes
+
+    Parameters
+    ----------
+    data : array_like
+        Values of shape ``(time, series)``; NaN values are kept as missing
+    bounds : tuple of float or array_like, optional
+        Lowest and highest value of all or of every column, e.g. ``(0, 1)``
+        for capacity factors; the range of each column by default. Values
+        outside are clipped.
+
+    Returns
+    -------
+    codes : numpy.ndarray of uint16
+    offset, scale : numpy.ndarray
+        Per column, such that values are ``offset + codes * scale``
+    """
+    data = np.asarray(data, dtype=float)
+    if bounds is None and not len(data):
+        lo = hi = np.zeros(data.shape[1:])
+    elif bounds is None:
+        with np.errstate(invalid='ignore'):
+            lo, hi = np.nanmin(data, axis=0), np.nanmax(data, axis=0)
+        lo = np.where(np.isnan(lo), 0., lo)
+        hi = np.where(np.isnan(hi), 0., hi)
+    else:
+        lo, hi = (np.broadcast_to(np.asarray(b, dtype=float), data.shape[1:])
+                  for b in bounds)
+    scale = np.where(hi > lo, (hi - lo) / (LEVELS - 1), 1.)
+    scaled = (data - lo) / scale
+    missing = np.isnan(scaled)
+    scaled[missing] = 0.
+    np.clip(scaled, 0, LEVELS - 1, out=scaled)
+    codes = np.rint(scaled).astype(np.uint16)
+    codes[missing] = MISSING
+    return codes, np.array(lo, dtype=float), scale
+
+
+def dequantize(codes, offset, scale, dtype=np.float64):
+    """Values of the 16-bit `codes` of `quantize`"""
+    values = codes.astype(dtype)
+    values *= np.asarray(scale, dtype=dtype)
+    values += np.asarray(offset, dtype=dtype)
+    values[codes == MISSING] = np.nan
+    return values
+
+
+def _encode_chunk(codes, level):
+    # wrapping differences of consecutive codes are small for smooth series
+    delta = codes.copy()
+    delta[1:] -= codes[:-1]
+    # columns one after the other, with all low bytes before all high ones
+    column_major = np.ascontiguousarray(delta.T, dtype='<u2')
+    planes = column_major.view(np.uint8).reshape(-1, 2).T
+    return zlib.compress(planes.tobytes(), level)
+
+
+def _decode_chunk(payload, rows, columns, select=slice(None), stop=None):
+    """Codes of the columns `select` in the first `stop` rows of a chunk"""
+    planes = np.frombuffer(zlib.decompress(payload), dtype=np.uint8)
+    # only the selected columns are reassembled and summed up
+    planes = planes.reshape(2, columns, rows)[:, select, :stop]
+    delta = planes[0].astype(np.uint16)
+    delta |= planes[1].astype(np.uint16) << 8
+    return np.cumsum(delta.T, axis=0, dtype=np.uint16)
+
+
+@profile
+def write(path, data, columns=None, index=None, bounds=None,
+          chunk_rows=8760, level=6):
+    """Write profiles to an archive
+
+    Parameters
+    ----------
+    path : str or os.PathLike
+        File to write, replaced atomically
+    data : array_like
+        Values of shape ``(time, series)``
+    columns : list of str, optional
+        Column labels, numbered by default
+    index : pandas.DatetimeIndex, optional
+        Time stamps of the rows, of fixed frequency
+    bounds : tuple, optional
+        Lowest and highest values, see `quantize`
+    chunk_rows : int, optional
+        Rows per independently compressed chunk; smaller chunks make
+        reading short ranges cheaper, larger ones compress better
+    level : int, optional
+        zlib compression level, 0 (none) to 9 (smallest)
+    """
+    data = np.asarray(data)
+    if data.ndim != 2:
+        raise ValueError('expected an array of shape (time, series)')
+    if columns is None:
+        columns = [str(i) for i in range(data.shape[1])]
+    if len(columns) != data.shape[1]:
+        raise ValueError('expected one label per column')
+    meta = {'rows': len(data), 'columns': [str(c) for c in columns],
+            'chunk_rows': int(chunk_rows), 'index': None, 'chunks': []}
+    if index is not None:
+        index = pd.DatetimeIndex(index)
+        if len(index) != len(data):
+            raise ValueError('index and data differ in length')
+        steps = np.diff(index.as_unit('ns').asi8)
+        if len(index) < 2 or (steps != steps[0]).any():
+            raise ValueError('index must have a fixed frequency')
+        meta['index'] = {
+            'start': pd.Timestamp(index.as_unit('ns').asi8[0],
+                                  tz='UTC').isoformat(),
+            'freq': pd.Timedelta(steps[0]).isoformat(),
+            'tz': None if index.tz is None else str(index.tz),
+        }
+    codes, offset, scale = quantize(data, bounds)
+    meta['offset'] = offset.tolist()
+    meta['scale'] = scale.tolist()
+
+    path = os.fspath(path)
+    fd, tmp = tempfile.mkstemp(dir=os.path.dirname(os.path.abspath(path)),
+                               suffix='.tmp')
+    with os.fdopen(fd, 'wb') as f:
+        f.write(MAGIC)
+        for start in range(0, len(codes), chunk_rows):
+            payload = _encode_chunk(codes[start:start + chunk_rows], level)
+            meta['chunks'].append([f.tell(), len(payload)])
+            f.write(payload)
+        footer = json.dumps(meta).encode()
+        f.write(footer)
+        f.write(FOOTER.pack(len(footer), MAGIC))
+    os.replace(tmp, path)
+
+
+class Archive(object):
+    """An archive written by `write`, read chunk by chunk on demand
+
+    Parameters
+    ----------
+    path : str or os.PathLike
+    """
+
+    def __init__(self, path):
+        self.path = os.fspath(path)
+        with open(self.path, 'rb') as f:
+            if f.read(len(MAGIC)) != MAGIC:
+                raise ValueError('{} is not an archive'.format(self.path))
+            f.seek(-FOOTER.size, os.SEEK_END)
+            size, magic = FOOTER.unpack(f.read(FOOTER.size))
+            if magic != MAGIC:
+                raise ValueError('{} is truncated'.format(self.path))
+            f.seek(-FOOTER.size - size, os.SEEK_END)
+            meta = json.loads(f.read(size).decode())
+        self.meta = meta
+        self.columns = meta['columns']
+        self.offset = np.array(meta['offset'])
+        self.scale = np.array(meta['scale'])
+        self.chunk_rows = meta['chunk_rows']
+        self._column_pos = {c: i for i, c in enumerate(self.columns)}
+
+    def __len__(self):
+        return self.meta['rows']
+
+    @property
+    def shape(self):
+        return len(self), len(self.columns)
+
+    @property
+    def error(self):
+        """Largest difference between stored and original values per column
+        """
+        return self.scale / 2
+
+    @property
+    def index(self):
+        """Time stamps of the rows, or None if written without an index"""
+        info = self.meta['index']
+        if info is None:
+            return None
+        index = pd.date_range(pd.Timestamp(info['start']), periods=len(self),
+                              freq=pd.Timedelta(info['freq']))
+        return index.tz_convert(info['tz']) if info['tz'] else \
+            index.tz_localize(None)
+
+    def _columns(self, columns):
+        if columns is None:
+            return slice(None)
+        if isinstance(columns, str):
+            return self._column_pos[columns]
+        return [self._column_pos[c] for c in columns]
+
+    def chunks(self, start=0, stop=None, columns=None, dtype=np.float64):
+        """Iterate over the rows ``start <= row < stop`` chunk by chunk
+
+        Parameters
+        ----------
+        start, stop : int, optional
+            Row positions
+        columns : str or list of str, optional
+            A column label or a list of labels, all by default
+        dtype : numpy.dtype, optional
+            Dtype of the decoded values
+
+        Yields
+        ------
+        start : int
+            Position of the first row of the chunk
+        values : numpy.ndarray
+        """
+        stop = len(self) if stop is None else min(stop, len(self))
+        cols = self._columns(columns)
+        select = [cols] if isinstance(cols, int) else cols
+        n = len(self.columns)
+        with open(self.path, 'rb') as f:
+            for i in range(start // self.chunk_rows,
+                           -(-stop // self.chunk_rows)):
+                pos, size = self.meta['chunks'][i]
+                f.seek(pos)
+                first = i * self.chunk_rows
+                rows = min(self.chunk_rows, len(self) - first)
+                a, b = max(start - first, 0), min(stop - first, rows)
+                codes = _decode_chunk(f.read(size), rows, n, select, b)
+                if isinstance(cols, int):
+                    codes = codes[:, 0]
+                yield first + a, dequantize(codes[a:b], self.offset[cols],
+                                            self.scale[cols], dtype)
+
+    def read(self, start=0, stop=None, columns=None, dtype=np.float64):
+        """Read the rows ``start <= row < stop``, see `chunks`
+
+        Only the chunks holding these rows are read and decoded.
+
+        Returns
+        -------
+        values : numpy.ndarray
+        """
+        parts = [values for _, values in self.chunks(start, stop, columns,
+                                                     dtype)]
+        if not parts:
+            cols = self._columns(columns)
+            return np.empty((len(self), len(self.columns)), dtype)[0:0, cols]
+        return np.concatenate(parts) if len(parts) > 1 else parts[0]
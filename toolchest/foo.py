@@ -1,5 +1,8 @@
 """A module docstring"""
+from toolchest.profiling import profile
 
+
+@profile
 def bar():
     """One pretty docstring"""
     return 42
@@ -0,0 +1,1293 @@
+"""Geographic tools for assigning assets, raster data and gridded time
+series to regions.
+
+Vector data is read with fiona and handled as arrays of shapely (2.0 or
+newer) geometries, so predicates run vectorized in GEOS rather than in
+Python loops. Rasters are read with rasterio. Coordinates of points,
+regions and rasters must share one coordinate reference system.
+"""
+import collections
+import math
+import os
+import re
+
+import numpy as np
+
+from toolchest.profiling import profile
+
+FeatureBatch = collections.namedtuple('FeatureBatch', ['geometries',
+                                                       'properties'])
+FeatureBatch.__doc__ = """A batch of features read by `read_features`
+
+Attributes
+----------
+geometries : numpy.ndarray of shapely.Geometry
+    None for features without geometry
+properties : dict
+    An array of the values of every selected property
+"""
+
+ZONAL_STATS = ('sum', 'mean', 'min', 'max', 'count')
+
+# windows of rasters with smaller native blocks (e.g. one-row strips) are
+# grown to about this many pixels, to keep the per-window overhead small
+MIN_WINDOW_PIXELS = 2 ** 20
+
+# side of the square tiles of rasters written by map_windows
+TILE = 256
+
+Exclusion = collections.namedtuple('Exclusion', ['source', 'values',
+                                                 'buffer'])
+Exclusion.__new__.__defaults__ = (None, 0.)
+Exclusion.__doc__ = """An exclusion layer of `eligible_area`
+
+Attributes
+----------
+source : str or os.PathLike or sequence of shapely.Geometry
+    A raster aligned with the grid, or vector features (a fiona-readable
+    file or geometries), e.g. protected areas or roads
+values : sequence, optional
+    For rasters, the values of excluded pixels, e.g. land cover classes;
+    by default all non-zero pixels are excluded
+buffer : float, optional
+    Also exclude everything within this distance (in the grid's
+    coordinate units) of the excluded pixels
+"""
+
+# mean earth radius in km
+EARTH_RADIUS = 6371.0088
+
+Nearest = collections.namedtuple('Nearest', ['bus', 'distance'])
+Nearest.__doc__ = """Nearest buses of sites found by `BusIndex.query`
+
+Attributes
+----------
+bus : numpy.ndarray of int
+    Positions of the buses, of shape ``(sites,)`` or ``(sites, k)``; -1
+    where fewer buses than `k` are eligible or within the maximum distance
+distance : numpy.ndarray
+    Great-circle distances in km, infinite where `bus` is -1
+"""
+
+# bump to invalidate cached area matrices after changes to their computation
+AREA_MATRIX_VERSION = 1
+
+# label rasters and zones of the last few (regions, grid) pairs
+CACHE_SIZE = 8
+_cache = collections.OrderedDict()
+
+
+def _open_features(path, layer, include):
+    import fiona
+    from fiona.errors import DriverError
+
+    try:
+        return fiona.open(path, layer=layer, include_fields=include)
+    except DriverError:
+        # e.g. GeoJSON, which does not support skipping fields while reading
+        return fiona.open(path, layer=layer)
+
+
+@profile
+def read_features(path, properties=None, bbox=None, where=None, layer=None,
+                  batch_size=10000, simplify=None):
+    """Stream the features of a fiona-readable vector file in batches
+
+    The bounding box and attribute filters are handed to OGR, which applies
+    them while reading, using spatial indexes where the format has them;
+    unselected properties are not read where the driver supports skipping
+    them. Only one batch of features is held in memory at a time.
+
+    Parameters
+    ----------
+    path : str or os.PathLike
+        Any file fiona can open, e.g. a shapefile, GeoPackage or GeoJSON
+    properties : list of str, optional
+        Properties to read, all by default
+    bbox : tuple of float, optional
+        ``(minx, miny, maxx, maxy)``; only features whose bounding boxes
+        intersect it are read
+    where : str, optional
+        SQL WHERE clause on the properties, e.g. ``"voltage >= 220000 AND
+        country = 'DE'"``
+    layer : str or int, optional
+        Layer of multi-layer files
+    batch_size : int, optional
+        Features per batch
+    simplify : float, optional
+        Simplify geometries with this tolerance, preserving topology
+
+    Yields
+    ------
+    batch : FeatureBatch
+
+    Examples
+    --------
+    >>> for lines, attrs in read_features(
+    ...         'power_lines.gpkg', ['voltage'], bbox=(5.9, 47.3, 15., 55.1),
+    ...         where="voltage >= 220000"):  # doctest: +SKIP
+    ...     pass
+    """
+    import fiona
+    import shapely
+    from shapely.geometry import shape
+
+    with fiona.open(path, layer=layer) as source:
+        names = list(source.schema['properties'])
+    if properties is None:
+        properties = names
+    else:
+        properties = list(properties)
+        missing = set(properties) - set(names)
+        if missing:
+            raise KeyError('properties not in file: {}'.format(
+                sorted(missing)))
+    # some drivers only evaluate `where` on the fields they read
+    words = set(re.findall(r'[A-Za-z_][A-Za-z0-9_]*', where or ''))
+    include = [n for n in names if n in properties or n in words]
+
+    def batch(geometries, values):
+        array = np.empty(len(geometries), dtype=object)
+        array[:] = geometries
+        if simplify:
+            array = shapely.simplify(array, simplify)
+        return FeatureBatch(array, {name: np.array(column) for name, column
+                                    in zip(properties, values)})
+
+    with _open_features(path, layer, include) as source:
+        features = source.filter(bbox=bbox, where=where) \
+            if bbox is not None or where is not None else iter(source)
+        geometries, values = [], [[] for _ in properties]
+        for feature in features:
+            geometry = feature['geometry']
+            geometries.append(None if geometry is None else shape(geometry))
+            for name, column in zip(properties, values):
+                column.append(feature['properties'][name])
+            if len(geometries) == batch_size:
+                yield batch(geometries, values)
+                geometries, values = [], [[] for _ in properties]
+        if geometries:
+            yield batch(geometries, values)
+
+
+def read_regions(path, id_field=None, layer=None):
+    """Read the geometries of a fiona-readable vector file
+
+    Parameters
+    ----------
+    path : str or os.PathLike
+        Any file fiona can open, e.g. a shapefile, GeoPackage or GeoJSON
+    id_field : str, optional
+        Property identifying each region, e.g. ``'NUTS_ID'``; by default
+        regions are numbered in file order
+    layer : str or int, optional
+        Layer of multi-layer files
+
+    Returns
+    -------
+    geometries : numpy.ndarray of shapely.Geometry
+    ids : list
+    """
+    fields = [] if id_field is None else [id_field]
+    batches = list(read_features(path, fields, layer=layer))
+    geometries = np.concatenate([b.geometries for b in batches]) \
+        if batches else np.empty(0, dtype=object)
+    if id_field is None:
+        return geometries, list(range(len(geometries)))
+    return geometries, [i for b in batches
+                        for i in b.properties[id_field].tolist()]
+
+
+class _RegionIndex(object):
+    """Region geometries with a lazily built STRtree
+
+    Only the geometries are pickled, so every worker process builds its own
+    tree once and reuses it for all its chunks.
+    """
+
+    def __init__(self, geometries):
+        import shapely
+
+        self.geometries = np.asarray(geometries, dtype=object)
+        shapely.prepare(self.geometries)
+        self.bounds = shapely.total_bounds(self.geometries)
+        self._tree = None
+
+    @property
+    def tree(self):
+        if self._tree is None:
+            import shapely
+            self._tree = shapely.STRtree(self.geometries)
+        return self._tree
+
+    def __getstate__(self):
+        return self.geometries
+
+    def __setstate__(self, geometries):
+        self.__init__(geometries)
+
+
+def _assign(xy, index, predicate):
+    import shapely
+
+    result = np.full(len(xy), -1, dtype=np.int64)
+    x, y = xy[:, 0], xy[:, 1]
+    xmin, ymin, xmax, ymax = index.bounds
+    # points outside the bounding box of all regions need no geometry
+    inside = np.flatnonzero((x >= xmin) & (x <= xmax) &
+                            (y >= ymin) & (y <= ymax))
+    if not len(inside):
+        return result
+    points = shapely.points(xy[inside])
+    pairs = index.tree.query(points, predicate=predicate)
+    if pairs.shape[1]:
+        # a point on a shared border takes the region listed first
+        order = np.lexsort((pairs[1], pairs[0]))
+        point, region = pairs[:, order]
+        first = np.r_[True, point[1:] != point[:-1]]
+        result[inside[point[first]]] = region[first]
+    return result
+
+
+@profile
+def assign_points(points, regions, predicate='intersects', processes=None,
+                  chunksize=None):
+    """Region containing each of many points
+
+    Regions are indexed in an STRtree of prepared geometries. Points
+    outside the regions' joint bounding box are discarded up front; the
+    others are tested in bulk, in chunks processed in parallel by
+    `toolchest.parallel.map_chunks` for large inputs.
+
+    Parameters
+    ----------
+    points : array_like
+        Coordinates of shape ``(points, 2)``
+    regions : str or os.PathLike or sequence of shapely.Geometry
+        Region geometries, or a file to read them from with `read_regions`
+    predicate : str, optional
+        ``'intersects'`` counts points on a region's border as inside it,
+        ``'within'`` does not
+    processes : int, optional
+        Worker processes, see `toolchest.parallel.map_chunks`
+    chunksize : int, optional
+        Points per chunk, see `toolchest.parallel.map_chunks`
+
+    Returns
+    -------
+    regions : numpy.ndarray of int
+        Position of the region of every point in `regions` (or the file),
+        -1 for points outside all regions. Points in several overlapping
+        regions are assigned to the first.
+
+    Examples
+    --------
+    >>> geometries, ids = read_regions('NUTS_RG_01M_2021_3035.shp',
+    ...                                'NUTS_ID')  # doctest: +SKIP
+    >>> region = assign_points(xy, geometries)  # doctest: +SKIP
+    >>> nuts = np.where(region >= 0, np.asarray(ids)[region], None)
+    ... # doctest: +SKIP
+    """
+    from toolchest.parallel import map_chunks
+
+    if predicate not in ('intersects', 'within'):
+        raise ValueError("predicate must be 'intersects' or 'within'")
+    points = np.asarray(points, dtype=float)
+    if points.ndim != 2 or points.shape[1] != 2:
+        raise ValueError('expected coordinates of shape (points, 2)')
+    if isinstance(regions, str) or hasattr(regions, '__fspath__'):
+        regions, _ = read_regions(regions)
+    index = _RegionIndex(regions)
+    return map_chunks(_assign, points, args=(index, predicate),
+                      processes=processes, chunksize=chunksize)
+
+
+def _cached(key, build):
+    from toolchest.cache import stable_hash
+
+    key = stable_hash(key)
+    if key in _cache:
+        _cache.move_to_end(key)
+        return _cache[key]
+    value = _cache[key] = build()
+    while len(_cache) > CACHE_SIZE:
+        _cache.popitem(last=False)
+    return value
+
+
+def _coefficients(transform):
+    return (transform.a, transform.b, transform.c, transform.d, transform.e,
+            transform.f)
+
+
+def _wkb(geometries):
+    """Hashable WKB of every geometry, empty for missing ones"""
+    import shapely
+
+    return [b'' if w is None else bytes(w)
+            for w in shapely.to_wkb(np.asarray(geometries, dtype=object))]
+
+
+def _grid_key(geometries, shape, transform):
+    return (_wkb(geometries), tuple(int(n) for n in shape),
+            _coefficients(transform))
+
+
+def label_raster(geometries, shape, transform, all_touched=False):
+    """Raster of the region covering every pixel
+
+    Label rasters are cached per regions and grid, so repeated calls for
+    the same regions and grid cost nothing.
+
+    Parameters
+    ----------
+    geometries : sequence of shapely.Geometry
+        Regions
+    shape : tuple of int
+        Rows and columns of the grid
+    transform : affine.Affine
+        Geotransform of the grid
+    all_touched : bool, optional
+        Whether pixels touched by a region belong to it, rather than only
+        those whose centre it covers
+
+    Returns
+    -------
+    labels : numpy.ndarray of int32
+        Position of the region of every pixel in `geometries`, -1 outside
+        all regions. Where regions overlap, the later one wins.
+    """
+    def build():
+        from rasterio import features
+
+        labels = features.rasterize(
+            ((g, i) for i, g in enumerate(geometries) if g is not None),
+            out_shape=shape, transform=transform, fill=-1, dtype='int32',
+            all_touched=all_touched)
+        labels.flags.writeable = False
+        return labels
+
+    key = ('labels', _grid_key(geometries, shape, transform), all_touched)
+    return _cached(key, build)
+
+
+class _Zones(object):
+    """Weighted (pixel, region) pairs, sorted by region"""
+
+    def __init__(self, pixels, regions, weights, n):
+        order = np.argsort(regions, kind='stable')
+        self.pixels = pixels[order]
+        self.regions = regions[order]
+        self.weights = weights[order]
+        self.n = n
+        self.present = np.unique(self.regions)
+        self.starts = np.searchsorted(self.regions, self.present)
+
+
+def _zones(geometries, shape, transform, all_touched, fractional):
+    def build():
+        labels = label_raster(geometries, shape, transform, all_touched)
+        if not fractional:
+            pixels = np.flatnonzero(labels >= 0)
+            return _Zones(pixels, labels.ravel()[pixels].astype(np.int64),
+                          np.ones(len(pixels)), len(geometries))
+        return _fractional_zones(geometries, shape, transform, labels)
+
+    key = ('zones', _grid_key(geometries, shape, transform), all_touched,
+           fractional)
+    return _cached(key, build)
+
+
+def _fractional_zones(geometries, shape, transform, labels):
+    """Zones weighted by the share of every pixel covered by each region
+
+    Pixels crossed by no region boundary are wholly inside one region (or
+    none); only those crossed by a boundary are intersected exactly with the
+    regions, which takes time proportional to the regions' perimeters.
+    """
+    import shapely
+    from rasterio import features
+
+    if transform.b or transform.d:
+        raise ValueError('fractional coverage needs a north-up grid')
+    edges = features.rasterize(
+        ((shapely.boundary(g), 1) for g in geometries if g is not None),
+        out_shape=shape, transform=transform, fill=0, dtype='uint8',
+        all_touched=True).ravel().astype(bool)
+    inner = np.flatnonzero(~edges & (labels.ravel() >= 0))
+    rows, cols = np.divmod(np.flatnonzero(edges), shape[1])
+    x0 = transform.c + transform.a * cols
+    y0 = transform.f + transform.e * rows
+    x1, y1 = x0 + transform.a, y0 + transform.e
+    boxes = shapely.box(np.minimum(x0, x1), np.minimum(y0, y1),
+                        np.maximum(x0, x1), np.maximum(y0, y1))
+    geometries = np.asarray(geometries, dtype=object)
+    box_pos, region = shapely.STRtree(geometries).query(
+        boxes, predicate='intersects')
+    share = shapely.area(shapely.intersection(
+        boxes[box_pos], geometries[region])) / abs(transform.a * transform.e)
+    keep = share > 0
+    edge_pixels = rows[box_pos[keep]] * shape[1] + cols[box_pos[keep]]
+    return _Zones(np.r_[inner, edge_pixels],
+                  np.r_[labels.ravel()[inner], region[keep]].astype(np.int64),
+                  np.r_[np.ones(len(inner)), share[keep]], len(geometries))
+
+
+def _reduce(values, zones, nodata, stats):
+    """Statistics of `values` (bands, pixels) over all zones at once"""
+    bands, n = len(values), zones.n
+    v = values[:, zones.pixels].astype(float)
+    valid = ~np.isnan(v)
+    if nodata is not None:
+        valid &= v != nodata
+    weights = np.where(valid, zones.weights, 0.)
+    # one bincount over all bands, with the regions of each band offset
+    keys = (zones.regions + n * np.arange(bands)[:, None]).ravel()
+    count = np.bincount(keys, weights.ravel(), bands * n).reshape(bands, n)
+    result = {}
+    if 'count' in stats:
+        result['count'] = count
+    if 'sum' in stats or 'mean' in stats:
+        total = np.bincount(keys, (weights * np.where(valid, v, 0.)).ravel(),
+                            bands * n).reshape(bands, n)
+        result['sum'] = total
+        with np.errstate(invalid='ignore', divide='ignore'):
+            result['mean'] = np.where(count > 0, total / count, np.nan)
+    for name, ufunc, fill in (('min', np.minimum, np.inf),
+                              ('max', np.maximum, -np.inf)):
+        if name not in stats:
+            continue
+        out = np.full((bands, n), np.nan)
+        if len(zones.pixels):
+            reduced = ufunc.reduceat(np.where(valid, v, fill), zones.starts,
+                                     axis=1)
+            out[:, zones.present] = np.where(np.isinf(reduced), np.nan,
+                                             reduced)
+        result[name] = out
+    return {name: result[name].T for name in stats}
+
+
+def _datasets(rasters):
+    import rasterio
+
+    if isinstance(rasters, (str, rasterio.io.DatasetReaderBase)) or \
+            hasattr(rasters, '__fspath__'):
+        rasters = [rasters]
+    for raster in rasters:
+        if isinstance(raster, rasterio.io.DatasetReaderBase):
+            yield raster
+        else:
+            with rasterio.open(raster) as dataset:
+                yield dataset
+
+
+@profile
+def zonal_stats(rasters, regions, stats=ZONAL_STATS, bands=None,
+                fractional=False, all_touched=False, nodata=None):
+    """Statistics of raster values within every region
+
+    Regions are rasterized once per grid to a label raster, which is cached
+    along with the pixels of every region, and all statistics of all bands
+    and rasters are then computed at once with `numpy.bincount`, without
+    masking the rasters once per region.
+
+    Parameters
+    ----------
+    rasters : str or os.PathLike or rasterio dataset or list of them
+        Rasters, which may be on different grids
+    regions : str or os.PathLike or sequence of shapely.Geometry
+        Region geometries, or a file to read them from with `read_regions`
+    stats : sequence of str, optional
+        Any of ``'sum'``, ``'mean'``, ``'min'``, ``'max'`` and ``'count'``
+        (the number of valid pixels)
+    bands : list of int, optional
+        Bands to use of every raster, all by default
+    fractional : bool, optional
+        Weight pixels by the share of their area covered by a region, so a
+        pixel half inside counts half towards sums, means and counts and
+        pixels split between regions count towards each. By default every
+        pixel belongs to the region covering its centre (see
+        `all_touched`). Minima and maxima are over all pixels covered at
+        all. Regions should not overlap; pixels covered by several regions
+        count towards the last one only.
+    all_touched : bool, optional
+        Without `fractional`, whether pixels touched by a region belong to
+        it
+    nodata : float, optional
+        Value of missing pixels, by default the rasters' own nodata values;
+        NaN pixels are always missing
+
+    Returns
+    -------
+    stats : dict
+        Array of shape ``(regions, layers)`` per statistic, with a layer for
+        every band of every raster, in order
+    """
+    unknown = set(stats) - set(ZONAL_STATS)
+    if unknown:
+        raise ValueError('unknown statistics {}'.format(sorted(unknown)))
+    if isinstance(regions, str) or hasattr(regions, '__fspath__'):
+        regions, _ = read_regions(regions)
+    parts = []
+    for dataset in _datasets(rasters):
+        zones = _zones(regions, dataset.shape, dataset.transform,
+                       all_touched, fractional)
+        indexes = bands or list(dataset.indexes)
+        values = dataset.read(indexes).reshape(len(indexes), -1)
+        missing = dataset.nodata if nodata is None else nodata
+        parts.append(_reduce(values, zones, missing, stats))
+    return {name: np.concatenate([p[name] for p in parts], axis=1)
+            for name in stats}
+
+
+def _window_shape(dataset, block_shape):
+    if block_shape is not None:
+        return tuple(int(n) for n in block_shape)
+    rows, cols = dataset.block_shapes[0]
+    cols = min(cols, dataset.width)
+    # grow narrow blocks first to whole rows, then to more rows
+    while rows * cols < MIN_WINDOW_PIXELS and cols < dataset.width:
+        cols = min(cols * 2, dataset.width)
+    while rows * cols < MIN_WINDOW_PIXELS and rows < dataset.height:
+        rows = min(rows * 2, dataset.height)
+    return rows, cols
+
+
+def block_windows(dataset, halo=0, block_shape=None):
+    """Windows covering a raster, aligned to its native blocks
+
+    Parameters
+    ----------
+    dataset : rasterio dataset
+    halo : int, optional
+        Pixels of overlap with the neighbouring windows on every side
+    block_shape : tuple of int, optional
+        Rows and columns per window, by default the raster's native blocks,
+        grown to about `MIN_WINDOW_PIXELS` if smaller
+
+    Yields
+    ------
+    window : rasterio.windows.Window
+        The pixels to compute
+    read : rasterio.windows.Window
+        `window` grown by `halo`, clipped to the raster
+    pad : tuple
+        Padding ``((top, bottom), (left, right))`` that grows `read` to the
+        full halo beyond the raster's edges
+    """
+    from rasterio.windows import Window
+
+    rows, cols = _window_shape(dataset, block_shape)
+    height, width = dataset.height, dataset.width
+    for row in range(0, height, rows):
+        for col in range(0, width, cols):
+            h, w = min(rows, height - row), min(cols, width - col)
+            top, left = max(row - halo, 0), max(col - halo, 0)
+            bottom = min(row + h + halo, height)
+            right = min(col + w + halo, width)
+            pad = ((top - (row - halo), row + h + halo - bottom),
+                   (left - (col - halo), col + w + halo - right))
+            yield (Window(col, row, w, h),
+                   Window(left, top, right - left, bottom - top), pad)
+
+
+def _open_all(rasters):
+    import rasterio
+
+    if isinstance(rasters, str) or hasattr(rasters, '__fspath__'):
+        rasters = [rasters]
+    datasets = [rasterio.open(r) for r in rasters]
+    first = datasets[0]
+    for other in datasets[1:]:
+        if other.shape != first.shape or not np.allclose(
+                _coefficients(other.transform),
+                _coefficients(first.transform)):
+            for dataset in datasets:
+                dataset.close()
+            raise ValueError('rasters are not aligned: {} and {}'.format(
+                first.name, other.name))
+    return datasets
+
+
+def _read_window(datasets, read, pad, mode):
+    arrays = []
+    for dataset in datasets:
+        values = dataset.read(window=read)
+        if any(any(p) for p in pad):
+            widths = ((0, 0),) + pad
+            if isinstance(mode, str):
+                values = np.pad(values, widths, mode=mode)
+            else:
+                values = np.pad(values, widths, constant_values=mode)
+        arrays.append(values)
+    return arrays
+
+
+def _compute_window(func, datasets, window, read, pad_widths, pad,
+                    with_window):
+    arrays = _read_window(datasets, read, pad_widths, pad)
+    kwargs = {'window': window} if with_window else {}
+    result = np.asarray(func(*arrays, **kwargs))
+    if result.ndim == 2:
+        result = result[None]
+    if result.shape[1:] != (window.height, window.width):
+        raise ValueError('func returned shape {} for a window of {}'.format(
+            result.shape, (window.height, window.width)))
+    return result
+
+
+def _write_window(output, result, window):
+    import rasterio
+
+    # closing the output after every window flushes it to disk, so written
+    # windows survive an interrupted run
+    with rasterio.open(output, 'r+') as sink:
+        sink.write(result, window=window)
+
+
+class _Progress(object):
+    """Windows of a `map_windows` output written so far, in a sidecar file
+
+    The first line identifies the tiling, every further line is the number
+    of a written window.
+    """
+
+    def __init__(self, output, tiling):
+        self.path = os.fspath(output) + '.windows'
+        self.tiling = ' '.join(str(n) for n in tiling)
+
+    def load(self):
+        """Numbers of the written windows, None if there is no record"""
+        try:
+            with open(self.path) as f:
+                lines = f.read().splitlines()
+        except FileNotFoundError:
+            return None
+        if not lines or lines[0] != self.tiling:
+            raise ValueError('{} records other windows, pass resume=False '
+                             'to start over'.format(self.path))
+        # a line cut short by an interruption is not a record
+        return {int(line) for line in lines[1:] if line.isdigit()}
+
+    def start(self):
+        with open(self.path, 'w') as f:
+            f.write(self.tiling + '\n')
+
+    def add(self, i):
+        with open(self.path, 'a') as f:
+            f.write('{}\n'.format(i))
+            f.flush()
+            os.fsync(f.fileno())
+
+    def finish(self):
+        os.remove(self.path)
+
+
+# state of a pool worker, set once by _init_window_worker
+_worker = {}
+
+
+def _init_window_worker(rasters, func, output, pad, with_window, progress,
+                        lock):
+    # every worker opens the rasters itself, dataset handles are not shared
+    _worker.update(datasets=_open_all(rasters), func=func, output=output,
+                   pad=pad, with_window=with_window, progress=progress,
+                   lock=lock)
+
+
+def _run_window(task):
+    i, window, read, pad_widths = task
+    result = _compute_window(_worker['func'], _worker['datasets'], window,
+                             read, pad_widths, _worker['pad'],
+                             _worker['with_window'])
+    with _worker['lock']:
+        _write_window(_worker['output'], result, window)
+        _worker['progress'].add(i)
+
+
+@profile
+def map_windows(func, rasters, output, halo=0, pad='edge', block_shape=None,
+                nodata=None, with_window=False, processes=None, resume=False,
+                **options):
+    """Apply a function to aligned rasters window by window
+
+    The rasters are read and the result written one window at a time, so
+    memory use is bounded by the window size however large the rasters.
+    Windows are computed in a pool of processes, each of which opens the
+    rasters itself; results are written to the output one at a time under
+    a lock. Written windows are recorded in a sidecar file next to the
+    output, ``<output>.windows``, which is removed once all are done, so an
+    interrupted run can be resumed.
+
+    Parameters
+    ----------
+    func : callable
+        Called as ``func(*arrays)`` with an array of shape ``(bands, rows,
+        columns)`` of every raster for each window, grown by `halo` on every
+        side. Returns the result for the window, without halo, of shape
+        ``(bands, rows, columns)`` or ``(rows, columns)``. Must be picklable
+        unless processes are started by forking.
+    rasters : str or os.PathLike or list of them
+        Rasters of the same shape and geotransform
+    output : str or os.PathLike
+        GeoTIFF to write, on the grid of the rasters
+    halo : int, optional
+        Pixels of context around every window for neighbourhood operations,
+        e.g. 1 for 3x3 filters
+    pad : str or float, optional
+        How halos are filled beyond the raster edges: a `numpy.pad` mode
+        such as ``'edge'`` or ``'reflect'``, or a constant value
+    block_shape : tuple of int, optional
+        Window size, see `block_windows`; by default grown to whole tiles
+        of the output, so that no tile is written twice
+    nodata : float, optional
+        Nodata value of the output
+    with_window : bool, optional
+        Whether to also pass the window to compute, without halo, as
+        keyword argument ``window``
+    processes : int, optional
+        Number of worker processes, defaults to
+        `toolchest.parallel.available_cpus`
+    resume : bool, optional
+        Whether to only compute the windows missing from the output of an
+        interrupted run with the same rasters and windows, instead of
+        starting over. An existing output without sidecar is taken as
+        finished and left alone; pass False to overwrite it.
+    **options
+        Creation options of the output, e.g. ``compress='deflate'``,
+        overriding the defaults (tiled, deflate-compressed BigTIFF if
+        needed)
+
+    Examples
+    --------
+    >>> def slope(dem):
+    ...     dy, dx = np.gradient(dem[0])
+    ...     return np.hypot(dx, dy)[1:-1, 1:-1]
+    >>> map_windows(slope, 'dem.tif', 'slope.tif', halo=1)  # doctest: +SKIP
+    """
+    from multiprocessing import get_context
+
+    import rasterio
+
+    from toolchest.parallel import available_cpus
+
+    processes = processes or available_cpus()
+    tiles = (options.get('blockysize', TILE), options.get('blockxsize', TILE))
+    datasets = _open_all(rasters)
+    try:
+        first = datasets[0]
+        shape = _window_shape(first, block_shape)
+        if block_shape is None:
+            shape = tuple(-(-n // t) * t for n, t in zip(shape, tiles))
+        windows = list(block_windows(first, halo, shape))
+        progress = _Progress(output, first.shape + shape + (halo,))
+        done = None
+        if resume and os.path.exists(output):
+            done = progress.load()
+            if done is None:
+                # finished, nothing to resume
+                return
+        if done is None:
+            # the output's layout is only known from the first result
+            window, read, pad_widths = windows[0]
+            result = _compute_window(func, datasets, window, read,
+                                     pad_widths, pad, with_window)
+            creation = dict(
+                driver='GTiff', width=first.width, height=first.height,
+                count=len(result), dtype=result.dtype, crs=first.crs,
+                transform=first.transform, nodata=nodata, tiled=True,
+                blockxsize=TILE, blockysize=TILE, compress='deflate',
+                BIGTIFF='IF_SAFER')
+            creation.update(options)
+            progress.start()
+            with rasterio.open(output, 'w', **creation) as sink:
+                sink.write(result, window=window)
+            progress.add(0)
+            done = {0}
+        tasks = [(i,) + tuple(windows[i]) for i in range(len(windows))
+                 if i not in done]
+        if processes == 1 or len(tasks) < 2:
+            for i, window, read, pad_widths in tasks:
+                result = _compute_window(func, datasets, window, read,
+                                         pad_widths, pad, with_window)
+                _write_window(output, result, window)
+                progress.add(i)
+        else:
+            ctx = get_context()
+            with ctx.Pool(min(processes, len(tasks)),
+                          initializer=_init_window_worker,
+                          initargs=(rasters, func, output, pad, with_window,
+                                    progress, ctx.Lock())) as pool:
+                for _ in pool.imap_unordered(_run_window, tasks):
+                    pass
+    finally:
+        for dataset in datasets:
+            dataset.close()
+    progress.finish()
+
+
+def _is_raster(source):
+    if not (isinstance(source, str) or hasattr(source, '__fspath__')):
+        return False
+    import rasterio
+    from rasterio.errors import RasterioIOError
+
+    try:
+        with rasterio.open(source):
+            return True
+    except RasterioIOError:
+        return False
+
+
+def _window_transform(transform, row, col):
+    t = transform
+    return type(t)(t.a, t.b, t.c + t.a * col, t.d, t.e, t.f + t.e * row)
+
+
+class _RegionAreas(object):
+    """Eligible area of every region, summed up window by window
+
+    The sums live in shared memory, so that processes forked from the one
+    creating them add to the same totals.
+    """
+
+    def __init__(self, regions, transform):
+        import multiprocessing
+
+        import shapely
+
+        self.geometries = _geometries(regions)
+        self.tree = shapely.STRtree(self.geometries)
+        self.transform = transform
+        self._totals = multiprocessing.get_context().Array(
+            'd', len(self.geometries))
+
+    @property
+    def totals(self):
+        t = self.transform
+        return np.frombuffer(self._totals.get_obj()).copy() * abs(t.a * t.e)
+
+    def add(self, window, eligible):
+        """Add the eligible pixels (0 or 1) of `window` to the totals"""
+        import shapely
+        from rasterio import features
+
+        transform = _window_transform(self.transform, window.row_off,
+                                      window.col_off)
+        x0, y0 = transform.c, transform.f
+        x1 = x0 + transform.a * eligible.shape[1]
+        y1 = y0 + transform.e * eligible.shape[0]
+        near = self.tree.query(shapely.box(min(x0, x1), min(y0, y1),
+                                           max(x0, x1), max(y0, y1)))
+        if not len(near):
+            return
+        geometries = self.geometries[near]
+        labels = features.rasterize(
+            ((g, i) for i, g in enumerate(geometries)),
+            out_shape=eligible.shape, transform=transform, fill=-1,
+            dtype='int32')
+        zones = _fractional_zones(geometries, eligible.shape, transform,
+                                  labels)
+        sums = np.bincount(zones.regions, minlength=len(near),
+                           weights=zones.weights *
+                           eligible.ravel()[zones.pixels])
+        with self._totals.get_lock():
+            np.frombuffer(self._totals.get_obj())[near] += sums
+
+
+class _Excluder(object):
+    """Computes the excluded pixels of a window from all exclusion layers"""
+
+    def __init__(self, exclusions, positions, dataset, halo, areas=None):
+        import shapely
+
+        self.transform = dataset.transform
+        self.halo = halo
+        self.areas = areas
+        self.layers = []
+        for exclusion, position in zip(exclusions, positions):
+            if position is not None:
+                self.layers.append((exclusion, position, None))
+                continue
+            if isinstance(exclusion.source, str) or \
+                    hasattr(exclusion.source, '__fspath__'):
+                geometries, _ = read_regions(exclusion.source)
+            else:
+                geometries = np.asarray(exclusion.source, dtype=object)
+            geometries = geometries[~shapely.is_missing(geometries)]
+            self.layers.append((exclusion, None, (
+                geometries, shapely.STRtree(geometries))))
+
+    def __call__(self, *arrays, window):
+        import shapely
+        from rasterio import features
+        from scipy import ndimage
+
+        t, halo = self.transform, self.halo
+        shape = arrays[0].shape[1:]
+        transform = _window_transform(t, window.row_off - halo,
+                                      window.col_off - halo)
+        x0, y0 = transform.c, transform.f
+        x1, y1 = x0 + t.a * shape[1], y0 + t.e * shape[0]
+        excluded = np.zeros(shape, dtype=bool)
+        for exclusion, position, vector in self.layers:
+            if vector is None:
+                layer = arrays[position][0]
+                if exclusion.values is None:
+                    hit = layer != 0
+                else:
+                    hit = np.isin(layer, exclusion.values)
+            else:
+                geometries, tree = vector
+                near = tree.query(shapely.box(
+                    min(x0, x1) - exclusion.buffer,
+                    min(y0, y1) - exclusion.buffer,
+                    max(x0, x1) + exclusion.buffer,
+                    max(y0, y1) + exclusion.buffer))
+                if not len(near):
+                    continue
+                hit = features.rasterize(
+                    ((g, 1) for g in geometries[near]), out_shape=shape,
+                    transform=transform, fill=0, dtype='uint8',
+                    all_touched=True).astype(bool)
+            if exclusion.buffer and hit.any():
+                distance = ndimage.distance_transform_edt(
+                    ~hit, sampling=(abs(t.e), abs(t.a)))
+                hit = distance <= exclusion.buffer
+            excluded |= hit
+        eligible = (~excluded[halo:shape[0] - halo,
+                              halo:shape[1] - halo]).astype(np.uint8)
+        if self.areas is not None:
+            self.areas.add(window, eligible)
+        return eligible
+
+
+@profile
+def eligible_area(like, exclusions, output, regions=None, block_shape=None,
+                  processes=None, resume=False, **options):
+    """Eligible land after applying exclusion layers, and its area by region
+
+    Exclusions are evaluated window by window with `map_windows`, so memory
+    use is bounded by the window size. Distance buffers are Euclidean
+    distance transforms of the excluded pixels within every window, grown
+    by a halo as wide as the largest buffer, instead of buffered and merged
+    vector geometries. The eligible area of every region is summed up in
+    the same pass, window by window. When resuming, it is instead summed up
+    from the finished output, again window by window.
+
+    Parameters
+    ----------
+    like : str or os.PathLike
+        Raster defining the grid, in a projected coordinate reference system
+        with units of length such as metres
+    exclusions : sequence of Exclusion
+        Exclusion layers; raster layers must be aligned with `like`
+    output : str or os.PathLike
+        GeoTIFF to write, 1 for eligible and 0 for excluded pixels
+    regions : str or os.PathLike or sequence of shapely.Geometry, optional
+        Regions to sum up the eligible area of
+    block_shape : tuple of int, optional
+        Window size, see `block_windows`
+    processes : int, optional
+        Number of worker processes, see `map_windows`
+    resume : bool, optional
+        Whether to resume an interrupted run, see `map_windows`
+    **options
+        Creation options of the output
+
+    Returns
+    -------
+    areas : numpy.ndarray or None
+        Eligible area of every region, in squared coordinate units, with
+        pixels on region boundaries counted by the share inside the region
+
+    Examples
+    --------
+    >>> areas = eligible_area('landcover.tif', [
+    ...     Exclusion('landcover.tif', values=[50, 80]),
+    ...     Exclusion('protected_areas.gpkg'),
+    ...     Exclusion('roads.gpkg', buffer=200.),
+    ... ], 'eligible.tif', regions=nuts3)  # doctest: +SKIP
+    """
+    import rasterio
+
+    exclusions = [e if isinstance(e, Exclusion) else Exclusion(*e)
+                  for e in exclusions]
+    # the arrays passed to the excluder are those of `like` and of every
+    # raster layer
+    rasters, positions = [os.fspath(like)], []
+    for exclusion in exclusions:
+        if not _is_raster(exclusion.source):
+            positions.append(None)
+            continue
+        source = os.fspath(exclusion.source)
+        if source not in rasters:
+            rasters.append(source)
+        positions.append(rasters.index(source))
+    with rasterio.open(like) as dataset:
+        t = dataset.transform
+        pixel = min(abs(t.a), abs(t.e))
+        halo = max([int(math.ceil(e.buffer / pixel)) for e in exclusions] +
+                   [0])
+        areas = None if regions is None else _RegionAreas(regions, t)
+        # windows finished by an interrupted run would be missing from sums
+        # taken while computing
+        excluder = _Excluder(exclusions, positions, dataset, halo,
+                             None if resume else areas)
+    map_windows(excluder, rasters, output, halo=halo, pad=0,
+                block_shape=block_shape, with_window=True,
+                processes=processes, resume=resume, **options)
+    if areas is None:
+        return None
+    if resume:
+        with rasterio.open(output) as dataset:
+            for window, _, _ in block_windows(dataset):
+                areas.add(window, dataset.read(1, window=window))
+    return areas.totals
+
+
+def _geometries(regions):
+    if isinstance(regions, str) or hasattr(regions, '__fspath__'):
+        regions, _ = read_regions(regions)
+    return np.asarray(regions, dtype=object)
+
+
+def _intersection_areas(sources, targets):
+    import shapely
+    from scipy import sparse
+
+    source, target = shapely.STRtree(targets).query(
+        sources, predicate='intersects')
+    areas = shapely.area(shapely.intersection(sources[source],
+                                              targets[target]))
+    keep = areas > 0
+    return sparse.csr_matrix(
+        (areas[keep], (source[keep], target[keep])),
+        shape=(len(sources), len(targets)))
+
+
+@profile
+def area_matrix(sources, targets, cache=True):
+    """Sparse matrix of the intersection areas of two sets of regions
+
+    Matrices are persisted in a `toolchest.cache.Cache`, keyed by the
+    geometries of both sets, so the intersections of the same sets are
+    computed only once.
+
+    Parameters
+    ----------
+    sources, targets : str or os.PathLike or sequence of shapely.Geometry
+        Regions, e.g. weather grid cells and administrative regions, or
+        files to read them from with `read_regions`
+    cache : bool or toolchest.cache.Cache, optional
+        The cache to use, the default one if True, none if False
+
+    Returns
+    -------
+    areas : scipy.sparse.csr_matrix
+        Shape ``(sources, targets)``, the area of every intersection
+    """
+    from toolchest.cache import Cache, stable_hash
+
+    sources, targets = _geometries(sources), _geometries(targets)
+    if cache is False:
+        return _intersection_areas(sources, targets)
+    if cache is True:
+        cache = Cache()
+    key = stable_hash('toolchest.gis.area_matrix', AREA_MATRIX_VERSION,
+                      _wkb(sources), _wkb(targets))
+    found, areas = cache.get(key)
+    if not found:
+        areas = _intersection_areas(sources, targets)
+        cache.put(key, areas)
+    return areas
+
+
+def remap(data, areas, how='extensive', source_areas=None):
+    """Move data from one set of regions to another
+
+    Parameters
+    ----------
+    data : array_like
+        Values of shape ``(time, sources)`` or ``(sources,)``
+    areas : scipy.sparse.spmatrix
+        Intersection areas from `area_matrix`
+    how : str, optional
+        ``'extensive'`` for quantities that add up over area, e.g. energy
+        or population, which are split by the share of every source's area
+        in each target. ``'intensive'`` for quantities such as capacity
+        factors or temperatures, which are averaged over every target,
+        weighted by area.
+    source_areas : array_like, optional
+        Total area of every source, for extensive quantities of sources not
+        wholly covered by targets; by default the parts of sources outside
+        all targets are ignored and the totals of all sources conserved
+
+    Returns
+    -------
+    values : numpy.ndarray
+        Shape ``(time, targets)`` or ``(targets,)``, NaN for targets of
+        intensive quantities not intersecting any source
+    """
+    from scipy import sparse
+
+    areas = sparse.csr_matrix(areas, dtype=float)
+    if how == 'extensive':
+        total = np.asarray(areas.sum(axis=1)).ravel() \
+            if source_areas is None else np.asarray(source_areas, float)
+        with np.errstate(invalid='ignore', divide='ignore'):
+            scale = np.where(total > 0, 1. / total, 0.)
+        weights = sparse.diags(scale) @ areas
+    elif how == 'intensive':
+        total = np.asarray(areas.sum(axis=0)).ravel()
+        with np.errstate(invalid='ignore', divide='ignore'):
+            scale = np.where(total > 0, 1. / total, np.nan)
+        weights = areas @ sparse.diags(np.nan_to_num(scale))
+    else:
+        raise ValueError("how must be 'extensive' or 'intensive'")
+    data = np.asarray(data, dtype=float)
+    values = np.asarray((weights.T @ data.T).T)
+    if how == 'intensive':
+        values = values + np.where(np.isnan(scale), np.nan, 0.)
+    return values
+
+
+def _unit_vectors(lon, lat):
+    lon, lat = (np.radians(np.asarray(v, dtype=float)) for v in (lon, lat))
+    cos_lat = np.cos(lat)
+    return np.column_stack([cos_lat * np.cos(lon), cos_lat * np.sin(lon),
+                            np.sin(lat)])
+
+
+def _chord(distance):
+    return 2 * np.sin(np.minimum(distance / (2 * EARTH_RADIUS), np.pi / 2))
+
+
+def _great_circle(chord):
+    with np.errstate(invalid='ignore'):
+        distance = 2 * EARTH_RADIUS * np.arcsin(np.minimum(chord / 2, 1.))
+    return np.where(np.isinf(chord), np.inf, distance)
+
+
+class BusIndex(object):
+    """Nearest-neighbour search over network buses
+
+    Buses are placed on the unit sphere, where the straight-line (chord)
+    distance ranks neighbours exactly as the great-circle distance does, so
+    a `scipy.spatial.cKDTree` finds them without any projection. One tree
+    is built per combination of filters and reused by later queries.
+
+    Parameters
+    ----------
+    lon, lat : array_like
+        Coordinates of the buses in degrees
+    **attributes : array_like
+        Attributes to filter buses by, e.g. ``v_nom`` or ``country``
+
+    Examples
+    --------
+    >>> buses = BusIndex(df.x, df.y, v_nom=df.v_nom,
+    ...                  country=df.country)  # doctest: +SKIP
+    >>> buses.query(lon, lat, max_distance=50, v_nom=[220, 380],
+    ...             match={'country': plant_country})  # doctest: +SKIP
+    """
+
+    def __init__(self, lon, lat, **attributes):
+        self.xyz = _unit_vectors(lon, lat)
+        self.attributes = {name: np.asarray(values)
+                           for name, values in attributes.items()}
+        for name, values in self.attributes.items():
+            if values.shape != (len(self.xyz),):
+                raise ValueError('expected one {} per bus'.format(name))
+        self._trees = {}
+
+    def __len__(self):
+        return len(self.xyz)
+
+    def mask(self, **filters):
+        """Buses whose attributes match all `filters`
+
+        Parameters
+        ----------
+        **filters : scalar or sequence
+            A value or a sequence of allowed values per attribute
+
+        Returns
+        -------
+        mask : numpy.ndarray of bool
+        """
+        mask = np.ones(len(self), dtype=bool)
+        for name, allowed in filters.items():
+            values = self.attributes[name]
+            if np.ndim(allowed):
+                mask &= np.isin(values, allowed)
+            else:
+                mask &= values == allowed
+        return mask
+
+    def _tree(self, filters):
+        from scipy.spatial import cKDTree
+
+        key = tuple(sorted(
+            (name, tuple(np.atleast_1d(allowed).tolist()))
+            for name, allowed in filters.items()))
+        if key not in self._trees:
+            positions = np.flatnonzero(self.mask(**filters))
+            self._trees[key] = cKDTree(self.xyz[positions]), positions
+        return self._trees[key]
+
+    def query(self, lon, lat, k=1, max_distance=None, match=None, workers=1,
+              **filters):
+        """Find the nearest eligible buses of sites
+
+        Parameters
+        ----------
+        lon, lat : array_like
+            Coordinates of the sites, e.g. plants or loads, in degrees
+        k : int, optional
+            Number of neighbours per site
+        max_distance : float, optional
+            Ignore buses farther than this many km
+        match : dict, optional
+            Per-site values that buses must share, e.g. ``{'country':
+            countries}`` to only attach sites to buses of their own country
+        workers : int, optional
+            Threads of the tree query, all CPUs if -1
+        **filters : scalar or sequence
+            Bus attribute values allowed for all sites, see `mask`
+
+        Returns
+        -------
+        nearest : Nearest
+        """
+        xyz = _unit_vectors(lon, lat)
+        upper = np.inf if max_distance is None else _chord(max_distance)
+        shape = (len(xyz),) if k == 1 else (len(xyz), k)
+        bus = np.full(shape, -1, dtype=np.int64)
+        chord = np.full(shape, np.inf)
+        if match:
+            names = list(match)
+            values, codes = zip(*(np.unique(match[name], return_inverse=True)
+                                  for name in names))
+            keys, group = np.unique(np.column_stack(codes), axis=0,
+                                    return_inverse=True)
+            group = group.ravel()
+            order = np.argsort(group, kind='stable')
+            bounds = np.cumsum(np.bincount(group, minlength=len(keys)))
+            groups = [(dict(filters, **{name: v[c] for name, v, c in
+                                        zip(names, values, key)}), sites)
+                      for key, sites in zip(keys,
+                                            np.split(order, bounds[:-1]))]
+        else:
+            groups = [(filters, slice(None))]
+        for group_filters, sites in groups:
+            tree, positions = self._tree(group_filters)
+            if not len(positions):
+                continue
+            found, i = tree.query(xyz[sites], k=k, distance_upper_bound=upper,
+                                  workers=workers)
+            valid = i < len(positions)
+            bus[sites] = np.where(valid, positions[np.minimum(
+                i, len(positions) - 1)], -1)
+            chord[sites] = found
+        return Nearest(bus, _great_circle(chord))
@@ -0,0 +1,217 @@
+"""Streaming readers for large time series files.
+
+`read_blocks` iterates over hourly (or any other) time series in CSV or
+Parquet files block by block, so files far larger than memory can be
+processed. Column selection and dtype conversion happen while parsing:
+unselected columns are never converted, and values are parsed directly
+into arrays of the requested dtype. Peak memory is bounded by the block
+size, not by the file size.
+
+Files hold one time stamp column and one column per series.
+"""
+import collections
+import os
+
+import numpy as np
+import pandas as pd
+
+from toolchest.profiling import profile
+
+Block = collections.namedtuple('Block', ['index', 'values', 'columns'])
+Block.__doc__ = """A block of time series read by `read_blocks`
+
+Attributes
+----------
+index : pandas.DatetimeIndex
+    Time stamps of the rows of `values`
+values : numpy.ndarray
+    Values of shape ``(time, series)``
+columns : list of str
+    Names of the columns of `values`
+"""
+
+CSV_EXTENSIONS = ('.csv', '.csv.gz', '.csv.bz2', '.csv.zip', '.csv.xz',
+                  '.txt')
+PARQUET_EXTENSIONS = ('.parquet', '.pq')
+
+
+def _format(path, fmt):
+    if fmt is not None:
+        return fmt
+    name = os.fspath(path).lower()
+    if name.endswith(CSV_EXTENSIONS):
+        return 'csv'
+    if name.endswith(PARQUET_EXTENSIONS):
+        return 'parquet'
+    raise ValueError('cannot infer the format of {}'.format(path))
+
+
+def _parquet_file(path):
+    import pyarrow.parquet as pq
+    return pq.ParquetFile(path)
+
+
+def file_columns(path, fmt=None):
+    """Names of the time stamp column and the value columns of a file
+
+    For Parquet files written by pandas, the time stamp column is the one
+    stored as the data frame's index; otherwise it is the first column.
+
+    Returns
+    -------
+    index_col : str
+    columns : list of str
+    """
+    fmt = _format(path, fmt)
+    if fmt == 'csv':
+        names = list(pd.read_csv(path, nrows=0).columns)
+        return names[0], names[1:]
+    schema = _parquet_file(path).schema_arrow
+    names = list(schema.names)
+    meta = schema.pandas_metadata or {}
+    index_cols = [c for c in meta.get('index_columns', [])
+                  if isinstance(c, str)]
+    index_col = index_cols[0] if index_cols else names[0]
+    return index_col, [n for n in names if n != index_col]
+
+
+def _to_index(values, date_format):
+    return pd.DatetimeIndex(pd.to_datetime(values, format=date_format))
+
+
+def _csv_chunks(path, index_col, columns, dtype, rows, date_format):
+    reader = pd.read_csv(path, usecols=[index_col] + columns,
+                         dtype={c: dtype for c in columns}, chunksize=rows)
+    with reader:
+        for chunk in reader:
+            yield (_to_index(chunk[index_col], date_format),
+                   chunk[columns].to_numpy(dtype=dtype, copy=False))
+
+
+def _parquet_chunks(path, index_col, columns, dtype, rows, date_format):
+    pf = _parquet_file(path)
+    for batch in pf.iter_batches(batch_size=rows,
+                                 columns=[index_col] + columns):
+        values = np.empty((batch.num_rows, len(columns)), dtype=dtype)
+        for j, name in enumerate(columns):
+            values[:, j] = batch.column(name).to_numpy(zero_copy_only=False)
+        # to_pandas keeps the time zone of the time stamps
+        index = batch.column(index_col).to_pandas()
+        yield _to_index(index, date_format), values
+
+
+def _rechunk(chunks, rows):
+    """Re-cut a stream of (index, values) chunks into exactly `rows` rows"""
+    pending, size = [], 0
+    for index, values in chunks:
+        if not pending and len(values) == rows:
+            yield index, values
+            continue
+        pending.append((index, values))
+        size += len(values)
+        while size >= rows:
+            index = pending[0][0].append([p[0] for p in pending[1:]])
+            values = np.concatenate([p[1] for p in pending])
+            yield index[:rows], values[:rows]
+            size -= rows
+            pending = [(index[rows:], values[rows:])] if size else []
+    if size:
+        yield (pending[0][0].append([p[0] for p in pending[1:]]),
+               np.concatenate([p[1] for p in pending]))
+
+
+def read_index(path, index_col=None, fmt=None, date_format=None):
+    """Read only the time stamps of a file
+
+    Parameters
+    ----------
+    path : str or os.PathLike
+        CSV or Parquet file
+    index_col : str, optional
+        Name of the time stamp column, see `file_columns`
+    fmt : str, optional
+        ``'csv'`` or ``'parquet'``, inferred from the file name by default
+    date_format : str, optional
+        strftime format of the time stamps in CSV files, speeds up parsing
+
+    Returns
+    -------
+    index : pandas.DatetimeIndex
+    """
+    fmt = _format(path, fmt)
+    if index_col is None:
+        index_col, _ = file_columns(path, fmt)
+    if fmt == 'csv':
+        values = pd.read_csv(path, usecols=[index_col])[index_col]
+    else:
+        table = _parquet_file(path).read(columns=[index_col])
+        values = table.column(index_col).to_pandas()
+    return _to_index(values, date_format)
+
+
+@profile
+def read_blocks(path, rows=None, columns=None, block_columns=None,
+                dtype=np.float64, index_col=None, fmt=None, date_format=None):
+    """Iterate over a time series file in blocks of rows or of columns
+
+    By default the file is read in blocks of `rows` consecutive time steps
+    of all selected columns. If `block_columns` is given, it is instead read
+    in blocks of all time steps of `block_columns` columns at a time, which
+    suits per-series processing of long series; this reads the file once per
+    block for CSV files, but only the block's columns for Parquet files.
+
+    Parameters
+    ----------
+    path : str or os.PathLike
+        CSV or Parquet file
+    rows : int, optional
+        Time steps per block (or per read in column mode), defaults to 8760
+    columns : list of str, optional
+        Value columns to read, all by default
+    block_columns : int, optional
+        Read in blocks of this many columns spanning the whole file
+    dtype : numpy.dtype, optional
+        Dtype of the values, e.g. ``numpy.float32`` to halve memory use
+    index_col : str, optional
+        Name of the time stamp column, see `file_columns`
+    fmt : str, optional
+        ``'csv'`` or ``'parquet'``, inferred from the file name by default
+    date_format : str, optional
+        strftime format of the time stamps in CSV files, speeds up parsing
+
+    Yields
+    ------
+    block : Block
+        In column mode, all blocks share one index object
+    """
+    fmt = _format(path, fmt)
+    rows = rows or 8760
+    default_index, all_columns = file_columns(path, fmt)
+    index_col = index_col or default_index
+    if columns is None:
+        # an explicit time stamp column leaves the default one out as well
+        columns = [c for c in all_columns
+                   if c not in (index_col, default_index)]
+    else:
+        columns = list(columns)
+        missing = set(columns) - set(all_columns)
+        if missing:
+            raise KeyError('columns not in file: {}'.format(sorted(missing)))
+    chunks = _csv_chunks if fmt == 'csv' else _parquet_chunks
+
+    if block_columns is None:
+        stream = chunks(path, index_col, columns, dtype, rows, date_format)
+        for index, values in _rechunk(stream, rows):
+            yield Block(index, values, columns)
+        return
+
+    index = read_index(path, index_col, fmt, date_format)
+    for start in range(0, len(columns), block_columns):
+        names = columns[start:start + block_columns]
+        values = np.empty((len(index), len(names)), dtype=dtype)
+        pos = 0
+        for _, chunk in chunks(path, index_col, names, dtype, rows,
+                               date_format):
+            values[pos:pos + len(chunk)] = chunk
+            pos += len(chunk)
+        yield Block(index, values, names)
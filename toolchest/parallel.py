@@ -0,0 +1,248 @@
+"""Process-parallel maps over large numpy arrays and data frames.
+
+`map_chunks` splits its inputs into row chunks and applies a function to
+each chunk in a process pool. Inputs and outputs live in
+`multiprocessing.shared_memory` blocks that workers attach to, so neither
+the inputs nor the results are pickled; only the chunk boundaries are sent
+to the workers.
+"""
+import math
+import os
+import sys
+from multiprocessing import get_context, shared_memory
+
+import numpy as np
+
+from toolchest.profiling import profile
+
+# inputs smaller than this are processed serially; starting a pool costs
+# more than it saves
+MIN_PARALLEL_BYTES = 2 ** 24
+
+# chunks are sized to about this many input bytes, so they fit in cache-
+# friendly pieces while keeping the per-task overhead negligible
+TARGET_CHUNK_BYTES = 2 ** 24
+
+# minimum number of chunks per process, to balance uneven chunk run times
+CHUNKS_PER_PROCESS = 4
+
+
+def _pandas(obj):
+    """pandas, if `obj` is a data frame or series, else None"""
+    pd = sys.modules.get('pandas')
+    if pd is not None and isinstance(obj, (pd.DataFrame, pd.Series)):
+        return pd
+    return None
+
+
+class _Shared(object):
+    """An array in a shared memory block, described so workers can attach"""
+
+    def __init__(self, shape, dtype, name=None):
+        self.shape = tuple(shape)
+        self.dtype = np.dtype(dtype)
+        nbytes = max(int(np.prod(self.shape)) * self.dtype.itemsize, 1)
+        if name is None:
+            self.shm = shared_memory.SharedMemory(create=True, size=nbytes)
+        else:
+            self.shm = shared_memory.SharedMemory(name=name)
+        self.name = self.shm.name
+        self.array = np.ndarray(self.shape, self.dtype, buffer=self.shm.buf)
+
+    def __getstate__(self):
+        return self.shape, self.dtype, self.name
+
+    def __setstate__(self, state):
+        self.__init__(*state)
+
+    def close(self, unlink=False):
+        self.array = None
+        self.shm.close()
+        if unlink:
+            self.shm.unlink()
+
+
+# state of a pool worker, set once by _init_worker
+_worker = {}
+
+
+def _init_worker(inputs, labels, output, func, args, kwargs, cast):
+    _worker.update(inputs=inputs, labels=labels, output=output, func=func,
+                   args=args, kwargs=kwargs, cast=cast)
+
+
+def _chunk(inputs, labels, start, stop):
+    chunks = []
+    for shared, label in zip(inputs, labels):
+        view = shared.array[start:stop]
+        if label is not None:
+            view = _wrap(view, label, slice(start, stop))
+        chunks.append(view)
+    return chunks
+
+
+def _wrap(values, label, rows):
+    import pandas as pd
+    kind, index, columns, name = label
+    if kind == 'DataFrame':
+        return pd.DataFrame(values, index=index[rows], columns=columns,
+                            copy=False)
+    return pd.Series(values, index=index[rows], name=name, copy=False)
+
+
+def _run_chunk(bounds):
+    start, stop = bounds
+    chunks = _chunk(_worker['inputs'], _worker['labels'], start, stop)
+    result = _worker['func'](*(chunks + list(_worker['args'])),
+                             **_worker['kwargs'])
+    result = np.asarray(result)
+    _check_dtype(result.dtype, _worker['output'].array.dtype, _worker['cast'])
+    _worker['output'].array[start:stop] = result
+
+
+def _check_dtype(dtype, out_dtype, cast):
+    if not cast and not np.can_cast(dtype, out_dtype):
+        raise TypeError('func returned {} for a chunk after {} for the '
+                        'first; pass out_dtype'.format(dtype, out_dtype))
+
+
+def available_cpus():
+    """Number of CPUs this process may run on"""
+    if hasattr(os, 'sched_getaffinity'):
+        return len(os.sched_getaffinity(0))
+    return os.cpu_count() or 1
+
+
+def chunk_rows(nrows, row_bytes, processes,
+               target_bytes=TARGET_CHUNK_BYTES):
+    """Number of rows per chunk for `processes` workers
+
+    Parameters
+    ----------
+    nrows : int
+        Total number of rows
+    row_bytes : int
+        Bytes per row, summed over all inputs
+    processes : int
+        Number of worker processes
+    target_bytes : int, optional
+        Preferred chunk size in bytes
+
+    Returns
+    -------
+    rows : int
+    """
+    by_size = max(target_bytes // max(row_bytes, 1), 1)
+    by_balance = max(math.ceil(nrows / (CHUNKS_PER_PROCESS * processes)), 1)
+    return int(min(by_size, by_balance))
+
+
+@profile
+def map_chunks(func, *arrays, args=(), kwargs=None, processes=None,
+               chunksize=None, min_bytes=MIN_PARALLEL_BYTES, out_dtype=None):
+    """Apply `func` to row chunks of `arrays` in parallel
+
+    ``func(*chunks, *args, **kwargs)`` is called with corresponding row
+    slices (along the first axis) of every input and must return an array
+    (or data frame/series) with as many rows as the chunks. The results are
+    reassembled in order; the output is the same as that of
+    ``func(*arrays, *args, **kwargs)`` for any row-wise `func`.
+
+    Parameters
+    ----------
+    func : callable
+        The function to apply; must be picklable unless processes are
+        started by forking
+    arrays : numpy.ndarray or pandas.DataFrame or pandas.Series
+        Inputs, all with the same number of rows. Data frames and series
+        are handed to `func` as such, with their index and columns.
+    args : tuple, optional
+        Further positional arguments to `func`, shared by all chunks
+    kwargs : dict, optional
+        Keyword arguments to `func`, shared by all chunks
+    processes : int, optional
+        Number of worker processes, defaults to `available_cpus`
+    chunksize : int, optional
+        Rows per chunk, chosen automatically by default (see `chunk_rows`)
+    min_bytes : int, optional
+        Inputs of fewer bytes than this in total are processed serially in
+        the calling process
+    out_dtype : numpy.dtype, optional
+        Dtype of the result, to which the results of all chunks are cast.
+        By default it is that of the first chunk's result, and a TypeError
+        is raised if a later chunk returns values that do not safely cast
+        to it, e.g. floats after integers.
+
+    Returns
+    -------
+    result : numpy.ndarray or pandas.DataFrame or pandas.Series
+        Of the type returned by `func`
+    """
+    kwargs = kwargs or {}
+    if not arrays:
+        raise ValueError('map_chunks requires at least one input array')
+    values = [np.asarray(a) for a in arrays]
+    nrows = len(values[0])
+    if any(len(v) != nrows for v in values):
+        raise ValueError('all inputs must have the same number of rows')
+    processes = processes or available_cpus()
+    nbytes = sum(v.nbytes for v in values)
+    if processes == 1 or nbytes < min_bytes or nrows < 2:
+        result = func(*(list(arrays) + list(args)), **kwargs)
+        if out_dtype is not None:
+            result = result.astype(out_dtype, copy=False)
+        return result
+
+    if any(v.dtype.hasobject for v in values):
+        raise TypeError('inputs must not have object dtype')
+
+    labels = []
+    for a in arrays:
+        if _pandas(a) is None:
+            labels.append(None)
+        else:
+            labels.append((type(a).__name__, a.index,
+                           getattr(a, 'columns', None),
+                           getattr(a, 'name', None)))
+    chunksize = chunksize or chunk_rows(nrows, nbytes // nrows, processes)
+    bounds = [(start, min(start + chunksize, nrows))
+              for start in range(0, nrows, chunksize)]
+
+    inputs, output = [], None
+    try:
+        for v in values:
+            shared = _Shared(v.shape, v.dtype)
+            shared.array[...] = v
+            inputs.append(shared)
+        # the first chunk runs here, which also tells the output's layout
+        start, stop = bounds[0]
+        first = func(*(_chunk(inputs, labels, start, stop) + list(args)),
+                     **kwargs)
+        first_values = np.asarray(first)
+        if first_values.ndim == 0 or len(first_values) != stop - start:
+            raise ValueError('func must return as many rows as it is given')
+        output = _Shared((nrows,) + first_values.shape[1:],
+                         first_values.dtype if out_dtype is None
+                         else out_dtype)
+        output.array[start:stop] = first_values
+        if len(bounds) > 1:
+            ctx = get_context()
+            with ctx.Pool(min(processes, len(bounds) - 1),
+                          initializer=_init_worker,
+                          initargs=(inputs, labels, output, func, args,
+                                    kwargs, out_dtype is not None)) as pool:
+                pool.map(_run_chunk, bounds[1:], chunksize=1)
+        result = np.array(output.array)
+    finally:
+        for shared in inputs:
+            shared.close(unlink=True)
+        if output is not None:
+            output.close(unlink=True)
+
+    pd = _pandas(first)
+    if pd is None:
+        return result
+    index = next((label[1] for label in labels if label is not None), None)
+    if isinstance(first, pd.DataFrame):
+        return pd.DataFrame(result, index=index, columns=first.columns)
+    return pd.Series(result, index=index, name=first.name)
@@ -0,0 +1,320 @@
+"""Selection of representative periods to reduce model size.
+
+Long time series of several correlated quantities (e.g. load, wind and solar
+in many regions) are cut into periods of equal length, such as days or
+weeks, which are clustered. Each cluster is replaced by one representative
+period, weighted by the number of periods it stands for, and an assignment
+of every original period to its representative allows reconstructing the
+full series.
+
+Distances are computed in row blocks on normalized views of the input, so
+beyond the input itself memory use is bounded by `block_size` periods.
+"""
+import collections
+import warnings
+
+import numpy as np
+
+from toolchest.profiling import profile
+
+Representatives = collections.namedtuple(
+    'Representatives', ['periods', 'profiles', 'weights', 'assignment'])
+Representatives.__doc__ = """Result of `representative_periods`
+
+Attributes
+----------
+periods : numpy.ndarray
+    Index of the original period chosen as (or closest to) each
+    representative, in chronological order
+profiles : numpy.ndarray
+    Representative profiles, shape ``(k, period_length, series)``
+weights : numpy.ndarray
+    Number of original periods each representative stands for
+assignment : numpy.ndarray
+    Representative (index into `profiles`) of every original period
+"""
+
+EXTREMES = ('max', 'min', 'max_total', 'min_total')
+
+
+class _Features(object):
+    """Normalized period features, computed block by block on demand"""
+
+    def __init__(self, data, period_length, series_weights, block_size):
+        n = data.shape[0] // period_length
+        if n == 0:
+            raise ValueError('data is shorter than one period')
+        self.periods = data[:n * period_length].reshape(
+            n, period_length, data.shape[1])
+        lo, hi = data.min(axis=0), data.max(axis=0)
+        span = np.where(hi > lo, hi - lo, 1.)
+        scale = 1. / span
+        if series_weights is not None:
+            series_weights = np.asarray(series_weights, dtype=float)
+            if series_weights.shape != scale.shape or \
+                    not (series_weights > 0).all():
+                raise ValueError('expected a positive weight per series')
+            scale = scale * np.sqrt(series_weights)
+        self.offset = np.tile(lo, period_length)
+        self.scale = np.tile(scale, period_length)
+        self.n = n
+        self.block_size = block_size
+
+    def block(self, rows):
+        flat = self.periods[rows].reshape(-1, self.offset.size)
+        return (flat - self.offset) * self.scale
+
+    def distinct(self, rows):
+        """Number of distinct periods among `rows`"""
+        return len({hash(self.periods[i].tobytes()) for i in rows})
+
+    def blocks(self, rows=None):
+        rows = np.arange(self.n) if rows is None else rows
+        for start in range(0, len(rows), self.block_size):
+            idx = rows[start:start + self.block_size]
+            yield idx, self.block(idx)
+
+    def distances(self, centers, rows=None):
+        """Squared distances between periods and `centers`, shape (n, k)"""
+        rows = np.arange(self.n) if rows is None else rows
+        out = np.empty((len(rows), len(centers)))
+        cnorm = (centers ** 2).sum(axis=1)
+        pos = 0
+        for idx, x in self.blocks(rows):
+            d = out[pos:pos + len(idx)]
+            np.dot(x, centers.T, out=d)
+            d *= -2
+            d += cnorm
+            d += (x ** 2).sum(axis=1)[:, None]
+            np.maximum(d, 0., out=d)
+            pos += len(idx)
+        return out
+
+
+def _kmeans_pp(features, k, rng, rows):
+    first = rows[rng.randint(len(rows))]
+    centers = [features.block([first])[0]]
+    closest = features.distances(np.array(centers), rows)[:, 0]
+    for _ in range(1, k):
+        total = closest.sum()
+        if total > 0:
+            pick = rows[rng.choice(len(rows), p=closest / total)]
+        else:
+            pick = rows[rng.randint(len(rows))]
+        centers.append(features.block([pick])[0])
+        closest = np.minimum(closest, features.distances(
+            centers[-1][None], rows)[:, 0])
+    return np.array(centers)
+
+
+def _centroids(features, labels, k, rows):
+    sums = np.zeros((k, features.offset.size))
+    pos = 0
+    for idx, x in features.blocks(rows):
+        indicator = np.zeros((k, len(idx)))
+        indicator[labels[pos:pos + len(idx)], np.arange(len(idx))] = 1.
+        sums += indicator @ x
+        pos += len(idx)
+    counts = np.bincount(labels, minlength=k)
+    return sums / np.maximum(counts, 1)[:, None], counts
+
+
+def _kmeans(features, k, rows, rng, n_init, max_iter):
+    best = None
+    for _ in range(n_init):
+        centers = _kmeans_pp(features, k, rng, rows)
+        labels = None
+        for _ in range(max_iter):
+            dist = features.distances(centers, rows)
+            new = dist.argmin(axis=1)
+            if labels is not None and (new == labels).all():
+                break
+            labels = new
+            centers, counts = _centroids(features, labels, k, rows)
+            empty = np.flatnonzero(counts == 0)
+            if len(empty):
+                # re-seed empty clusters with the worst represented periods
+                worst = np.argsort(dist[np.arange(len(rows)), labels])
+                centers[empty] = features.block(rows[worst[-len(empty):]])
+        inertia = dist[np.arange(len(rows)), labels].sum()
+        if best is None or inertia < best[0]:
+            best = inertia, centers
+    # clusters re-seeded with a duplicate of another center stay empty
+    labels, keep = _nonempty(features.distances(best[1], rows).argmin(axis=1))
+    centers, _ = _centroids(features, labels, len(keep), rows)
+    # the period closest to each centroid identifies the cluster
+    dist = features.distances(centers, rows)
+    medoids = np.array([rows[np.flatnonzero(labels == c)[
+        dist[labels == c, c].argmin()]] for c in range(len(keep))])
+    return labels, medoids, centers
+
+
+def _nonempty(labels):
+    """Labels renumbered to skip empty clusters, and the clusters kept"""
+    keep = np.unique(labels)
+    return np.searchsorted(keep, labels), keep
+
+
+def _medoid(features, members):
+    """The member with the least total distance to all other members"""
+    total = np.zeros(len(members))
+    for idx, x in features.blocks(members):
+        total += features.distances(x, members).sum(axis=1)
+    return members[total.argmin()]
+
+
+def _kmedoids(features, k, rows, rng, max_iter):
+    centers = _kmeans_pp(features, k, rng, rows)
+    labels, _ = _nonempty(features.distances(centers, rows).argmin(axis=1))
+    medoids = None
+    for _ in range(max_iter):
+        new = np.array([_medoid(features, rows[labels == c])
+                        for c in range(labels.max() + 1)])
+        if medoids is not None and len(new) == len(medoids) and \
+                (new == medoids).all():
+            break
+        medoids = new
+        labels, keep = _nonempty(features.distances(
+            features.block(medoids), rows).argmin(axis=1))
+        medoids = medoids[keep]
+    return labels, medoids
+
+
+def _hierarchical(features, k, rows):
+    from scipy.cluster.hierarchy import fcluster, linkage
+
+    # Ward's linkage needs all pairwise distances, i.e. O(n**2) memory
+    x = features.block(rows)
+    labels = fcluster(linkage(x, method='ward'), k, criterion='maxclust') - 1
+    medoids = np.array([_medoid(features, rows[labels == c])
+                        for c in range(labels.max() + 1)])
+    return labels, medoids
+
+
+def _extreme_periods(periods, extremes):
+    chosen = []
+    for column, how in extremes:
+        if how not in EXTREMES:
+            raise ValueError('unknown extreme {!r}, use one of {}'.format(
+                how, EXTREMES))
+        values = periods[:, :, column]
+        if how == 'max':
+            score = values.max(axis=1)
+        elif how == 'min':
+            score = -values.min(axis=1)
+        elif how == 'max_total':
+            score = values.sum(axis=1)
+        else:
+            score = -values.sum(axis=1)
+        order = np.argsort(score)[::-1]
+        chosen.append(next(i for i in order if i not in chosen))
+    return chosen
+
+
+@profile
+def representative_periods(data, k, period_length=24, method='kmeans',
+                           extremes=(), series_weights=None, seed=0,
+                           n_init=3, max_iter=100, block_size=1024):
+    """Choose `k` representative periods of multi-variate time series
+
+    Parameters
+    ----------
+    data : array_like
+        Time series of shape ``(time, series)``; trailing steps that do not
+        fill a whole period are ignored. Series are normalized to [0, 1]
+        before clustering.
+    k : int
+        Number of representative periods, including extreme periods. If the
+        data hold fewer distinct periods, or clustering ends up with fewer
+        clusters, fewer representatives are returned with a warning; every
+        representative stands for at least one period.
+    period_length : int, optional
+        Time steps per period, e.g. 24 for days of hourly data
+    method : str, optional
+        ``'kmeans'`` (representatives are cluster means), ``'kmedoids'`` or
+        ``'hierarchical'`` (Ward's method; representatives are actual
+        periods, the medoids of their clusters). Hierarchical clustering
+        needs memory quadratic in the number of periods.
+    extremes : sequence of (int, str), optional
+        Periods kept as representatives of their own, given as ``(column,
+        how)`` with `how` one of ``'max'``/``'min'`` (period with the
+        highest/lowest single value of `column`) or
+        ``'max_total'``/``'min_total'`` (period with the highest/lowest
+        total of `column`)
+    series_weights : array_like, optional
+        Positive weight of each series in the clustering distance
+    seed : int, optional
+        Seed of the random initialization
+    n_init : int, optional
+        Number of k-means runs; the one with the lowest inertia is kept
+    max_iter : int, optional
+        Maximum number of iterations per run
+    block_size : int, optional
+        Number of periods per block in distance computations
+
+    Returns
+    -------
+    representatives : Representatives
+    """
+    data = np.asarray(data, dtype=float)
+    if data.ndim != 2:
+        raise ValueError('expected an array of shape (time, series)')
+    features = _Features(data, period_length, series_weights, block_size)
+    n = features.n
+    extreme = _extreme_periods(features.periods, extremes)
+    clusters = k - len(extreme)
+    rows = np.setdiff1d(np.arange(n), extreme)
+    if clusters < 1 or not len(rows):
+        raise ValueError('k must exceed the number of extreme periods and '
+                         'the data must have further periods')
+    requested, clusters = clusters, min(clusters, features.distinct(rows))
+
+    rng = np.random.RandomState(seed)
+    centers = None
+    if method == 'kmeans':
+        labels, medoids, centers = _kmeans(features, clusters, rows, rng,
+                                           n_init, max_iter)
+    elif method == 'kmedoids':
+        labels, medoids = _kmedoids(features, clusters, rows, rng, max_iter)
+    elif method == 'hierarchical':
+        labels, medoids = _hierarchical(features, clusters, rows)
+    else:
+        raise ValueError('unknown method {!r}'.format(method))
+    if len(medoids) < requested:
+        warnings.warn('found only {} distinct representative periods, not '
+                      '{}'.format(len(medoids) + len(extreme), k))
+
+    if centers is None:
+        profiles = features.periods[medoids]
+    else:
+        flat = centers / features.scale + features.offset
+        profiles = flat.reshape((len(centers),) + features.periods.shape[1:])
+
+    assignment = np.empty(n, dtype=int)
+    assignment[rows] = labels
+    periods = np.concatenate([medoids, extreme]).astype(int)
+    assignment[extreme] = len(medoids) + np.arange(len(extreme))
+    profiles = np.concatenate([profiles, features.periods[extreme]])
+
+    # present the representatives in chronological order
+    order = np.argsort(periods, kind='stable')
+    rank = np.empty_like(order)
+    rank[order] = np.arange(len(order))
+    assignment = rank[assignment]
+    return Representatives(periods=periods[order], profiles=profiles[order],
+                           weights=np.bincount(assignment,
+                                               minlength=len(order)),
+                           assignment=assignment)
+
+
+def reconstruct(representatives):
+    """The full time series implied by `representatives`
+
+    Returns
+    -------
+    data : numpy.ndarray
+        Shape ``(periods * period_length, series)``, with every period
+        replaced by its representative
+    """
+    profiles = representatives.profiles[representatives.assignment]
+    return profiles.reshape(-1, profiles.shape[-1])
@@ -0,0 +1,398 @@
+"""Lightweight instrumentation of toolchest's hot paths.
+
+Functions decorated with `profile` (and blocks wrapped in `timed`) report
+their call counts, wall and CPU time and, optionally, their peak memory
+use to a process-wide `registry`. Recording is off by default and is
+switched on with the ``TOOLCHEST_PROFILE`` environment variable:
+
+- ``TOOLCHEST_PROFILE=1`` records counts and times
+- ``TOOLCHEST_PROFILE=memory`` additionally traces allocations with
+  `tracemalloc`, which slows down allocation-heavy code noticeably. Peaks
+  include temporaries freed before a call returns; on Python 3.8, which
+  cannot reset the traced peak, only the net growth is recorded. Peaks of
+  calls running concurrently in several threads are not told apart.
+
+If ``TOOLCHEST_PROFILE_DIR`` is set as well, every process writes its
+statistics to ``<dir>/profile-<pid>.json`` when it exits cleanly (this
+includes `multiprocessing` workers that are joined, but not those killed by
+``Pool.terminate``); `collect` merges such files from many worker processes.
+Forked children start with an empty registry, so nothing is counted twice.
+
+Examples
+--------
+>>> from toolchest import profiling
+>>> profiling.registry.enable()
+>>> with profiling.timed('load profiles'):
+...     pass
+>>> print(profiling.registry.table())  # doctest: +SKIP
+"""
+from __future__ import print_function
+
+import atexit
+import functools
+import glob
+import inspect
+import json
+import multiprocessing.util
+import os
+import random
+import threading
+import time
+import tracemalloc
+from contextlib import contextmanager
+
+ENV_VAR = 'TOOLCHEST_PROFILE'
+DIR_ENV_VAR = 'TOOLCHEST_PROFILE_DIR'
+
+# number of timings kept per function for percentile estimates
+RESERVOIR_SIZE = 1024
+
+PERCENTILES = (50, 90, 99)
+
+# tracemalloc.reset_peak is new in Python 3.9
+_RESET_PEAK = hasattr(tracemalloc, 'reset_peak')
+
+# reservoirs are sampled with their own generator, so that profiling leaves
+# the seeded global stream of the profiled code alone
+_random = random.Random()
+
+
+class Stats(object):
+    """Accumulated statistics of one instrumented function or block
+
+    Wall and CPU times of individual calls are kept in a fixed-size uniform
+    reservoir sample, so percentiles cost constant memory however often a
+    function is called. `bytes` is the largest peak of traced memory of any
+    call, above the memory in use when the call started.
+    """
+
+    __slots__ = ('count', 'wall', 'cpu', 'bytes', 'samples', 'cpu_samples')
+
+    def __init__(self, count=0, wall=0., cpu=0., bytes=0, samples=None,
+                 cpu_samples=None):
+        self.count = count
+        self.wall = wall
+        self.cpu = cpu
+        self.bytes = bytes
+        self.samples = list(samples or [])
+        self.cpu_samples = list(cpu_samples or [])
+        # statistics written before CPU times were sampled
+        if len(self.cpu_samples) != len(self.samples):
+            self.cpu_samples = [float('nan')] * len(self.samples)
+
+    def add(self, wall, cpu, nbytes=0):
+        self.count += 1
+        self.wall += wall
+        self.cpu += cpu
+        self.bytes = max(self.bytes, nbytes)
+        if len(self.samples) < RESERVOIR_SIZE:
+            self.samples.append(wall)
+            self.cpu_samples.append(cpu)
+        else:
+            i = _random.randrange(self.count)
+            if i < RESERVOIR_SIZE:
+                self.samples[i] = wall
+                self.cpu_samples[i] = cpu
+
+    def merge(self, other):
+        """Add the statistics of `other` to these"""
+        total = self.count + other.count
+        pairs = list(zip(self.samples, self.cpu_samples))
+        other_pairs = list(zip(other.samples, other.cpu_samples))
+        if total and len(pairs) + len(other_pairs) > RESERVOIR_SIZE:
+            # keep each reservoir's share proportional to its call count
+            n = int(round(RESERVOIR_SIZE * float(self.count) / total))
+            n = min(n, len(pairs))
+            m = min(RESERVOIR_SIZE - n, len(other_pairs))
+            pairs = (_random.sample(pairs, n) +
+                     _random.sample(other_pairs, m))
+        else:
+            pairs = pairs + other_pairs
+        self.count = total
+        self.wall += other.wall
+        self.cpu += other.cpu
+        self.bytes = max(self.bytes, other.bytes)
+        self.samples = [wall for wall, _ in pairs]
+        self.cpu_samples = [cpu for _, cpu in pairs]
+
+    def percentile(self, q, kind='wall'):
+        """The `q`-th percentile (0-100) of the sampled wall or CPU times
+
+        Parameters
+        ----------
+        q : float
+        kind : str, optional
+            ``'wall'`` or ``'cpu'``
+        """
+        samples = {'wall': self.samples, 'cpu': self.cpu_samples}[kind]
+        if not samples:
+            return float('nan')
+        ordered = sorted(samples)
+        i = int(round(q / 100. * (len(ordered) - 1)))
+        return ordered[i]
+
+    def to_dict(self):
+        return {name: getattr(self, name) for name in self.__slots__}
+
+
+class Registry(object):
+    """Process-wide collection of `Stats`, keyed by name
+
+    Parameters
+    ----------
+    enabled : bool, optional
+        Whether calls are recorded
+    memory : bool, optional
+        Whether allocated bytes are recorded as well (starts `tracemalloc`)
+    """
+
+    def __init__(self, enabled=False, memory=False):
+        self.stats = {}
+        self.enabled = False
+        self.memory = False
+        self._lock = threading.Lock()
+        if enabled:
+            self.enable(memory=memory)
+
+    def enable(self, memory=False):
+        """Start recording, optionally including allocated bytes"""
+        self.memory = memory
+        if memory and not tracemalloc.is_tracing():
+            tracemalloc.start()
+        self.enabled = True
+
+    def disable(self):
+        """Stop recording; statistics gathered so far are kept"""
+        self.enabled = False
+
+    def reset(self):
+        """Forget all statistics"""
+        with self._lock:
+            self.stats = {}
+
+    def record(self, name, wall, cpu, nbytes=0):
+        """Record a single call of `name`"""
+        with self._lock:
+            stats = self.stats.get(name)
+            if stats is None:
+                stats = self.stats[name] = Stats()
+            stats.add(wall, cpu, nbytes)
+
+    def merge(self, other):
+        """Merge statistics from another registry or its `to_dict` output"""
+        if isinstance(other, Registry):
+            other = other.to_dict()
+        with self._lock:
+            for name, data in other.items():
+                stats = Stats(**data)
+                if name in self.stats:
+                    self.stats[name].merge(stats)
+                else:
+                    self.stats[name] = stats
+        return self
+
+    def to_dict(self):
+        """A JSON-serializable copy of all statistics"""
+        with self._lock:
+            return {name: s.to_dict() for name, s in self.stats.items()}
+
+    def to_json(self, path=None):
+        """Serialize the statistics to a JSON string or to file `path`"""
+        text = json.dumps(self.to_dict(), sort_keys=True)
+        if path is None:
+            return text
+        with open(path, 'w') as f:
+            f.write(text)
+
+    def table(self, sort='wall'):
+        """Format the statistics as a plain-text table
+
+        Parameters
+        ----------
+        sort : str, optional
+            Column to sort by in descending order, one of ``'count'``,
+            ``'wall'``, ``'cpu'`` or ``'bytes'`` (peak memory)
+        """
+        kinds = ('wall', 'cpu')
+        header = ['name', 'count', 'wall [s]', 'cpu [s]', 'peak bytes'] + \
+            ['{} p{} [ms]'.format(kind, q) for kind in kinds
+             for q in PERCENTILES]
+        rows = [header]
+        with self._lock:
+            items = sorted(self.stats.items(),
+                           key=lambda item: getattr(item[1], sort),
+                           reverse=True)
+            for name, s in items:
+                rows.append([name, str(s.count), '{:.4f}'.format(s.wall),
+                             '{:.4f}'.format(s.cpu), str(s.bytes)] +
+                            ['{:.3f}'.format(s.percentile(q, kind) * 1e3)
+                             for kind in kinds for q in PERCENTILES])
+        widths = [max(len(row[i]) for row in rows) for i in range(len(header))]
+        lines = ['  '.join(cell.ljust(w) if i == 0 else cell.rjust(w)
+                           for i, (cell, w) in enumerate(zip(row, widths)))
+                 for row in rows]
+        lines.insert(1, '-' * len(lines[0]))
+        return '\n'.join(lines)
+
+
+def _from_env():
+    value = os.environ.get(ENV_VAR, '').strip().lower()
+    enabled = value not in ('', '0', 'false', 'no', 'off')
+    return Registry(enabled=enabled, memory=(value == 'memory'))
+
+
+registry = _from_env()
+
+# running peaks of traced memory of the enclosing measured blocks, since
+# every block resets the traced peak when it starts
+_peaks = []
+
+
+@contextmanager
+def _measure(memory, totals):
+    # adds the wall and CPU time of the block to totals[0] and totals[1]
+    # and raises totals[2] to its peak memory use
+    if memory:
+        before, peak = tracemalloc.get_traced_memory()
+        if _RESET_PEAK:
+            if _peaks:
+                _peaks[-1] = max(_peaks[-1], peak)
+            tracemalloc.reset_peak()
+        _peaks.append(before)
+    wall, cpu = time.perf_counter(), time.process_time()
+    try:
+        yield
+    finally:
+        totals[0] += time.perf_counter() - wall
+        totals[1] += time.process_time() - cpu
+        if memory:
+            after, peak = tracemalloc.get_traced_memory()
+            # without reset_peak only the net growth is known
+            peak = max(_peaks.pop(), peak) if _RESET_PEAK else after
+            totals[2] = max(totals[2], peak - before)
+            if _peaks:
+                _peaks[-1] = max(_peaks[-1], peak)
+
+
+@contextmanager
+def timed(name, registry=registry):
+    """Record the execution of a block of code under `name`
+
+    Parameters
+    ----------
+    name : str
+        Name under which the block is recorded
+    registry : Registry, optional
+        Where to record, defaults to the process-wide registry
+    """
+    if not registry.enabled:
+        yield
+        return
+    totals = [0., 0., 0]
+    try:
+        with _measure(registry.memory and tracemalloc.is_tracing(), totals):
+            yield
+    finally:
+        registry.record(name, *totals)
+
+
+def profile(func=None, name=None, registry=registry):
+    """Decorator recording each call of `func` in the registry
+
+    Can be used bare (``@profile``) or with arguments
+    (``@profile(name='gis.zonal_stats')``). While the registry is disabled
+    the only overhead is a single attribute lookup per call.
+
+    A generator function is recorded once per iteration, when it is
+    exhausted or closed, with the time spent producing its items; the time
+    the caller spends between items is not counted.
+
+    Parameters
+    ----------
+    func : callable
+        The function to instrument
+    name : str, optional
+        Name under which calls are recorded, defaults to the function's
+        module and qualified name
+    registry : Registry, optional
+        Where to record, defaults to the process-wide registry
+    """
+    if func is None:
+        return functools.partial(profile, name=name, registry=registry)
+    if name is None:
+        name = '{}.{}'.format(func.__module__, func.__qualname__)
+
+    if inspect.isgeneratorfunction(func):
+        @functools.wraps(func)
+        def generator(*args, **kwargs):
+            if not registry.enabled:
+                return (yield from func(*args, **kwargs))
+            memory = registry.memory and tracemalloc.is_tracing()
+            totals = [0., 0., 0]
+            items = func(*args, **kwargs)
+            try:
+                while True:
+                    with _measure(memory, totals):
+                        try:
+                            item = next(items)
+                        except StopIteration as stop:
+                            return stop.value
+                    yield item
+            finally:
+                items.close()
+                registry.record(name, *totals)
+
+        return generator
+
+    @functools.wraps(func)
+    def wrapper(*args, **kwargs):
+        if not registry.enabled:
+            return func(*args, **kwargs)
+        with timed(name, registry):
+            return func(*args, **kwargs)
+
+    return wrapper
+
+
+def collect(paths):
+    """Merge statistics written by several processes
+
+    Parameters
+    ----------
+    paths : str or list of str
+        JSON files written by `Registry.to_json`, or a glob pattern
+
+    Returns
+    -------
+    registry : Registry
+        A new (disabled) registry holding the merged statistics
+    """
+    if isinstance(paths, str):
+        paths = sorted(glob.glob(paths))
+    merged = Registry()
+    for path in paths:
+        with open(path) as f:
+            merged.merge(json.load(f))
+    return merged
+
+
+def _dump_at_exit():
+    directory = os.environ.get(DIR_ENV_VAR)
+    if directory and registry.stats:
+        if not os.path.isdir(directory):
+            os.makedirs(directory)
+        registry.to_json(os.path.join(
+            directory, 'profile-{}.json'.format(os.getpid())))
+
+
+def _after_fork(*args):
+    # the parent may have held the lock while forking
+    registry._lock = threading.Lock()
+    registry.reset()
+    _random.seed()
+    # multiprocessing children leave through os._exit, skipping atexit
+    multiprocessing.util.Finalize(None, _dump_at_exit, exitpriority=0)
+
+
+atexit.register(_dump_at_exit)
+multiprocessing.util.register_after_fork(registry, _after_fork)
@@ -0,0 +1,172 @@
+"""Storage balances over (time, series) arrays.
+
+The state of charge of a store depends on its state in the previous time
+step, so these recursions cannot be vectorized along time. They run as
+numba-compiled loops if numba is installed and as numpy loops over time,
+vectorized across series, otherwise (see ``toolchest._jit``).
+
+All arrays are of shape ``(time, series)``; parameters may be scalars or
+one value per series. Energies are in units of power times one time step.
+"""
+import numpy as np
+
+from toolchest._jit import kernel
+from toolchest.profiling import profile
+
+
+def _soc_numpy(net, capacity, initial, retain, out):
+    level = initial.copy()
+    for t in range(net.shape[0]):
+        level *= retain
+        level += net[t]
+        np.clip(level, 0., capacity, out=level)
+        out[t] = level
+    return out
+
+
+@kernel(_soc_numpy)
+def _soc(net, capacity, initial, retain, out):
+    level = initial.copy()
+    for t in range(net.shape[0]):
+        for j in range(net.shape[1]):
+            x = level[j] * retain[j] + net[t, j]
+            if x < 0.:
+                x = 0.
+            elif x > capacity[j]:
+                x = capacity[j]
+            level[j] = x
+            out[t, j] = x
+    return out
+
+
+def _dispatch_numpy(residual, capacity, power, initial, retain, eff_in,
+                    eff_out, soc, flow):
+    level = initial.copy()
+    for t in range(residual.shape[0]):
+        level *= retain
+        r = residual[t]
+        charge = np.minimum(np.minimum(-r, power), (capacity - level) / eff_in)
+        discharge = np.minimum(np.minimum(r, power), level * eff_out)
+        f = np.where(r < 0., -np.maximum(charge, 0.),
+                     np.maximum(discharge, 0.))
+        level -= np.where(f < 0., f * eff_in, f / eff_out)
+        np.clip(level, 0., capacity, out=level)
+        soc[t] = level
+        flow[t] = f
+    return soc, flow
+
+
+@kernel(_dispatch_numpy)
+def _dispatch(residual, capacity, power, initial, retain, eff_in, eff_out,
+              soc, flow):
+    level = initial.copy()
+    for t in range(residual.shape[0]):
+        for j in range(residual.shape[1]):
+            x = level[j] * retain[j]
+            r = residual[t, j]
+            if r < 0.:
+                f = -min(-r, power[j], (capacity[j] - x) / eff_in[j])
+                if f > 0.:
+                    f = 0.
+                x -= f * eff_in[j]
+            else:
+                f = min(r, power[j], x * eff_out[j])
+                if f < 0.:
+                    f = 0.
+                x -= f / eff_out[j]
+            if x < 0.:
+                x = 0.
+            elif x > capacity[j]:
+                x = capacity[j]
+            level[j] = x
+            soc[t, j] = x
+            flow[t, j] = f
+    return soc, flow
+
+
+def _per_series(value, n):
+    return np.ascontiguousarray(np.broadcast_to(
+        np.asarray(value, dtype=np.float64), (n,)))
+
+
+@profile
+def state_of_charge(charge, discharge, capacity, initial=0.,
+                    efficiency_in=1., efficiency_out=1., standing_loss=0.):
+    """Energy content of stores given their charging and discharging
+
+    The level is bounded by zero and `capacity`; charging beyond a full or
+    discharging below an empty store is lost.
+
+    Parameters
+    ----------
+    charge, discharge : array_like
+        Charging and discharging power (non-negative), shape
+        ``(time, series)``
+    capacity : float or array_like
+        Energy capacity per series
+    initial : float or array_like, optional
+        Energy content before the first time step
+    efficiency_in, efficiency_out : float or array_like, optional
+        Charging and discharging efficiencies
+    standing_loss : float or array_like, optional
+        Share of the energy content lost per time step
+
+    Returns
+    -------
+    soc : numpy.ndarray
+        Energy content at the end of each time step, shape
+        ``(time, series)``
+    """
+    charge = np.asarray(charge, dtype=np.float64)
+    discharge = np.asarray(discharge, dtype=np.float64)
+    net = np.ascontiguousarray(charge * efficiency_in -
+                               discharge / np.asarray(efficiency_out))
+    if net.ndim != 2:
+        raise ValueError('expected arrays of shape (time, series)')
+    n = net.shape[1]
+    return _soc(net, _per_series(capacity, n), _per_series(initial, n),
+                1. - _per_series(standing_loss, n), np.empty_like(net))
+
+
+@profile
+def dispatch(residual, capacity, power, initial=0., efficiency_in=1.,
+             efficiency_out=1., standing_loss=0.):
+    """Greedy storage dispatch against a residual load
+
+    In every time step, stores charge as much of a surplus (negative
+    residual) and discharge as much of a deficit (positive residual) as
+    their power and energy limits allow.
+
+    Parameters
+    ----------
+    residual : array_like
+        Residual load (load minus generation), shape ``(time, series)``
+    capacity : float or array_like
+        Energy capacity per series
+    power : float or array_like
+        Charging and discharging power limit per series
+    initial : float or array_like, optional
+        Energy content before the first time step
+    efficiency_in, efficiency_out : float or array_like, optional
+        Charging and discharging efficiencies
+    standing_loss : float or array_like, optional
+        Share of the energy content lost per time step
+
+    Returns
+    -------
+    soc : numpy.ndarray
+        Energy content at the end of each time step
+    flow : numpy.ndarray
+        Power delivered by the stores; negative while charging. The
+        residual load after storage is ``residual - flow``.
+    """
+    residual = np.ascontiguousarray(residual, dtype=np.float64)
+    if residual.ndim != 2:
+        raise ValueError('expected arrays of shape (time, series)')
+    n = residual.shape[1]
+    return _dispatch(residual, _per_series(capacity, n),
+                     _per_series(power, n), _per_series(initial, n),
+                     1. - _per_series(standing_loss, n),
+                     _per_series(efficiency_in, n),
+                     _per_series(efficiency_out, n),
+                     np.empty_like(residual), np.empty_like(residual))
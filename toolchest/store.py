@@ -0,0 +1,321 @@
+"""A memory-mapped on-disk store for collections of time series.
+
+A store is a directory holding one ``.npy`` file per block of time steps
+and a ``store.json`` sidecar with the time index, column labels and units::
+
+    profiles/
+        store.json
+        block-00000.npy
+        block-00001.npy
+
+Blocks are stored column-major, so reading a few columns only touches the
+pages holding them. They are opened with `numpy.memmap`, which lets many
+processes share one copy of the data in the operating system's page cache
+instead of each holding a private copy.
+
+Every block has a fixed frequency and is described in the sidecar by its
+first time stamp and length. New blocks, e.g. further years, are appended
+by writing the block and then atomically replacing the sidecar, so readers
+always see a consistent store; call `Store.refresh` to pick up blocks
+appended after opening. Only one process should append at a time, which is
+enforced with an operating system lock on ``store.lock``.
+
+Examples
+--------
+>>> store = Store.create('profiles', ['DE', 'FR'])  # doctest: +SKIP
+>>> store.append(values, index)  # doctest: +SKIP
+>>> index, fr = store.read('2020-01', '2020-02', 'FR')  # doctest: +SKIP
+"""
+import json
+import os
+import tempfile
+import time
+
+import numpy as np
+import pandas as pd
+
+META = 'store.json'
+LOCK = 'store.lock'
+VERSION = 1
+
+
+class Store(object):
+    """A store of time series in the directory `path`
+
+    Parameters
+    ----------
+    path : str or os.PathLike
+        Directory of an existing store, see `Store.create`
+    """
+
+    def __init__(self, path):
+        self.path = os.fspath(path)
+        self._arrays = {}
+        self.refresh()
+
+    @classmethod
+    def create(cls, path, columns, dtype=np.float64, units=None, tz=None):
+        """Create a new, empty store
+
+        Parameters
+        ----------
+        path : str or os.PathLike
+            Directory to create; may exist if empty
+        columns : list of str
+            Column labels
+        dtype : numpy.dtype, optional
+            Dtype of the stored values
+        units : str or dict, optional
+            One unit for all columns, or a unit per column label
+        tz : str, optional
+            Time zone of the time index
+        """
+        path = os.fspath(path)
+        os.makedirs(path, exist_ok=True)
+        if os.listdir(path):
+            raise FileExistsError('{} is not empty'.format(path))
+        columns = [str(c) for c in columns]
+        if not isinstance(units, dict):
+            units = {c: units for c in columns}
+        meta = {
+            'version': VERSION,
+            'dtype': np.dtype(dtype).str,
+            'columns': columns,
+            'units': [units.get(c) for c in columns],
+            'tz': None if tz is None else str(tz),
+            'blocks': [],
+        }
+        _write_json(os.path.join(path, META), meta)
+        return cls(path)
+
+    def refresh(self):
+        """Re-read the sidecar to see blocks appended by other processes"""
+        with open(os.path.join(self.path, META)) as f:
+            meta = json.load(f)
+        if meta['version'] != VERSION:
+            raise ValueError('unsupported store version {}'.format(
+                meta['version']))
+        self.meta = meta
+        self.columns = meta['columns']
+        self.units = dict(zip(self.columns, meta['units']))
+        self.dtype = np.dtype(meta['dtype'])
+        self.tz = meta['tz']
+        self._column_pos = {c: i for i, c in enumerate(self.columns)}
+        self._starts = np.array(
+            [pd.Timestamp(b['start']).value for b in meta['blocks']],
+            dtype=np.int64)
+        self._steps = np.array(
+            [pd.Timedelta(b['freq']).value for b in meta['blocks']],
+            dtype=np.int64)
+        self._lengths = np.array([b['rows'] for b in meta['blocks']],
+                                 dtype=np.int64)
+
+    def __len__(self):
+        return int(self._lengths.sum())
+
+    @property
+    def shape(self):
+        return len(self), len(self.columns)
+
+    def _block_index(self, i):
+        index = pd.date_range(pd.Timestamp(self._starts[i], tz='UTC'),
+                              periods=self._lengths[i],
+                              freq=pd.Timedelta(self._steps[i]))
+        return index.tz_convert(self.tz) if self.tz else \
+            index.tz_localize(None)
+
+    @property
+    def index(self):
+        """Time stamps of all rows, as a `pandas.DatetimeIndex`"""
+        if not len(self._starts):
+            return pd.DatetimeIndex([], tz=self.tz)
+        indexes = [self._block_index(i) for i in range(len(self._starts))]
+        return indexes[0].append(indexes[1:])
+
+    def _array(self, i):
+        name = self.meta['blocks'][i]['file']
+        if name not in self._arrays:
+            self._arrays[name] = np.load(os.path.join(self.path, name),
+                                         mmap_mode='r')
+        return self._arrays[name]
+
+    def _utc(self, stamp):
+        stamp = pd.Timestamp(stamp)
+        if stamp.tz is None and self.tz is not None:
+            stamp = stamp.tz_localize(self.tz)
+        return stamp.as_unit('ns').value
+
+    def _columns(self, columns):
+        if columns is None:
+            return slice(None)
+        if isinstance(columns, slice):
+            return columns
+        if isinstance(columns, str):
+            return self._column_pos[columns]
+        pos = [self._column_pos[c] for c in columns]
+        # consecutive columns are a slice, which keeps the result a view
+        if pos and pos == list(range(pos[0], pos[0] + len(pos))):
+            return slice(pos[0], pos[0] + len(pos))
+        return pos
+
+    def blocks(self, start=None, stop=None, columns=None):
+        """Iterate over the rows with ``start <= time < stop`` block by block
+
+        Parameters
+        ----------
+        start, stop : str or pandas.Timestamp, optional
+            Bounds of the time range; naive time stamps are taken in the
+            store's time zone
+        columns : str or list of str or slice, optional
+            A column label, a list of labels or a slice of positions
+
+        Yields
+        ------
+        index : pandas.DatetimeIndex
+        values : numpy.ndarray
+            Read-only memory-mapped view of the block, unless `columns` is a
+            list of non-consecutive labels, in which case only the selected
+            columns are copied
+        """
+        cols = self._columns(columns)
+        lo = None if start is None else self._utc(start)
+        hi = None if stop is None else self._utc(stop)
+        for i in range(len(self._starts)):
+            first, step, n = self._starts[i], self._steps[i], self._lengths[i]
+            a = 0 if lo is None else int(np.clip(-(-(lo - first) // step),
+                                                 0, n))
+            b = n if hi is None else int(np.clip(-(-(hi - first) // step),
+                                                 0, n))
+            if a >= b:
+                continue
+            yield self._block_index(i)[a:b], self._array(i)[a:b, cols]
+
+    def read(self, start=None, stop=None, columns=None):
+        """Read the rows with ``start <= time < stop``
+
+        Takes the same arguments as `blocks`. If the range lies within one
+        block and `columns` is a label, slice or consecutive labels, the
+        values are a memory-mapped view; otherwise the selection is copied.
+
+        Returns
+        -------
+        index : pandas.DatetimeIndex
+        values : numpy.ndarray
+        """
+        parts = list(self.blocks(start, stop, columns))
+        if not parts:
+            cols = self._columns(columns)
+            empty = np.empty((0, len(self.columns)), self.dtype)[:, cols]
+            return pd.DatetimeIndex([], tz=self.tz), empty
+        if len(parts) == 1:
+            return parts[0]
+        return (parts[0][0].append([p[0] for p in parts[1:]]),
+                np.concatenate([p[1] for p in parts]))
+
+    def append(self, values, index):
+        """Append a block of rows after the last stored time step
+
+        Parameters
+        ----------
+        values : array_like
+            Values of shape ``(time, columns)``
+        index : pandas.DatetimeIndex
+            Time stamps of the rows, of fixed frequency
+        """
+        values = np.asarray(values)
+        index = pd.DatetimeIndex(index)
+        if values.shape != (len(index), len(self.columns)):
+            raise ValueError('expected values of shape {}'.format(
+                (len(index), len(self.columns))))
+        if (index.tz is None) != (self.tz is None):
+            raise ValueError('time zone of index does not match the store')
+        utc = index.as_unit('ns').asi8
+        steps = np.diff(utc)
+        if len(index) > 1 and (steps != steps[0]).any():
+            raise ValueError('index must have a fixed frequency')
+        step = steps[0] if len(index) > 1 else (
+            self._steps[-1] if len(self._steps) else 0)
+        if not step:
+            raise ValueError('cannot infer the frequency of a single row')
+
+        with _Lock(os.path.join(self.path, LOCK)):
+            self.refresh()
+            if len(self._starts):
+                end = self._starts[-1] + self._steps[-1] * self._lengths[-1]
+                if utc[0] < end:
+                    raise ValueError('index overlaps with stored rows')
+            name = 'block-{:05d}.npy'.format(len(self.meta['blocks']))
+            fd, tmp = tempfile.mkstemp(dir=self.path, suffix='.tmp')
+            with os.fdopen(fd, 'wb') as f:
+                np.save(f, np.asfortranarray(values, dtype=self.dtype))
+            os.replace(tmp, os.path.join(self.path, name))
+            meta = dict(self.meta, blocks=self.meta['blocks'] + [{
+                'file': name,
+                'start': pd.Timestamp(utc[0], tz='UTC').isoformat(),
+                'freq': pd.Timedelta(step).isoformat(),
+                'rows': len(index),
+            }])
+            _write_json(os.path.join(self.path, META), meta)
+            self.refresh()
+
+
+def _write_json(path, doc):
+    fd, tmp = tempfile.mkstemp(dir=os.path.dirname(path), suffix='.tmp')
+    with os.fdopen(fd, 'w') as f:
+        json.dump(doc, f, indent=1)
+    os.replace(tmp, path)
+
+
+if os.name == 'nt':
+    import msvcrt
+
+    def _try_lock(fd):
+        os.lseek(fd, 0, os.SEEK_SET)
+        msvcrt.locking(fd, msvcrt.LK_NBLCK, 1)
+
+    def _unlock(fd):
+        os.lseek(fd, 0, os.SEEK_SET)
+        msvcrt.locking(fd, msvcrt.LK_UNLCK, 1)
+else:
+    import fcntl
+
+    def _try_lock(fd):
+        fcntl.flock(fd, fcntl.LOCK_EX | fcntl.LOCK_NB)
+
+    def _unlock(fd):
+        fcntl.flock(fd, fcntl.LOCK_UN)
+
+
+class _Lock(object):
+    """An exclusive lock on a file
+
+    The operating system releases the lock when its holder exits, so a
+    crashed writer never blocks later ones. The file itself stays in place.
+    """
+
+    def __init__(self, path, timeout=60.):
+        self.path = path
+        self.timeout = timeout
+        self._fd = None
+
+    def __enter__(self):
+        deadline = time.time() + self.timeout
+        fd = os.open(self.path, os.O_CREAT | os.O_RDWR)
+        while True:
+            try:
+                _try_lock(fd)
+                self._fd = fd
+                return self
+            except OSError:
+                if time.time() > deadline:
+                    os.close(fd)
+                    raise TimeoutError('could not acquire {}'.format(
+                        self.path))
+                time.sleep(0.05)
+
+    def __exit__(self, *exc):
+        try:
+            _unlock(self._fd)
+        finally:
+            os.close(self._fd)
+            self._fd = None
@@ -0,0 +1,659 @@
+"""Tools for load and generation time series.
+
+Time series are numpy arrays of shape ``(time, series)`` accompanied by a
+`pandas.DatetimeIndex` holding the start of every time step. Indexes may be
+time zone aware; calendar periods such as days are then taken in local time
+and may be 23 or 25 hours long around daylight saving time changes.
+
+Measured series can be checked with `flag_faults` and cleaned with
+`repair`, which mark every value with bitwise quality flags.
+
+Profiles recorded in the local time of many regions are moved to a common
+UTC time line by `align_to_utc`, using tables of the UTC offsets of every
+time zone, and `day_types` tells workdays from weekends and holidays.
+"""
+import functools
+
+import numpy as np
+import pandas as pd
+
+from toolchest.profiling import profile
+
+NS_PER_DAY = 86400 * 10 ** 9
+
+# the unix epoch was a Thursday; weekly bins start on Mondays
+WEEK_ORIGIN = 4 * NS_PER_DAY
+
+# quality flags of `flag_faults` and `repair`, combined bitwise
+GAP = 1
+FLATLINE = 2
+SPIKE = 4
+REPAIRED = 8
+FAULTS = GAP | FLATLINE | SPIKE
+
+# day types of `day_types`
+WORKDAY = 0
+SATURDAY = 1
+SUNDAY = 2
+
+
+def _as_2d(data):
+    data = np.asarray(data)
+    if data.ndim == 1:
+        return data[:, None], True
+    if data.ndim != 2:
+        raise ValueError('expected an array of shape (time, series)')
+    return data, False
+
+
+def _times(index):
+    """Wall-clock and UTC nanoseconds of `index`"""
+    index = pd.DatetimeIndex(index).as_unit('ns')
+    utc = index.asi8
+    if index.tz is None:
+        return utc, utc
+    return index.tz_localize(None).asi8, utc
+
+
+def _step(freq):
+    if isinstance(freq, str) and freq[:1].isalpha():
+        freq = '1' + freq
+    return pd.Timedelta(freq).value
+
+
+def durations(index):
+    """Length of every time step of `index` in nanoseconds
+
+    The last step is assumed to last as long on the wall clock as the one
+    before it, so a last step of one day in local time ending after a
+    daylight saving time change is still a full calendar day.
+
+    Parameters
+    ----------
+    index : pandas.DatetimeIndex
+        Start of every time step, sorted
+
+    Returns
+    -------
+    durations : numpy.ndarray of int64
+    """
+    index = pd.DatetimeIndex(index)
+    wall, utc = _times(index)
+    if len(utc) < 2:
+        raise ValueError('at least two time steps are required')
+    end = pd.Timestamp(2 * wall[-1] - wall[-2])
+    if index.tz is not None:
+        end = end.tz_localize(index.tz, ambiguous=True,
+                              nonexistent='shift_forward')
+    return np.diff(np.append(utc, end.as_unit('ns').value))
+
+
+def _from_ns(values, tz, wall):
+    if wall:
+        index = pd.DatetimeIndex(values.astype('datetime64[ns]'))
+        if tz is not None:
+            # bins starting in a repeated hour are taken as the first one
+            index = index.tz_localize(tz, ambiguous=np.ones(len(index), bool),
+                                      nonexistent='shift_forward')
+        return index
+    index = pd.DatetimeIndex(values.astype('datetime64[ns]'), tz='UTC')
+    return index.tz_convert(tz) if tz is not None else index.tz_localize(None)
+
+
+def _bin_keys(wall, utc, step):
+    """Start of the bin of width `step` containing each time step
+
+    Bins of a day or longer follow the local calendar and are returned as
+    wall-clock times. Shorter bins are returned as UTC instants, so the two
+    wall-clock hours repeated when daylight saving time ends stay apart.
+    """
+    if step >= NS_PER_DAY:
+        origin = WEEK_ORIGIN if step % (7 * NS_PER_DAY) == 0 else 0
+        return (wall - origin) // step * step + origin, True
+    offset = wall - utc
+    return (wall // step * step) - offset, False
+
+
+@profile
+def resample(data, index, freq, quantity='power'):
+    """Resample time series to another fixed resolution, conserving energy
+
+    Down-sampling aggregates all steps starting within a target step, up-
+    sampling splits every step evenly. Both run in a single vectorized pass
+    over the whole array.
+
+    Parameters
+    ----------
+    data : array_like
+        Values of shape ``(time, series)`` or ``(time,)``
+    index : pandas.DatetimeIndex
+        Start of every time step, sorted, possibly time zone aware
+    freq : str or pandas.Timedelta
+        Target resolution of fixed length, e.g. ``'15min'``, ``'h'``, ``'D'``
+        or ``'7D'`` (weeks starting on Monday). Days and weeks are taken in
+        local time.
+    quantity : str, optional
+        ``'power'`` if `data` holds mean rates over each step (e.g. MW or
+        capacity factors), which are averaged weighted by step length, or
+        ``'energy'`` if it holds totals per step (e.g. MWh), which are
+        summed. Energy, i.e. the total of rate times duration or of totals,
+        is conserved either way.
+
+    Returns
+    -------
+    values : numpy.ndarray
+        Resampled data, of the same number of dimensions as `data`
+    index : pandas.DatetimeIndex
+        Start of every resampled time step, in the time zone of `index`
+
+    Examples
+    --------
+    >>> index = pd.date_range('2020-03-29', periods=2, freq='D',
+    ...                       tz='Europe/Berlin')
+    >>> values, hourly = resample(np.array([1., 2.]), index, 'h')
+    >>> len(hourly)  # 23 hours on the day clocks go forward
+    47
+    """
+    if quantity not in ('power', 'energy'):
+        raise ValueError("quantity must be 'power' or 'energy'")
+    data, flat = _as_2d(data)
+    index = pd.DatetimeIndex(index)
+    if len(index) != len(data):
+        raise ValueError('index and data differ in length')
+    wall, utc = _times(index)
+    dur = durations(index)
+    step = _step(freq)
+    if step >= np.median(dur):
+        values, new_index = _downsample(data, wall, utc, dur, step, quantity,
+                                        index.tz)
+    else:
+        values, new_index = _upsample(data, utc, dur, step, quantity,
+                                      index.tz)
+    return (values[:, 0] if flat else values), new_index
+
+
+def _downsample(data, wall, utc, dur, step, quantity, tz):
+    keys, is_wall = _bin_keys(wall, utc, step)
+    starts = np.flatnonzero(np.r_[True, keys[1:] != keys[:-1]])
+    if quantity == 'energy':
+        values = np.add.reduceat(data, starts, axis=0)
+    elif (dur == dur[0]).all():
+        counts = np.diff(np.r_[starts, len(data)])
+        values = np.add.reduceat(data, starts, axis=0) / counts[:, None]
+    else:
+        weights = dur / float(dur[0])
+        total = np.add.reduceat(weights, starts)
+        values = np.add.reduceat(data * weights[:, None], starts, axis=0)
+        values /= total[:, None]
+    return values, _from_ns(keys[starts], tz, is_wall)
+
+
+def _upsample(data, utc, dur, step, quantity, tz):
+    if (dur % step).any():
+        raise ValueError('time steps are not multiples of {}'.format(
+            pd.Timedelta(step)))
+    parts = dur // step
+    values = np.repeat(data, parts, axis=0)
+    if quantity == 'energy':
+        values = values / np.repeat(parts, parts)[:, None]
+    first = np.cumsum(parts) - parts
+    within = np.arange(parts.sum()) - np.repeat(first, parts)
+    times = np.repeat(utc, parts) + within * step
+    return values, _from_ns(times, tz, False)
+
+
+@profile
+def typical_day(data, index, by=None):
+    """Average daily profile, optionally per month or day of the week
+
+    Parameters
+    ----------
+    data : array_like
+        Values of shape ``(time, series)`` or ``(time,)`` at a resolution of
+        a day or finer
+    index : pandas.DatetimeIndex
+        Start of every time step; days are taken in local time
+    by : str, optional
+        ``'month'`` or ``'weekday'`` for one profile per month (1-12) or per
+        day of the week (0 is Monday); a single profile by default
+
+    Returns
+    -------
+    profiles : numpy.ndarray
+        Shape ``(groups, steps per day, series)``, or ``(groups, steps per
+        day)`` for one-dimensional `data`. Slots of a group that never occur
+        (e.g. the hour skipped when clocks go forward) are NaN.
+    groups : numpy.ndarray
+        Label of every group, e.g. the month numbers present in `index`
+    """
+    from scipy import sparse
+
+    data, flat = _as_2d(data)
+    key, groups, slots = _day_slots(index, by)
+    # a (group-slot, time) indicator matrix sums all matching steps at once
+    indicator = sparse.csr_matrix(
+        (np.ones(len(key)), (key, np.arange(len(key)))),
+        shape=(len(groups) * slots, len(key)))
+    counts = np.asarray(indicator.sum(axis=1))
+    with np.errstate(invalid='ignore', divide='ignore'):
+        profiles = (indicator @ data) / counts
+    profiles = profiles.reshape(len(groups), slots, data.shape[1])
+    return (profiles[..., 0] if flat else profiles), groups
+
+
+def _day_slots(index, by):
+    """Group-and-slot key of every step for daily profiles per group"""
+    index = pd.DatetimeIndex(index)
+    wall, _ = _times(index)
+    step = int(np.median(durations(index)))
+    slots = NS_PER_DAY // step
+    slot = (wall % NS_PER_DAY) // step
+    if by is None:
+        labels = np.zeros(len(index), dtype=int)
+    elif by == 'month':
+        labels = np.asarray(index.month)
+    elif by == 'weekday':
+        labels = np.asarray(index.dayofweek)
+    else:
+        raise ValueError("by must be None, 'month' or 'weekday'")
+    groups, group = np.unique(labels, return_inverse=True)
+    return group * slots + slot, groups, slots
+
+
+def _run_lengths(starts):
+    """Length of the run of every element, given where runs start"""
+    # lay the columns end to end; each one starts with a run of its own
+    ids = np.cumsum(starts.T.ravel()) - 1
+    return np.bincount(ids)[ids].reshape(starts.shape[::-1]).T
+
+
+@profile
+def flag_faults(data, flatline=4, spike=5., zero_flatlines=False):
+    """Flag gaps, flatlines and spikes in measured time series
+
+    Parameters
+    ----------
+    data : array_like
+        Values of shape ``(time, series)`` or ``(time,)``; gaps are NaN
+    flatline : int, optional
+        Minimum number of consecutive identical values flagged as a
+        flatline (e.g. a stuck meter), 0 to not detect flatlines
+    spike : float, optional
+        Single steps jumping up and immediately back down (or vice versa)
+        by more than `spike` robust standard deviations of the step changes
+        of their series are spikes; 0 to not detect spikes
+    zero_flatlines : bool, optional
+        Whether runs of zeros, e.g. solar generation at night, are
+        flatlines
+
+    Returns
+    -------
+    flags : numpy.ndarray of uint8
+        Combination of `GAP`, `FLATLINE` and `SPIKE` for every value, 0 for
+        good values
+    """
+    data, flat = _as_2d(data)
+    data = np.asarray(data, dtype=float)
+    missing = np.isnan(data)
+    flags = missing.astype(np.uint8) * GAP
+    if flatline:
+        starts = np.ones(data.shape, dtype=bool)
+        np.not_equal(data[1:], data[:-1], out=starts[1:])
+        stuck = (_run_lengths(starts) >= flatline) & ~missing
+        if not zero_flatlines:
+            stuck &= data != 0
+        flags[stuck] |= FLATLINE
+    if spike and len(data) > 2:
+        diff = np.diff(data, axis=0)
+        with np.errstate(invalid='ignore', divide='ignore'):
+            # median absolute step change, as a robust standard deviation
+            scale = 1.4826 * np.nanmedian(np.abs(diff), axis=0)
+            scale = np.where(scale > 0, scale, np.nanstd(diff, axis=0))
+            jump = diff / scale
+            peaks = ((np.abs(jump[:-1]) > spike) & (np.abs(jump[1:]) > spike)
+                     & (np.sign(jump[:-1]) != np.sign(jump[1:])))
+        flags[1:-1][peaks] |= SPIKE
+    return flags[:, 0] if flat else flags
+
+
+def _interpolate(values, good):
+    """Linear interpolation of all values that are not `good`, per column
+
+    Values before the first or after the last good value of a column take
+    the nearest good value.
+    """
+    n = len(values)
+    pos = np.arange(n)[:, None]
+    cols = np.arange(values.shape[1])
+    prev = np.maximum.accumulate(np.where(good, pos, -1), axis=0)
+    after = np.minimum.accumulate(np.where(good, pos, n)[::-1], axis=0)[::-1]
+    lo = values[np.maximum(prev, 0), cols]
+    hi = values[np.minimum(after, n - 1), cols]
+    lo = np.where(prev < 0, hi, lo)
+    hi = np.where(after >= n, lo, hi)
+    inner = (prev >= 0) & (after < n)
+    weight = np.where(inner, (pos - prev) / np.maximum(after - prev, 1), 0.)
+    return np.where(good, values, lo + (hi - lo) * weight)
+
+
+def _profile(values, good, index, by):
+    """Mean of the good values of every slot of the day, per group"""
+    from scipy import sparse
+
+    key, groups, slots = _day_slots(index, by)
+    indicator = sparse.csr_matrix(
+        (np.ones(len(key)), (key, np.arange(len(key)))),
+        shape=(len(groups) * slots, len(key)))
+    sums = indicator @ np.where(good, values, 0.)
+    counts = indicator @ good.astype(float)
+    with np.errstate(invalid='ignore', divide='ignore'):
+        return (sums / counts)[key]
+
+
+def _neighbour_estimate(values, good, neighbours):
+    """Values predicted by a linear fit to a neighbouring series"""
+    if neighbours is None:
+        # correlations of the series with their gaps set to the mean
+        with np.errstate(invalid='ignore', divide='ignore'):
+            mean = (np.where(good, values, 0.).sum(axis=0)
+                    / good.sum(axis=0))
+            centered = np.where(good, values - mean, 0.)
+            norm = np.sqrt((centered ** 2).sum(axis=0))
+            corr = (centered.T @ centered) / np.outer(norm, norm)
+        corr[np.isnan(corr)] = -np.inf
+        np.fill_diagonal(corr, -np.inf)
+        neighbours = corr.argmax(axis=1)
+    neighbours = np.asarray(neighbours)
+    x = values[:, neighbours]
+    usable = good[:, neighbours]
+    both = good & usable
+    count = both.sum(axis=0)
+    xs = np.where(both, x, 0.)
+    ys = np.where(both, values, 0.)
+    with np.errstate(invalid='ignore', divide='ignore'):
+        mx, my = xs.sum(axis=0) / count, ys.sum(axis=0) / count
+        var = (xs ** 2).sum(axis=0) / count - mx ** 2
+        cov = (xs * ys).sum(axis=0) / count - mx * my
+        slope = np.where(var > 0, cov / var, 0.)
+    return np.where(usable, my + slope * (x - mx), np.nan)
+
+
+@profile
+def repair(data, index=None, method='linear', flags=None, max_gap=None,
+           by='weekday', neighbours=None, **kwargs):
+    """Replace gaps, flatlines and spikes in measured time series
+
+    All series are repaired at once. Values flagged as faulty are replaced
+    by an estimate from the chosen method; those it cannot estimate (e.g.
+    where the neighbouring series has a gap too) are interpolated linearly.
+
+    Series are repaired independently, except for the choice of
+    neighbours, so data too large for memory can be repaired in blocks of
+    columns, e.g. from `toolchest.io.read_blocks` with `block_columns`.
+
+    Parameters
+    ----------
+    data : array_like
+        Values of shape ``(time, series)`` or ``(time,)``; gaps are NaN
+    index : pandas.DatetimeIndex, optional
+        Start of every time step, needed by the ``'profile'`` method
+    method : str, optional
+        ``'linear'`` interpolates between the good values around a fault.
+        ``'profile'`` follows the series' mean daily profile of the same
+        group (see `by`), shifted to meet the good values around the fault.
+        ``'neighbours'`` fits every series linearly to its neighbour, by
+        default the most correlated other series.
+    flags : array_like, optional
+        Quality flags as returned by `flag_faults`, which is called with
+        `kwargs` by default
+    max_gap : int, optional
+        Faults spanning more than `max_gap` consecutive steps are left as
+        NaN instead of being repaired
+    by : str, optional
+        Grouping of daily profiles for the ``'profile'`` method, see
+        `typical_day`
+    neighbours : array_like of int, optional
+        Column of the neighbour of every series for the ``'neighbours'``
+        method
+    **kwargs
+        Passed to `flag_faults`
+
+    Returns
+    -------
+    values : numpy.ndarray
+        Repaired data, of the same shape as `data`
+    flags : numpy.ndarray of uint8
+        `flags`, with `REPAIRED` added to all replaced values
+    """
+    data, flat = _as_2d(data)
+    values = np.array(data, dtype=float)
+    if flags is None:
+        flags = flag_faults(values, **kwargs)
+    else:
+        flags = np.array(flags, dtype=np.uint8).reshape(values.shape)
+    bad = (flags & FAULTS) != 0
+    good = ~bad
+    values[bad] = np.nan
+
+    if method == 'linear':
+        estimate = values
+    elif method == 'profile':
+        if index is None:
+            raise ValueError("method 'profile' needs an index")
+        profile = _profile(values, good, index, by)
+        estimate = profile + _interpolate(values - profile, good)
+    elif method == 'neighbours':
+        estimate = _neighbour_estimate(values, good, neighbours)
+    else:
+        raise ValueError("method must be 'linear', 'profile' or "
+                         "'neighbours'")
+    if estimate is not values:
+        values = np.where(bad, estimate, values)
+    values = _interpolate(values, ~np.isnan(values))
+
+    if max_gap is not None:
+        starts = np.ones(bad.shape, dtype=bool)
+        np.not_equal(bad[1:], bad[:-1], out=starts[1:])
+        values[bad & (_run_lengths(starts) > max_gap)] = np.nan
+    flags[bad & ~np.isnan(values)] |= REPAIRED
+    if flat:
+        return values[:, 0], flags[:, 0]
+    return values, flags
+
+
+@functools.lru_cache(maxsize=None)
+def _offset_table(zone, first_year, last_year):
+    """UTC offsets of `zone` from January `first_year` to `last_year`
+
+    Returns the UTC instants (ns) from which each offset applies, the first
+    being the earliest representable time, and the offsets (ns).
+    """
+    # sampling every 15 minutes finds all transitions, which happen at full
+    # or half hours
+    utc = pd.date_range(str(first_year), str(last_year + 1), freq='15min',
+                        tz='UTC', inclusive='left').as_unit('ns')
+    offsets = utc.tz_convert(zone).tz_localize(None).asi8 - utc.asi8
+    change = np.flatnonzero(offsets[1:] != offsets[:-1]) + 1
+    starts = np.r_[np.iinfo(np.int64).min, utc.asi8[change]]
+    return starts, offsets[np.r_[0, change]]
+
+
+def _wall_offsets(wall, zone):
+    """UTC offsets of wall-clock times, for the first and second occurrence
+
+    Wall-clock times skipped when clocks go forward have no offset (NaN
+    positions are marked by the returned `valid` mask); those repeated when
+    clocks go back have a different offset for their second occurrence.
+    """
+    years = wall.astype('datetime64[ns]').astype('datetime64[Y]')
+    first_year = int(years.min().astype(int)) + 1970 - 1
+    last_year = int(years.max().astype(int)) + 1970 + 1
+    starts, offsets = _offset_table(str(zone), first_year, last_year)
+    # offset j applies to wall-clock times in [starts[j], starts[j + 1])
+    # shifted by offsets[j]
+    ends = starts[1:] + offsets[:-1]
+    j = np.searchsorted(ends, wall, side='right')
+    first = offsets[j]
+    valid = (j == 0) | (wall >= starts[j] + first)
+    nxt = np.minimum(j + 1, len(offsets) - 1)
+    ambiguous = (j + 1 < len(offsets)) & (wall >= starts[nxt] + offsets[nxt])
+    second = np.where(ambiguous, offsets[nxt], first)
+    return first, second, valid
+
+
+@profile
+def align_to_utc(data, index, zones, start=None, stop=None, freq='h'):
+    """Move profiles recorded in local time in many regions onto UTC time
+
+    Every series is recorded against the same local wall-clock `index`, but
+    in the time zone of its own region. Series are moved onto one common
+    UTC time line in a single vectorized pass per time zone, looking up UTC
+    offsets in cached per-zone tables instead of converting every time
+    stamp with pandas.
+
+    Wall-clock times repeated when clocks go back may occur twice in
+    `index`; the first occurrence is taken as daylight saving time and the
+    second as standard time. If they occur only once, they are taken as
+    daylight saving time and the following standard time hour is NaN.
+    Wall-clock times skipped when clocks go forward are dropped. In zones
+    whose offset is not a multiple of `freq`, e.g. India at UTC+5:30 with
+    hourly data, time steps are moved to the start of their UTC step.
+
+    Parameters
+    ----------
+    data : array_like
+        Values of shape ``(time, series)`` or ``(time,)``
+    index : pandas.DatetimeIndex
+        Naive local wall-clock time of every row, sorted
+    zones : str or list of str
+        Time zone of every series, or one for all
+    start, stop : str or pandas.Timestamp, optional
+        Bounds (UTC, stop exclusive) of the result, by default the first and
+        last time of any series
+    freq : str, optional
+        Fixed resolution of `index` and of the result
+
+    Returns
+    -------
+    values : numpy.ndarray
+        Values on the UTC time line, NaN where a series has no value
+    index : pandas.DatetimeIndex
+        UTC time line
+
+    Examples
+    --------
+    >>> index = pd.date_range('2020-01-01', periods=8784, freq='h')
+    >>> values, utc = align_to_utc(np.ones((8784, 2)), index,
+    ...                            ['Europe/Lisbon', 'Europe/Helsinki'])
+    >>> str(utc[0])
+    '2019-12-31 22:00:00+00:00'
+    """
+    data, flat = _as_2d(data)
+    index = pd.DatetimeIndex(index)
+    if index.tz is not None:
+        raise ValueError('index must hold naive wall-clock times')
+    if len(index) != len(data):
+        raise ValueError('index and data differ in length')
+    if isinstance(zones, str):
+        zones = [zones] * data.shape[1]
+    if len(zones) != data.shape[1]:
+        raise ValueError('expected one time zone per series')
+    wall = index.as_unit('ns').asi8
+    repeated = np.r_[False, wall[1:] == wall[:-1]]
+    step = _step(freq)
+
+    utc = {}
+    for zone in set(zones):
+        first, second, valid = _wall_offsets(wall, zone)
+        utc[zone] = np.where(repeated, wall - second, wall - first), valid
+    if start is None:
+        lo = min(times[valid].min() for times, valid in utc.values())
+    else:
+        lo = pd.Timestamp(start).as_unit('ns').value
+    if stop is None:
+        hi = max(times[valid].max() for times, valid in utc.values()) + step
+    else:
+        hi = pd.Timestamp(stop).as_unit('ns').value
+    lo = lo // step * step
+    n = int(-(-(hi - lo) // step))
+
+    # sort the series by zone, so each zone is a contiguous block of columns
+    zones = np.asarray(zones)
+    order = np.argsort(zones, kind='stable')
+    source = data.take(order, axis=1)
+    values = np.full((n, data.shape[1]), np.nan)
+    for zone, (times, valid) in utc.items():
+        cols = np.flatnonzero(zones[order] == zone)
+        cols = slice(cols[0], cols[-1] + 1)
+        pos = (times - lo) // step
+        rows = np.flatnonzero(valid & (pos >= 0) & (pos < n))
+        if not len(rows):
+            continue
+        # offsets only change a few times a year, so rows move in long runs
+        # that are copied as slices
+        shift = pos[rows] - rows
+        breaks = np.flatnonzero((np.diff(rows) != 1) |
+                                (np.diff(shift) != 0)) + 1
+        for a, b in zip(np.r_[0, breaks], np.r_[breaks, len(rows)]):
+            first, last = rows[a], rows[b - 1] + 1
+            values[first + shift[a]:last + shift[a], cols] = \
+                source[first:last, cols]
+    values = values.take(np.argsort(order), axis=1)
+    new_index = pd.DatetimeIndex((lo + step * np.arange(n)).astype(
+        'datetime64[ns]'), tz='UTC')
+    return (values[:, 0] if flat else values), new_index
+
+
+@functools.lru_cache(maxsize=None)
+def _holidays(country, subdiv, first_year, last_year):
+    """Public holidays as days since the unix epoch"""
+    import holidays
+
+    dates = holidays.country_holidays(
+        country, subdiv=subdiv, years=range(first_year, last_year + 1))
+    return np.array(sorted(dates), dtype='datetime64[D]').astype(np.int64)
+
+
+@profile
+def day_types(index, country=None, subdiv=None, holidays=None):
+    """Type of the day of every time step: workday, Saturday or Sunday
+
+    Public holidays count as Sundays. The type is computed once per day
+    and holiday calendars once per country and range of years.
+
+    Parameters
+    ----------
+    index : pandas.DatetimeIndex
+        Start of every time step; days are taken in local time
+    country : str, optional
+        ISO code of the country whose public holidays to use, looked up
+        with the optional ``holidays`` package
+    subdiv : str, optional
+        Subdivision of `country`, e.g. a state, with its own holidays
+    holidays : array_like, optional
+        Dates of further holidays
+
+    Returns
+    -------
+    types : numpy.ndarray of int8
+        `WORKDAY`, `SATURDAY` or `SUNDAY` for every time step
+    """
+    wall, _ = _times(index)
+    days = wall // NS_PER_DAY
+    unique, inverse = np.unique(days, return_inverse=True)
+    # the unix epoch was a Thursday
+    weekday = (unique + 3) % 7
+    types = np.where(weekday == 6, SUNDAY,
+                     np.where(weekday == 5, SATURDAY, WORKDAY))
+    off = []
+    if country is not None and len(unique):
+        years = unique.astype('datetime64[D]').astype('datetime64[Y]')
+        off.append(_holidays(country, subdiv,
+                             int(years[0].astype(int)) + 1970,
+                             int(years[-1].astype(int)) + 1970))
+    if holidays is not None:
+        off.append(np.asarray(pd.DatetimeIndex(holidays).as_unit('ns').asi8)
+                   // NS_PER_DAY)
+    if off:
+        types[np.isin(unique, np.concatenate(off))] = SUNDAY
+    return types.astype(np.int8)[inverse]